@@ -0,0 +1,95 @@
+"""Agrupación de álbumes (mensajes con el mismo media_group_id)"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Telegram entrega cada elemento del álbum como un update distinto, casi seguidos
+ALBUM_DEBOUNCE = float(os.getenv('ALBUM_DEBOUNCE', 1.0))
+ALBUM_MAX_ITEMS = 10
+
+
+class AlbumAggregator:
+    """Acumula los mensajes de un álbum y los entrega juntos.
+
+    Cada mensaje nuevo reinicia la ventana de espera; cuando pasan
+    `delay` segundos sin más elementos (o se llega a 10, el máximo de
+    Telegram) se llama a `on_album(user_id, mensajes)` una sola vez.
+
+    Con `shared` (modo multi-instancia) cada elemento se guarda también en
+    el almacén común, porque las partes de un álbum pueden llegar a
+    instancias distintas: al vencer la ventana, la instancia que reclama el
+    álbum lo entrega completo (reconstruido con `decode`) y el resto lo
+    descarta.
+    """
+    def __init__(self, on_album: Callable[[int, List], Awaitable[None]], delay=ALBUM_DEBOUNCE,
+                 shared=None, decode: Optional[Callable[[Dict], object]] = None):
+        self.on_album = on_album
+        self.delay = delay
+        self.shared = shared
+        self.decode = decode
+        self.pending: Dict[Tuple[int, str], List] = {}
+        self.timers: Dict[Tuple[int, str], asyncio.TimerHandle] = {}
+        self._tasks = set()
+
+    async def add(self, user_id, message):
+        """Añade un elemento del álbum y reprograma su entrega"""
+        key = (user_id, message.media_group_id)
+        if self.shared is not None:
+            await self.shared.add(user_id, message.media_group_id, message.message_id, message.to_dict())
+        self.pending.setdefault(key, []).append(message)
+        self._schedule(key, self.delay)
+        if len(self.pending[key]) >= ALBUM_MAX_ITEMS:
+            self._flush(key, complete=True)
+
+    def _schedule(self, key, delay):
+        timer = self.timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        self.timers[key] = asyncio.get_running_loop().call_later(delay, self._flush, key)
+
+    def _flush(self, key, complete=False):
+        timer = self.timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        if self.shared is not None:
+            self._spawn(self._deliver_shared(key, complete))
+            return
+        messages = self.pending.pop(key, None)
+        if not messages:
+            return
+        messages.sort(key=lambda m: m.message_id)
+        self._spawn(self._deliver(key[0], messages))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _deliver_shared(self, key, complete):
+        user_id, group_id = key
+        try:
+            if not complete:
+                # Otra instancia pudo recibir un elemento después que esta
+                quiet = await self.shared.quiet_for(user_id, group_id)
+                if quiet < self.delay:
+                    self._schedule(key, self.delay - quiet)
+                    return
+            self.pending.pop(key, None)
+            if not await self.shared.claim(user_id, group_id):
+                return
+            payloads = await self.shared.take(user_id, group_id)
+        except Exception as e:
+            logger.error(f"Error agrupando álbum de {user_id}: {e}")
+            return
+        messages = sorted((self.decode(payload) for payload in payloads), key=lambda m: m.message_id)
+        if messages:
+            await self._deliver(user_id, messages)
+
+    async def _deliver(self, user_id, messages):
+        try:
+            await self.on_album(user_id, messages)
+        except Exception as e:
+            logger.error(f"Error procesando álbum de {user_id}: {e}")
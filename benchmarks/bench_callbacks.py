@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark del enrutado de callbacks
+Compara la cadena if/elif anterior (comparaciones en orden, startswith
+incluido) con CallbackRouter (dict + trie de prefijos + payload compacto)
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+os.environ.setdefault('STATE_BACKEND', 'memory')
+
+from bot import get_bot
+
+bot = get_bot()
+
+# Orden de comprobación de la antigua cadena de route_callback
+LEGACY_CHAIN = [
+    ('==', 'manage_buttons'), ('==', 'add_button'), ('==', 'remove_button'), ('==', 'button_layout'),
+    ('startswith', 'layout_'), ('startswith', 'template_'), ('==', 'save_template'),
+    ('==', 'import_template'), ('startswith', 'share_tpl_'), ('startswith', 'del_tpl_'),
+    ('startswith', 'remove_btn_'), ('==', 'add_url_button'), ('==', 'add_whatsapp_button'),
+    ('==', 'add_telegram_button'), ('==', 'button_templates'), ('==', 'back_to_post'),
+    ('==', 'add_channel'), ('==', 'select_channels'), ('startswith', 'toggle_'), ('==', 'edit_text'),
+    ('==', 'preview'), ('==', 'publish'), ('==', 'schedule_menu'), ('startswith', 'schedule_'),
+    ('startswith', 'unschedule_'), ('==', 'cancel'),
+]
+
+
+def legacy_route(callback_data):
+    for kind, value in LEGACY_CHAIN:
+        if kind == '==':
+            if callback_data == value:
+                return value, ()
+        elif callback_data.startswith(value):
+            return value, (callback_data.replace(value, ""),)
+    return 'other', ()
+
+
+def sample_callbacks(compact):
+    """Mezcla típica: sobre todo toggles de canales y quitar botones"""
+    channels = [-1001234567000 - i for i in range(20)]
+    if compact:
+        toggles = [bot.router.encode('t', ch_id) for ch_id in channels]
+        removes = [bot.router.encode('r', i) for i in range(5)]
+    else:
+        toggles = [f"toggle_{ch_id}" for ch_id in channels]
+        removes = [f"remove_btn_{i}" for i in range(5)]
+    return toggles + removes + ['manage_buttons', 'preview', 'publish', 'schedule_menu', 'cancel']
+
+
+def measure(func, callbacks, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for callback_data in callbacks:
+            func(callback_data)
+    return 1e9 * (time.perf_counter() - started) / (rounds * len(callbacks))
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    legacy = measure(legacy_route, sample_callbacks(compact=False), rounds)
+    router = measure(bot.router.resolve, sample_callbacks(compact=False), rounds)
+    compact = measure(bot.router.resolve, sample_callbacks(compact=True), rounds)
+    longest = max(sample_callbacks(compact=False), key=len)
+    print(f"Cadena if/elif:        {legacy:,.0f} ns/callback")
+    print(f"Router (formato viejo): {router:,.0f} ns/callback ({legacy / router:.2f}x)")
+    print(f"Router (compacto):     {compact:,.0f} ns/callback ({legacy / compact:.2f}x)")
+    print(f"Tamaño de toggle: {len(longest)} bytes -> {len(bot.router.encode('t', -1001234567000))} bytes")
+
+
+if __name__ == "__main__":
+    main()
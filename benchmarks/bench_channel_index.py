@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de la selección por grupos y etiquetas
+Compara recorrer todos los canales por cada etiqueta con resolver la misma
+expresión sobre ChannelIndex (frozensets precalculados)
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from channel_index import ChannelIndex
+
+EXPRESSION = '(#pais_3 + #pais_4) & #tema_2 - destacados'
+
+
+def sample_channels(count):
+    channels = {
+        str(-1001000000000 - i): {'title': f'Canal {i}', 'tags': [f'pais_{i % 40}', f'tema_{i % 7}']}
+        for i in range(count)
+    }
+    groups = {'destacados': list(channels)[::10]}
+    return channels, groups
+
+
+def linear_resolve(channels, groups):
+    """Lo que costaría sin índice: una pasada por canal y término"""
+    def tagged(tag):
+        return {ch_id for ch_id, ch_info in channels.items() if tag in ch_info.get('tags', ())}
+    group = {ch_id for ch_id in groups['destacados'] if ch_id in channels}
+    return ((tagged('pais_3') | tagged('pais_4')) & tagged('tema_2')) - group
+
+
+def measure(func, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return 1e6 * (time.perf_counter() - started) / rounds
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    channels, groups = sample_channels(count)
+    build = measure(lambda: ChannelIndex(channels, groups), rounds)
+    index = ChannelIndex(channels, groups)
+    assert index.resolve(EXPRESSION) == linear_resolve(channels, groups)
+    linear = measure(lambda: linear_resolve(channels, groups), rounds)
+    indexed = measure(lambda: index.resolve(EXPRESSION), rounds)
+    print(f"Canales: {count:,}  expresión: {EXPRESSION}")
+    print(f"Recorrido lineal:    {linear:,.1f} µs/selección")
+    print(f"Índice precalculado: {indexed:,.1f} µs/selección ({linear / indexed:.1f}x)")
+    print(f"Construir el índice: {build:,.1f} µs (una vez por cambio de canales/etiquetas/grupos)")
+
+
+if __name__ == "__main__":
+    main()
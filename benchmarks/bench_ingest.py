@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark del ingreso de updates en el webhook
+Compara el camino anterior (texto + json.loads + Update.de_json para todo)
+con el actual (bytes + fastjson + filtro por tipo antes de deserializar)
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+os.environ.setdefault('STATE_BACKEND', 'memory')
+
+from telegram import Update
+
+import fastjson
+from bot import HANDLED_UPDATE_TYPES, get_bot
+
+bot = get_bot()
+
+USER = {'id': 1001, 'is_bot': False, 'first_name': 'Ana'}
+CHAT = {'id': 1001, 'type': 'private', 'first_name': 'Ana'}
+CHANNEL = {'id': -1001234567890, 'type': 'channel', 'title': 'Canal'}
+
+
+def sample_updates():
+    """Mezcla típica: mensajes, callbacks y updates sin manejador"""
+    message = {
+        'message_id': 10, 'date': 1700000000, 'chat': CHAT, 'from': USER,
+        'caption': 'Nueva oferta 50% OFF ' * 10,
+        'photo': [{'file_id': f'AgAC{i}', 'file_unique_id': f'u{i}', 'width': 90 * i, 'height': 90 * i} for i in range(1, 4)],
+        'forward_origin': {'type': 'channel', 'chat': CHANNEL, 'message_id': 5, 'date': 1700000000},
+    }
+    callback = {
+        'id': '4382', 'from': USER, 'chat_instance': '-88', 'data': 'toggle_-1001234567890',
+        'message': {'message_id': 11, 'date': 1700000000, 'chat': CHAT, 'text': 'menú'},
+    }
+    ignored = [
+        {'edited_message': message},
+        {'channel_post': dict(message, chat=CHANNEL)},
+        {'my_chat_member': {
+            'chat': CHANNEL, 'from': USER, 'date': 1700000000,
+            'old_chat_member': {'status': 'member', 'user': USER},
+            'new_chat_member': {'status': 'left', 'user': USER},
+        }},
+    ]
+    kinds = [{'message': message}] * 5 + [{'callback_query': callback}] * 2 + ignored
+    return [json.dumps(dict(kind, update_id=i)).encode('utf-8') for i, kind in enumerate(kinds)]
+
+
+def legacy_ingest(body):
+    return Update.de_json(json.loads(body.decode('utf-8')), bot.app.bot)
+
+
+def fast_ingest(body):
+    payload = fastjson.loads(body)
+    if not any(update_type in payload for update_type in HANDLED_UPDATE_TYPES):
+        return None
+    return Update.de_json(payload, bot.app.bot)
+
+
+def measure(func, bodies, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for body in bodies:
+            func(body)
+    return rounds * len(bodies) / (time.perf_counter() - started)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    bodies = sample_updates()
+    legacy = measure(legacy_ingest, bodies, rounds)
+    fast = measure(fast_ingest, bodies, rounds)
+    print(f"Backend JSON: {fastjson.JSON_BACKEND}")
+    print(f"Anterior: {legacy:,.0f} updates/s")
+    print(f"Actual:   {fast:,.0f} updates/s ({fast / legacy:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
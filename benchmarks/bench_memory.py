@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria de las publicaciones pendientes
+Compara el modelo anterior (ForwardedPost con __dict__ que retiene el Message
+completo y media como dicts) con el actual (__slots__, solo ids y file_ids)
+"""
+
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+os.environ.setdefault('STATE_BACKEND', 'memory')
+
+from telegram import Message
+
+from bot import ForwardedPost, get_bot
+
+bot = get_bot()
+
+USER = {'id': 1001, 'is_bot': False, 'first_name': 'Ana'}
+CHAT = {'id': 1001, 'type': 'private', 'first_name': 'Ana'}
+CHANNEL = {'id': -1001234567890, 'type': 'channel', 'title': 'Canal de Ofertas'}
+BUTTONS = [
+    ('🛒 Comprar Ahora', 'https://ejemplo.com/producto'),
+    ('📞 Contactar', 'https://wa.me/1234567890'),
+    ('⭐ Valorar', 'https://ejemplo.com/review'),
+]
+
+
+def sample_message(i):
+    """Foto reenviada desde un canal, con caption formateado (caso típico)"""
+    return Message.de_json({
+        'message_id': i, 'date': 1700000000, 'chat': CHAT, 'from': USER,
+        'caption': f'Nueva oferta {i}: 50% OFF en toda la tienda ' * 6,
+        'caption_entities': [{'type': 'bold', 'offset': 0, 'length': 12},
+                             {'type': 'url', 'offset': 20, 'length': 10}],
+        'photo': [{'file_id': f'AgACAgQAAxkBAAI{i}_{size}', 'file_unique_id': f'AQAD{i}{size}',
+                   'width': 90 * size, 'height': 90 * size, 'file_size': 1000 * size}
+                  for size in (1, 4, 9)],
+        'forward_origin': {'type': 'channel', 'chat': CHANNEL, 'message_id': i, 'date': 1700000000},
+    }, bot.app.bot)
+
+
+class LegacyButton:
+    def __init__(self, text, url=None, callback_data=None, button_type='url'):
+        self.text = text
+        self.url = url
+        self.callback_data = callback_data
+        self.button_type = button_type
+
+
+class LegacyPost:
+    """Réplica del modelo anterior: mismos campos y el Message original retenido"""
+    def __init__(self, message):
+        post = ForwardedPost(message)
+        self.original_message = message
+        self.text = post.text
+        self.media = [{'file_id': item.file_id, 'type': item.type} for item in post.media]
+        self.target_channels = set()
+        self.buttons = []
+        self.button_layout = "horizontal"
+        self.original_date = post.original_date
+        self.forward_from = post.forward_from
+        self.publish_key = post.publish_key
+        self.source_chat_id = post.source_chat_id
+        self.source_message_ids = post.source_message_ids
+        self.text_edited = False
+        self.copy_unavailable = False
+
+    def add_button(self, text, url=None):
+        self.buttons.append(LegacyButton(text, url))
+
+
+def bytes_per_post(factory, count):
+    """Memoria retenida por `count` publicaciones una vez descartados los updates"""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    posts = []
+    for i in range(count):
+        message = sample_message(i)
+        post = factory(message)
+        for text, url in BUTTONS:
+            post.add_button(text, url)
+        posts.append(post)
+        del message
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return retained / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    legacy = bytes_per_post(LegacyPost, count)
+    compact = bytes_per_post(ForwardedPost, count)
+    print(f"Publicaciones pendientes: {count}")
+    print(f"Anterior: {legacy:,.0f} bytes/publicación")
+    print(f"Actual:   {compact:,.0f} bytes/publicación ({legacy / compact:.1f}x menos)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Sustituto local de la Bot API de Telegram para pruebas de carga sin red
+Responde a los métodos que usa bot.py con latencia, errores y 429 configurables
+
+Uso:
+    python benchmarks/fake_telegram.py --port 8081 --latency 40 --flood-rate 0.01
+    TELEGRAM_API_URL=http://127.0.0.1:8081/bot BOT_TOKEN=123:FAKE python bot.py
+
+GET /stats devuelve llamadas, errores y latencia por método; POST /stats/reset las pone a cero.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import zlib
+from collections import defaultdict
+
+from aiohttp import web
+
+BOT_USER = {'id': 4242, 'is_bot': True, 'first_name': 'Bot de Pruebas', 'username': 'fake_replicator_bot',
+            'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False}
+
+SEND_METHODS = {
+    'sendMessage', 'sendPhoto', 'sendVideo', 'sendAnimation', 'sendAudio',
+    'sendVoice', 'sendDocument', 'sendSticker',
+}
+
+
+def channel_id(chat_id):
+    """Id numérico estable para `@nombre` (o el propio id si ya es numérico)"""
+    chat_id = str(chat_id)
+    if chat_id.lstrip('-').isdigit():
+        return int(chat_id)
+    return -1000000000000 - zlib.crc32(chat_id.lstrip('@').lower().encode('utf-8'))
+
+
+def is_send(method):
+    return method in SEND_METHODS or method in ('sendMediaGroup', 'copyMessage', 'copyMessages')
+
+
+def chat_object(chat_id):
+    numeric = channel_id(chat_id)
+    if numeric > 0:
+        return {'id': numeric, 'type': 'private', 'first_name': f'Usuario {numeric}'}
+    return {'id': numeric, 'type': 'channel', 'title': f'Canal {abs(numeric) % 100000}',
+            'username': f'canal_{abs(numeric) % 100000}'}
+
+
+class FakeTelegram:
+    """Estado y estadísticas del sustituto"""
+    def __init__(self, latency_ms=30.0, jitter_ms=10.0, error_rate=0.0, flood_rate=0.0,
+                 retry_after=1, forbidden_chats=()):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.forbidden_chats = {channel_id(chat) for chat in forbidden_chats}
+        self.next_message_id = 1
+        self.reset()
+
+    def reset(self):
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.latency_total = defaultdict(float)
+        self.delivered = 0
+        self.first_send = None
+        self.last_send = None
+        self.started = time.time()
+
+    def message(self, chat_id, **fields):
+        self.next_message_id += 1
+        return dict({'message_id': self.next_message_id, 'date': int(time.time()),
+                     'chat': chat_object(chat_id), 'from': BOT_USER}, **fields)
+
+    def respond(self, method, params):
+        """Resultado del método o (código HTTP, descripción) si falla"""
+        chat_id = params.get('chat_id')
+        if chat_id is not None and channel_id(chat_id) in self.forbidden_chats:
+            return 403, "Forbidden: bot is not a member of the channel chat"
+
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'getChat':
+            return dict(chat_object(chat_id), accent_color_id=0, max_reaction_count=11)
+        if method == 'getChatMember':
+            return {
+                'status': 'administrator', 'user': BOT_USER,
+                'can_be_edited': False, 'is_anonymous': False, 'can_manage_chat': True,
+                'can_delete_messages': True, 'can_manage_video_chats': True, 'can_restrict_members': True,
+                'can_promote_members': False, 'can_change_info': True, 'can_invite_users': True,
+                'can_post_stories': True, 'can_edit_stories': True, 'can_delete_stories': True,
+                'can_post_messages': True, 'can_edit_messages': True,
+            }
+        if method in SEND_METHODS:
+            return self.message(chat_id, text=params.get('text') or params.get('caption') or '')
+        if method == 'sendMediaGroup':
+            media = params.get('media') or []
+            return [self.message(chat_id) for _ in media]
+        if method == 'copyMessage':
+            self.next_message_id += 1
+            return {'message_id': self.next_message_id}
+        if method == 'copyMessages':
+            ids = []
+            for _ in params.get('message_ids') or []:
+                self.next_message_id += 1
+                ids.append({'message_id': self.next_message_id})
+            return ids
+        if method == 'editMessageText':
+            if 'inline_message_id' in params:
+                return True
+            return self.message(chat_id, text=params.get('text', ''))
+        if method in ('answerCallbackQuery', 'setWebhook', 'deleteWebhook', 'setMyCommands'):
+            return True
+        if method == 'getWebhookInfo':
+            return {'url': '', 'has_custom_certificate': False, 'pending_update_count': 0}
+        return 404, f"Not Found: method {method} is not emulated"
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        started = time.perf_counter()
+        params = await read_params(request)
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        self.calls[method] += 1
+
+        # Los 429 se inyectan en envíos a canales (el fan-out), no en las respuestas al usuario
+        to_channel = channel_id(params.get('chat_id', 0)) < 0
+        if is_send(method) and to_channel and random.random() < self.flood_rate:
+            return self.fail(method, started, 429, f"Too Many Requests: retry after {self.retry_after}",
+                             {'retry_after': self.retry_after})
+        if method != 'getMe' and random.random() < self.error_rate:
+            return self.fail(method, started, 400, "Bad Request: injected error")
+
+        result = self.respond(method, params)
+        if isinstance(result, tuple):
+            return self.fail(method, started, *result)
+        if is_send(method):
+            # Solo cuentan los envíos aceptados: los 429 se reintentan
+            now = time.time()
+            self.delivered += 1
+            self.first_send = self.first_send or now
+            self.last_send = now
+        self.latency_total[method] += time.perf_counter() - started
+        return web.json_response({'ok': True, 'result': result})
+
+    def fail(self, method, started, status, description, parameters=None):
+        self.errors[method] += 1
+        self.latency_total[method] += time.perf_counter() - started
+        body = {'ok': False, 'error_code': status, 'description': description}
+        if parameters:
+            body['parameters'] = parameters
+        return web.json_response(body, status=status)
+
+    async def stats(self, request):
+        return web.json_response({
+            'uptime_s': round(time.time() - self.started, 3),
+            'calls': dict(self.calls),
+            'errors': dict(self.errors),
+            'avg_latency_ms': {method: round(1000 * total / self.calls[method], 3)
+                               for method, total in self.latency_total.items() if self.calls[method]},
+            'sends': self.delivered,
+            'send_window_s': round(self.last_send - self.first_send, 3) if self.first_send else 0,
+        })
+
+    async def reset_stats(self, request):
+        self.reset()
+        return web.json_response({'ok': True})
+
+
+async def read_params(request):
+    """Parámetros del método: JSON, formulario o multipart (valores complejos en JSON)"""
+    if request.content_type == 'application/json':
+        return await request.json()
+    params = {}
+    if request.can_read_body:
+        form = await request.post()
+        for key, value in form.items():
+            if not isinstance(value, str):
+                continue
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+    params.update(request.query)
+    return params
+
+
+def create_app(fake: FakeTelegram):
+    app = web.Application(client_max_size=20 * 1024 * 1024)
+    app.router.add_get('/stats', fake.stats)
+    app.router.add_post('/stats/reset', fake.reset_stats)
+    app.router.add_route('*', '/bot{token}/{method}', fake.handle)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=30.0, help="latencia media por llamada (ms)")
+    parser.add_argument('--jitter', type=float, default=10.0, help="desviación de la latencia (ms)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fracción de llamadas con 400")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="fracción de envíos a canales con 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="retry_after de los 429 (s)")
+    parser.add_argument('--forbidden', nargs='*', default=(), help="canales donde el bot no puede publicar")
+    args = parser.parse_args()
+
+    fake = FakeTelegram(args.latency, args.jitter, args.error_rate, args.flood_rate, args.retry_after, args.forbidden)
+    print(f"🧪 Bot API simulada en http://{args.host}:{args.port}/bot<token>/<método>")
+    web.run_app(create_app(fake), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
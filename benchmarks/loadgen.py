@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Generador de tráfico sintético contra /webhook del bot
+Mide updates/segundo de ingreso y de extremo a extremo y, en el escenario
+`fanout`, la duración de la replicación contando envíos en la Bot API simulada
+
+Uso (tres terminales):
+    python benchmarks/fake_telegram.py --latency 40
+    TELEGRAM_API_URL=http://127.0.0.1:8081/bot BOT_TOKEN=123:FAKE STATE_BACKEND=memory python bot.py
+    python benchmarks/loadgen.py messages --users 200 --updates 20
+    python benchmarks/loadgen.py fanout --users 5 --channels 50
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+
+import aiohttp
+
+_update_ids = itertools.count(int(time.time()) * 1000)
+
+
+def user(uid):
+    return {'id': uid, 'is_bot': False, 'first_name': f'Carga {uid}'}
+
+
+def message_update(uid, text):
+    return {'update_id': next(_update_ids), 'message': {
+        'message_id': next(_update_ids) % 2**31, 'date': int(time.time()),
+        'chat': {'id': uid, 'type': 'private', 'first_name': f'Carga {uid}'}, 'from': user(uid), 'text': text,
+    }}
+
+
+def callback_update(uid, data):
+    return {'update_id': next(_update_ids), 'callback_query': {
+        'id': str(next(_update_ids)), 'from': user(uid), 'chat_instance': str(uid), 'data': data,
+        'message': {'message_id': 1, 'date': int(time.time()),
+                    'chat': {'id': uid, 'type': 'private', 'first_name': f'Carga {uid}'}, 'text': 'menú'},
+    }}
+
+
+class LoadGenerator:
+    def __init__(self, session, bot_url, api_url, concurrency, rate):
+        self.session = session
+        self.bot_url = bot_url.rstrip('/')
+        self.api_url = api_url.rstrip('/')
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = time.monotonic()
+        self.latencies = []
+        self.statuses = {}
+
+    async def post(self, update):
+        """Envía un update al webhook respetando la concurrencia y el ritmo objetivo"""
+        if self.interval:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(self.next_slot, now) + self.interval
+            if wait > 0:
+                await asyncio.sleep(wait)
+        async with self.semaphore:
+            started = time.perf_counter()
+            try:
+                async with self.session.post(f"{self.bot_url}/webhook", json=update) as response:
+                    await response.read()
+                    status = response.status
+            except aiohttp.ClientError as e:
+                status = type(e).__name__
+            self.latencies.append(time.perf_counter() - started)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    async def queue_done(self):
+        """Updates procesados (o fallidos) por el bot según /health"""
+        async with self.session.get(f"{self.bot_url}/health") as response:
+            stats = (await response.json())['update_queue']
+        return stats['processed'] + stats['failed']
+
+    async def wait_processed(self, target, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if await self.queue_done() >= target:
+                return True
+            await asyncio.sleep(0.05)
+        return False
+
+    async def api_stats(self, reset=False):
+        if reset:
+            async with self.session.post(f"{self.api_url}/stats/reset") as response:
+                await response.read()
+        async with self.session.get(f"{self.api_url}/stats") as response:
+            return await response.json()
+
+    def ingest_summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        quantile = lambda q: 1000 * latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+        return {
+            'updates': len(latencies),
+            'ingest_updates_per_s': round(len(latencies) / elapsed, 1),
+            'webhook_latency_ms': {
+                'mean': round(1000 * statistics.fmean(latencies), 3),
+                'p50': round(quantile(0.50), 3),
+                'p95': round(quantile(0.95), 3),
+                'p99': round(quantile(0.99), 3),
+            },
+            'statuses': {str(k): v for k, v in self.statuses.items()},
+        }
+
+
+async def run_messages(gen, args):
+    """Muchos usuarios enviando mensajes sueltos (camino de captura/respuesta)"""
+    base = await gen.queue_done()
+    updates = [message_update(1_000_000 + u, f"Mensaje {i} de prueba de carga")
+               for i in range(args.updates) for u in range(args.users)]
+    started = time.perf_counter()
+    await asyncio.gather(*(gen.post(update) for update in updates))
+    ingest_elapsed = time.perf_counter() - started
+    complete = await gen.wait_processed(base + len(updates), args.timeout)
+    total_elapsed = time.perf_counter() - started
+    result = gen.ingest_summary(ingest_elapsed)
+    result['end_to_end_updates_per_s'] = round(len(updates) / total_elapsed, 1)
+    result['complete'] = complete
+    return result
+
+
+async def run_fanout(gen, args):
+    """Cada usuario registra canales, captura una publicación y la replica en todos"""
+    users = [2_000_000 + u for u in range(args.users)]
+    channels = "\n".join(f"@carga_{c}" for c in range(args.channels))
+    base = await gen.queue_done()
+    setup = 0
+    for uid in users:
+        for update in (callback_update(uid, 'add_channel'), message_update(uid, channels),
+                       message_update(uid, "🛒 Oferta de prueba de carga"),
+                       callback_update(uid, 'select_channels'), callback_update(uid, 'ch_all')):
+            await gen.post(update)
+            setup += 1
+    if not await gen.wait_processed(base + setup, args.timeout):
+        return {'error': 'la preparación no terminó a tiempo'}
+
+    before = await gen.api_stats(reset=True)
+    expected = before['sends'] + len(users) * args.channels
+    started = time.perf_counter()
+    await asyncio.gather(*(gen.post(callback_update(uid, 'publish')) for uid in users))
+    deadline = time.monotonic() + args.timeout
+    stats = before
+    while time.monotonic() < deadline:
+        stats = await gen.api_stats()
+        if stats['sends'] >= expected:
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    return {
+        'users': len(users),
+        'channels_per_user': args.channels,
+        'sends': stats['sends'],
+        'expected_sends': expected,
+        'fanout_duration_s': round(elapsed, 3),
+        'sends_per_s': round(stats['sends'] / elapsed, 1),
+        'api_calls': stats['calls'],
+        'api_errors': stats['errors'],
+    }
+
+
+async def main_async(args):
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        gen = LoadGenerator(session, args.bot, args.api, args.concurrency, args.rate)
+        scenario = run_messages if args.scenario == 'messages' else run_fanout
+        result = await scenario(gen, args)
+    result['scenario'] = args.scenario
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('scenario', choices=('messages', 'fanout'))
+    parser.add_argument('--bot', default='http://127.0.0.1:10000', help="URL base del bot")
+    parser.add_argument('--api', default='http://127.0.0.1:8081', help="URL base de la Bot API simulada")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--updates', type=int, default=10, help="updates por usuario (escenario messages)")
+    parser.add_argument('--channels', type=int, default=20, help="canales por usuario (escenario fanout)")
+    parser.add_argument('--concurrency', type=int, default=64, help="peticiones simultáneas al webhook")
+    parser.add_argument('--rate', type=float, default=0, help="updates/s objetivo (0 = sin límite)")
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output', help="guardar el resultado en este fichero JSON")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks de los caminos calientes de bot.py
+Cada caso ajusta sus repeticiones solo; el resultado se guarda como línea
+base JSON en benchmarks/baselines/ y se compara con la anterior
+
+Uso:
+    python benchmarks/suite.py                      # todo, guarda y compara con la última línea base
+    python benchmarks/suite.py -k channel_selection # solo los casos que contienen el texto
+    python benchmarks/suite.py --compare benchmarks/baselines/20261017-120000.json --no-save
+    python benchmarks/suite.py --fail-on-regression # código de salida 1 si algo empeora más del umbral
+"""
+
+import argparse
+import asyncio
+import gc
+import glob
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+os.environ.setdefault('STATE_BACKEND', 'memory')
+
+from telegram import Message
+
+from bot import ForwardedPost, get_bot
+from fanout import FanoutDispatcher
+
+bot = get_bot()
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+MIN_RUN_TIME = 0.2
+REPEATS = 5
+
+USER = {'id': 1001, 'is_bot': False, 'first_name': 'Ana'}
+CHAT = {'id': 1001, 'type': 'private', 'first_name': 'Ana'}
+CHANNEL = {'id': -1001234567890, 'type': 'channel', 'title': 'Canal de Ofertas', 'username': 'ofertas'}
+BUTTONS = [
+    ('🛒 Comprar Ahora', 'https://ejemplo.com/producto'),
+    ('📞 Contactar', 'https://wa.me/1234567890'),
+    ('⭐ Valorar', 'https://ejemplo.com/review'),
+    ('📖 Leer Más', 'https://ejemplo.com/noticia'),
+    ('🔔 Suscribirse', 'https://t.me/noticias'),
+    ('🌐 Web', 'https://ejemplo.com'),
+]
+
+CASES = {}
+
+
+def case(name):
+    """Registra un caso: la función prepara el estado y devuelve la operación a medir"""
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def text_message():
+    return Message.de_json({
+        'message_id': 10, 'date': 1700000000, 'chat': CHAT, 'from': USER,
+        'text': 'Nueva oferta: 50% OFF en toda la tienda ' * 5,
+        'entities': [{'type': 'bold', 'offset': 0, 'length': 12}],
+        'forward_origin': {'type': 'channel', 'chat': CHANNEL, 'message_id': 5, 'date': 1700000000},
+    }, None)
+
+
+def photo_message():
+    return Message.de_json({
+        'message_id': 11, 'date': 1700000000, 'chat': CHAT, 'from': USER,
+        'caption': 'Nueva oferta: 50% OFF en toda la tienda ' * 5,
+        'caption_entities': [{'type': 'bold', 'offset': 0, 'length': 12},
+                             {'type': 'url', 'offset': 20, 'length': 10}],
+        'photo': [{'file_id': f'AgACAgQAAxkBAAI_{size}', 'file_unique_id': f'AQAD{size}',
+                   'width': 90 * size, 'height': 90 * size} for size in (1, 4, 9)],
+        'forward_origin': {'type': 'user', 'sender_user': USER, 'date': 1700000000},
+    }, None)
+
+
+def post_with_buttons(layout):
+    post = ForwardedPost(photo_message())
+    for text, url in BUTTONS:
+        post.add_button(text, url)
+    post.button_layout = layout
+    return post
+
+
+class FakeQuery:
+    """CallbackQuery mínima: responde y edita sin red"""
+    def __init__(self, user_id, data=''):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.data = data
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, *args, **kwargs):
+        pass
+
+
+class FakeApi:
+    """Bot de la API simulado: cualquier método devuelve un mensaje al instante"""
+    def __getattr__(self, name):
+        async def method(*args, chat_id=0, **kwargs):
+            return SimpleNamespace(message_id=1, chat=SimpleNamespace(id=chat_id))
+        return method
+
+
+def session_with_channels(user_id, count):
+    # Como si process_update ya la hubiera cargado
+    bot.sessions.resident[user_id] = bot.new_session()
+    data = bot.get_user_data(user_id)
+    data['channels'] = {
+        str(-1001000000000 - i): {'title': f'Canal {i}', 'username': f'canal_{i}'} for i in range(count)
+    }
+    for ch_id in data['channels']:
+        # Permisos conocidos: el render no dispara revalidaciones
+        bot.channels.record(ch_id, member=SimpleNamespace(status='creator'))
+    data['current_post'] = post_with_buttons('horizontal')
+    data['current_post'].target_channels = set(list(data['channels'])[::3])
+    return data
+
+
+# --- ForwardedPost ---
+
+@case('post_construct_text')
+def _():
+    message = text_message()
+    return lambda: ForwardedPost(message)
+
+
+@case('post_construct_photo')
+def _():
+    message = photo_message()
+    return lambda: ForwardedPost(message)
+
+
+@case('post_extract_text')
+def _():
+    message = photo_message()
+    post = ForwardedPost(message)
+    return lambda: post.extract_text(message)
+
+
+@case('post_extract_media')
+def _():
+    message = photo_message()
+    post = ForwardedPost(message)
+    return lambda: post.extract_media(message)
+
+
+@case('post_forward_info')
+def _():
+    message = text_message()
+    post = ForwardedPost(message)
+    return lambda: post.get_forward_info(message)
+
+
+# --- Teclado de la publicación (cada layout, construido y memoizado) ---
+
+def keyboard_case(layout, warm):
+    def setup():
+        post = post_with_buttons(layout)
+        if warm:
+            return post.get_inline_keyboard
+
+        def cold():
+            post.invalidate_keyboards()
+            return post.get_inline_keyboard().to_dict()
+        return cold
+    return setup
+
+
+for _layout in ('horizontal', 'vertical', 'grid'):
+    case(f'inline_keyboard_{_layout}_build')(keyboard_case(_layout, warm=False))
+    case(f'inline_keyboard_{_layout}_memo')(keyboard_case(_layout, warm=True))
+
+
+# --- Callbacks ---
+
+@case('callback_resolve_mix')
+def _():
+    callbacks = [bot.router.encode('t', -1001234567000 - i) for i in range(10)] + \
+                ['manage_buttons', 'preview', 'publish', 'layout_grid', 'template_news', 'noop']
+    resolve = bot.router.resolve
+
+    def run():
+        for callback_data in callbacks:
+            resolve(callback_data)
+    return run
+
+
+@case('callback_handler_noop')
+def _():
+    update = SimpleNamespace(callback_query=FakeQuery(5001, 'noop'))
+    return lambda: bot.callback_handler(update, None)
+
+
+@case('callback_handler_toggle_100ch')
+def _():
+    data = session_with_channels(5002, 100)
+    ch_id = next(iter(data['channels']))
+    update = SimpleNamespace(callback_query=FakeQuery(5002, bot.router.encode('t', ch_id)))
+    return lambda: bot.callback_handler(update, None)
+
+
+# --- Sesiones ---
+
+@case('get_user_data_100k_sessions')
+def _():
+    sessions = bot.sessions
+    sessions.max_resident = max(sessions.max_resident, 200_000)
+    for user_id in range(1_000_000, 1_100_000):
+        sessions.resident[user_id] = bot.new_session()
+    user_ids = list(range(1_000_000, 1_100_000, 997))
+
+    def run():
+        for user_id in user_ids:
+            bot.get_user_data(user_id)
+    return run
+
+
+# --- Selector de canales ---
+
+def channel_selection_case(count):
+    def setup():
+        user_id = 6000 + count
+        data = session_with_channels(user_id, count)
+        query = FakeQuery(user_id)
+
+        async def render():
+            # Como tras un toggle: el teclado de la página se reconstruye
+            data['current_post']._keyboards.pop('channels', None)
+            await bot.show_channel_selection(query, data)
+        return render
+    return setup
+
+
+for _count in (10, 100, 1000):
+    case(f'show_channel_selection_{_count}ch')(channel_selection_case(_count))
+
+
+# --- Replicación ---
+
+def publish_case(count):
+    def setup():
+        user_id = 7000 + count
+        data = session_with_channels(user_id, count)
+        post = data['current_post']
+        post.target_channels = set(data['channels'])
+        query = FakeQuery(user_id)
+
+        async def publish():
+            post.publish_key = os.urandom(8).hex()
+            data['current_post'] = post
+            await bot.publish_post(query, user_id)
+        return publish
+    return setup
+
+
+for _count in (10, 100):
+    case(f'publish_post_{_count}ch')(publish_case(_count))
+
+
+# --- Ejecución ---
+
+async def measure(operation):
+    """ns/op (mediana y mínimo) con número de iteraciones autoajustado"""
+    probe = operation()
+    is_async = asyncio.iscoroutine(probe)
+    if is_async:
+        await probe
+
+    async def run(number):
+        started = time.perf_counter()
+        if is_async:
+            for _ in range(number):
+                await operation()
+        else:
+            for _ in range(number):
+                operation()
+        return time.perf_counter() - started
+
+    number = 1
+    while True:
+        elapsed = await run(number)
+        if elapsed >= MIN_RUN_TIME or number >= 10_000_000:
+            break
+        number *= 2 if elapsed > MIN_RUN_TIME / 10 else 10
+    samples = []
+    for _ in range(REPEATS):
+        gc.collect()
+        samples.append(1e9 * await run(number) / number)
+    return {'ns_per_op': round(statistics.median(samples), 1), 'min_ns': round(min(samples), 1), 'number': number}
+
+
+async def run_suite(selected):
+    # Los logs por operación distorsionarían la medida
+    logging.disable(logging.INFO)
+    # Replicación sin límites de tasa ni red: se mide el código del bot, no los cubos
+    bot.app = SimpleNamespace(bot=FakeApi())
+    bot.bulk_bot = FakeApi()
+    bot.fanout = FanoutDispatcher(concurrency=50, global_rate=1e9, per_chat_rate=1e9, per_chat_burst=1e9)
+    results = {}
+    for name in selected:
+        operation = CASES[name]()
+        results[name] = await measure(operation)
+        print(f"{name:38} {format_ns(results[name]['ns_per_op']):>12}")
+    return results
+
+
+def format_ns(ns):
+    if ns >= 1e6:
+        return f"{ns / 1e6:,.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:,.2f} µs"
+    return f"{ns:,.0f} ns"
+
+
+def latest_baseline():
+    paths = sorted(glob.glob(os.path.join(BASELINE_DIR, '*.json')))
+    return paths[-1] if paths else None
+
+
+def save_baseline(results):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = os.path.join(BASELINE_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def compare(results, baseline_path, threshold):
+    """Imprime la comparación con una línea base; devuelve los casos que empeoran"""
+    with open(baseline_path, encoding='utf-8') as f:
+        previous = json.load(f)['results']
+    print(f"\nComparación con {os.path.basename(baseline_path)} (umbral {threshold:.0%}):")
+    regressions = []
+    for name, result in results.items():
+        if name not in previous:
+            print(f"{name:38} {'(nuevo)':>12}")
+            continue
+        ratio = result['ns_per_op'] / previous[name]['ns_per_op']
+        if ratio > 1 + threshold:
+            mark = "⚠️ regresión"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            mark = "✅ mejora"
+        else:
+            mark = ""
+        print(f"{name:38} {format_ns(previous[name]['ns_per_op']):>12} -> {format_ns(result['ns_per_op']):>12} "
+              f"({ratio - 1:+.1%}) {mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-k', dest='filter', default='', help="solo casos cuyo nombre contenga este texto")
+    parser.add_argument('--compare', help="línea base con la que comparar (por defecto, la última guardada)")
+    parser.add_argument('--no-save', action='store_true', help="no guardar el resultado como línea base")
+    parser.add_argument('--threshold', type=float, default=0.10, help="variación tolerada (0.10 = 10%%)")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--list', action='store_true', help="listar los casos y salir")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(CASES))
+        return 0
+    selected = [name for name in CASES if args.filter in name]
+    baseline = args.compare or latest_baseline()
+    results = asyncio.run(run_suite(selected))
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+    if not args.no_save:
+        print(f"\n💾 Línea base guardada en {save_baseline(results)}")
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,549 +1,262 @@
-async def show_channel_selection(self, query, data):
-        """Muestra la selección de canales"""
-        keyboard = []
-        selected_count = len(data['current_post'].target_channels)
-        
-        for ch_id, ch_info in data['channels'].items():
-            selected = ch_id in data['current_post'].target_channels
-            icon = "✅" if selected else "⬜"
-            title = ch_info.get('title', 'Canal')[:25]
-            keyboard.append([InlineKeyboardButton(
-                f"{icon} {title}",
-                callback_data=f"toggle_{ch_id}"
-            )])
-        
-        keyboard.extend([
-            [InlineKeyboardButton("🔘 Gestionar Botones", callback_data="manage_buttons")],
-            [InlineKeyboardButton("👀 Vista Previa", callback_data="preview"),
-             InlineKeyboardButton("📤 Replicar", callback_data="publish")]
-        ])
-        
-        post = data.get('current_post')
-        button_info = f"🔘 Botones: **{len(post.buttons)}**" if post else ""
-        
-        text = f"🎯 **Seleccionar Canales Destino**\n\n" \
-               f"✅ Seleccionados: **{selected_count}**\n" \
-               f"📺 Disponibles: **{len(data['channels'])}**\n" \
-               f"{button_info}\n\n" \
-               f"Toca los canales donde quieres replicar"
-        
-        await query.edit_message_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode=ParseMode.MARKDOWN
-        )
-    
-    async def show_button_templates_main(self, update, data):
-        """Muestra plantillas de botones desde el menú principal"""
-        templates = data.get('button_templates', {})
-        
-        text = "📋 **Plantillas de Botones Disponibles**\n\n"
-        
-        for name, buttons in templates.items():
-            text += f"**{name.title()}:**\n"
-            for btn in buttons:
-                text += f"• {btn['text']}\n"
-            text += "\n"
-        
-        text += "💡 **Uso:** Reenvía una publicación al bot y selecciona 'Usar Plantilla'"
-        
-        await update.message.reply_text(
-            text,
-            parse_mode=ParseMode.MARKDOWN
-        )
-    
-    async def status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Mostrar estado actual"""
-        user_id = update.effective_user.id
-        data = self.get_user_data(user_id)
-        
-        text = f"📊 **Estado del Bot Replicador**\n\n"
-        text += f"👤 **Usuario:** {update.effective_user.first_name}\n"
-        text += f"📺 **Canales configurados:** {len(data['channels'])}\n"
-        text += f"🔄 **Estado actual:** {data['step']}\n"
-        text += f"🕐 **Última actividad:** {data['last_activity'].strftime('%H:%M')}\n\n"
-        
-        if data.get('current_post'):
-            post = data['current_post']
-            text += f"📝 **Publicación en Proceso:**\n"
-            text += f"• **Contenido:** {'✅' if post.text or post.media else '❌'}\n"
-            text += f"• **Botones:** {len(post.buttons)} ({post.button_layout})\n"
-            text += f"• **Canales destino:** {len(post.target_channels)} seleccionados\n"
-            text += f"• **Origen:** {post.forward_from}\n\n"
-            
-            text += f"📤 **Listo para replicar:** {'✅' if post.target_channels and post.has_content() else '❌'}"
-        else:
-            text += f"💡 **Tip:** Reenvía cualquier publicación para empezar a replicar con botones"
-        
-        await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
-    
-    async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Cancelar acción actual"""
-        user_id = update.effective_user.id
-        data = self.get_user_data(user_id)
-        
-        data['current_post'] = None
-        data['step'] = 'idle'
-        data.pop('temp_button_text', None)
-        
-        await update.message.reply_text(
-            "❌ **Replicación cancelada**\n\n"
-            "🔄 Puedes reenviar otra publicación cuando quieras."
-        )
-    
-    async def help_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Comando de ayuda mejorado"""
-        text = """🚀 **Bot Replicador con Botones Interactivos**
+import asyncio
+import logging
+import os
+import re
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Set
+import httpx
+from aiohttp import web
+from aiohttp.web_request import Request
+from aiohttp.web_response import Response
 
-**🔄 CÓMO FUNCIONA:**
-1. **Reenvía** cualquier publicación al bot
-2. El bot la **captura automáticamente**
-3. **Añade botones** interactivos
-4. **Selecciona canales** destino
-5. **¡Replica con un clic!**
+from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, MessageEntity, Message
+from telegram import InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, filters, ContextTypes
+from telegram.constants import ParseMode
+from telegram.error import TelegramError, Forbidden, BadRequest
+from telegram.request import HTTPXRequest
 
-**📋 COMANDOS:**
-• `/canales` - Gestionar canales destino
-• `/estado` - Ver estado actual
-• `/help` - Esta ayuda
+import fastjson
+from fanout import BULK, INTERACTIVE, FanoutDispatcher, PriorityLanes
+from retry import QueuedForRetry, RetryQueue, is_retryable, send_with_retry
+from storage import create_store
+from sessions import SessionManager, expire_stale_post
+from update_queue import UpdateQueue
+from dedup import TTLCache
+from health import LoopLagMonitor, StartupTimer, UpstreamHealth
+from albums import AlbumAggregator
+from scheduler import PublishScheduler
+from channels import ChannelCache, is_permanent_denial
+from keyboards import CachedMarkup, cached_button
+from router import CallbackRouter
+from picker import (
+    CHANNEL_LIST_PAGE_SIZE, CHANNEL_PAGE_SIZE, CHANNEL_SEARCH_MAX, delete_group, label_slug,
+    paginate, picker_state, save_group, tag_channels
+)
+from channel_index import INDEX_KEY, channel_index, invalidate_index
+from cluster import create_cluster
+from templates import TemplateRegistry, buttons_to_template, template_slug, template_title
+from metrics import (
+    REGISTRY, WEBHOOK_REQUESTS, WEBHOOK_LATENCY, CALLBACK_LATENCY, CALLBACK_ERRORS,
+    PUBLISH_SENDS, PUBLISH_SEND_LATENCY, TELEGRAM_API_LATENCY, TELEGRAM_API_ERRORS
+)
 
-**🔘 TIPOS DE BOTONES:**
-• **🔗 Links externos** - Sitios web, tiendas online
-• **📞 WhatsApp** - Contacto directo (wa.me)
-• **📺 Telegram** - Canales y grupos
-• **📧 Email** - Contacto por correo
-• **🛒 E-commerce** - Botones de compra
+# Configuración
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
-**📋 PLANTILLAS INCLUIDAS:**
-• **E-commerce** - Comprar, Contactar, Valorar
-• **Social** - Me Gusta, Comentar, Compartir  
-• **Noticias** - Leer Más, Suscribirse
-• **Educativo** - Ver Curso, Inscribirse
-• **Contacto** - WhatsApp, Email, Web
+BOT_TOKEN = os.getenv('BOT_TOKEN')
+PORT = int(os.getenv('PORT', 10000))
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', f'https://botonesbot.onrender.com')
+# Bot API de destino; para pruebas de carga, benchmarks/fake_telegram.py (http://127.0.0.1:8081/bot)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+TELEGRAM_FILE_URL = os.getenv('TELEGRAM_FILE_URL', 'https://api.telegram.org/file/bot')
+# Conexiones ociosas que se mantienen abiertas con la API (segundos)
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30))
 
-**🎯 EJEMPLOS DE USO:**
+if not BOT_TOKEN:
+    raise ValueError("❌ BOT_TOKEN no configurado")
 
-```
-🛒 Reenvías: "Nueva oferta 50% OFF"
-➕ Añades: [🛒 Comprar] [📞 WhatsApp]
-📤 Replicas en 5 canales simultáneamente
-```
+# Opciones de programación: clave -> (etiqueta, retraso en minutos, reparto en minutos)
+SCHEDULE_OPTIONS = {
+    '60': ("⏰ En 1 hora", 60, 0),
+    '180': ("⏰ En 3 horas", 180, 0),
+    '360': ("⏰ En 6 horas", 360, 0),
+    '1440': ("📅 Mañana a esta hora", 1440, 0),
+    'spread60': ("🌊 Escalonar durante 1 hora", 1, 60),
+    'spread180': ("🌊 Escalonar durante 3 horas", 1, 180),
+}
+# Al escalonar, una tanda de canales cada tantos minutos
+SCHEDULE_SPREAD_STEP_MINUTES = 10
 
-```
-📰 Reenvías: Noticia importante
-➕ Añades: [📖 Leer Más] [🔔 Suscribirse]  
-📤 Se publica con botones en todos tus canales
-```
+# Importación masiva de canales
+BULK_CHANNELS_MAX = 500
+BULK_CHANNELS_MAX_FILE_SIZE = 256 * 1024
+BULK_VERIFY_CONCURRENCY = int(os.getenv('BULK_VERIFY_CONCURRENCY', 10))
 
-**⚙️ LAYOUTS DISPONIBLES:**
-• **Horizontal** - Botones en fila (1-3 por fila)
-• **Vertical** - Un botón por fila
-• **Grid** - Cuadrícula 2x2
+# Tipos de update con manejador; el resto se descarta en el webhook
+HANDLED_UPDATE_TYPES = ('message', 'callback_query')
 
-**💡 VENTAJAS:**
-✅ **Rápido** - Sin crear desde cero
-✅ **Consistente** - Mismo contenido, múltiples canales
-✅ **Interactivo** - Botones aumentan engagement
-✅ **Profesional** - Aspecto uniforme
+# Método de envío de la API para cada tipo de media con caption
+MEDIA_SEND_METHODS = {
+    'photo': 'send_photo',
+    'video': 'send_video',
+    'animation': 'send_animation',
+    'audio': 'send_audio',
+    'voice': 'send_voice',
+    'document': 'send_document',
+}
 
-**🚀 ¡Convierte cualquier contenido en publicación interactiva!**"""
-        
-        keyboard = [
-            [KeyboardButton("📺 Mis Canales"), KeyboardButton("🔘 Plantillas")],
-            [KeyboardButton("📊 Estado"), KeyboardButton("❓ Ayuda")]
-        ]
-        
-        await update.message.reply_text(
-            text,
-            reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
-            parse_mode=ParseMode.MARKDOWN
-        )
+# Tipos de media que pueden ir dentro de un álbum (send_media_group)
+ALBUM_INPUT_TYPES = {
+    'photo': InputMediaPhoto,
+    'video': InputMediaVideo,
+    'audio': InputMediaAudio,
+    'document': InputMediaDocument,
+}
 
-# Resto del código del servidor web
-async def webhook_handler(request: Request) -> Response:
-    """Maneja webhooks de Telegram"""
-    try:
-        body = await request.text()
-        update = Update.de_json(json.loads(body), bot.app.bot)
-        await bot.app.process_update(update)
-        return Response(text="OK")
-    except Exception as e:
-        logger.error(f"Error en webhook: {e}")
-        return Response(text="ERROR", status=500)
+# Errores de copia que dependen del mensaje original, no del canal destino
+COPY_UNAVAILABLE_ERRORS = ("message to copy not found", "message can't be copied")
 
-async def health_check(request: Request) -> Response:
-    """Health check mejorado"""
-    try:
-        bot_info = await bot.app.bot.get_me()
-        return Response(
-            text=json.dumps({
-                "status": "OK",
-                "bot_username": bot_info.username,
-                "active_users": len(user_data),
-                "features": ["forward_replication", "interactive_buttons", "multi_channel"],
-                "version": "2.0 - Forwarder Edition",
-                "timestamp": datetime.now().isoformat()
-            }),
-            content_type="application/json"
+# Pasos y textos para crear cada tipo de botón
+NEW_BUTTON_PROMPTS = {
+    'add_url_button': ('adding_button_text',
+        "➕ **Crear Botón con Link**\n\n"
+        "✍️ **Paso 1:** Envía el texto del botón\n\n"
+        "**Ejemplos:**\n"
+        "• `🛒 Comprar Ahora`\n"
+        "• `📞 Contactar`\n"
+        "• `📖 Leer Más`\n\n"
+        "Para cancelar, usa /cancelar"),
+    'add_whatsapp_button': ('adding_whatsapp_text',
+        "📞 **Crear Botón de WhatsApp**\n\n"
+        "✍️ **Paso 1:** Envía el texto del botón\n\n"
+        "**Ejemplos:**\n"
+        "• `📞 Contactar por WhatsApp`\n"
+        "• `💬 Chatear ahora`\n"
+        "• `📱 Escribir mensaje`\n\n"
+        "Para cancelar, usa /cancelar"),
+    'add_telegram_button': ('adding_telegram_text',
+        "📺 **Crear Botón de Telegram**\n\n"
+        "✍️ **Paso 1:** Envía el texto del botón\n\n"
+        "**Ejemplos:**\n"
+        "• `📺 Unirse al Canal`\n"
+        "• `💬 Ir al Grupo`\n"
+        "• `📢 Seguir Canal`\n\n"
+        "Para cancelar, usa /cancelar"),
+}
+
+class InstrumentedRequest(HTTPXRequest):
+    """Cliente HTTP de la API para un carril: pool propio con keep-alive, prioridad y latencia por método"""
+    def __init__(self, lane, lanes: PriorityLanes, **kwargs):
+        pool_size = lanes.limits[lane]
+        super().__init__(
+            connection_pool_size=pool_size,
+            httpx_kwargs={'limits': httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            )},
+            **kwargs
         )
-    except Exception as e:
-        return Response(text=f"ERROR: {e}", status=500)
+        self.lane = lane
+        self.lanes = lanes
+    
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            async with self.lanes.slot(self.lane):
+                return await super().do_request(url, method, request_data, **kwargs)
+        except Exception as e:
+            TELEGRAM_API_ERRORS.labels(api_method, type(e).__name__).inc()
+            raise
+        finally:
+            # Incluye la espera de turno en el carril: es la latencia que percibe quien llama
+            TELEGRAM_API_LATENCY.labels(api_method, self.lane).observe(time.perf_counter() - started)
 
-async def setup_webhook():
-    """Configura webhook"""
-    try:
-        webhook_url = f"{WEBHOOK_URL}/webhook"
-        await bot.app.bot.set_webhook(url=webhook_url)
-        logger.info(f"✅ Webhook configurado: {webhook_url}")
-    except Exception as e:
-        logger.error(f"❌ Error webhook: {e}")
+class MediaItem(NamedTuple):
+    """Elemento de media de una publicación: solo lo necesario para reenviarlo"""
+    type: str
+    file_id: str
 
-async def init_app():
-    """Inicializa aplicación"""
-    await bot.app.initialize()
-    await bot.app.start()
-    await setup_webhook()
+# Atributos de Message con media, en orden de prioridad
+MEDIA_ATTRIBUTES = ('photo', 'video', 'animation', 'audio', 'voice', 'document', 'sticker')
+
+class PostButton:
+    """Clase para representar un botón de publicación"""
+    __slots__ = ('text', 'url', 'callback_data', 'button_type')
     
-    app = web.Application()
-    app.router.add_post('/webhook', webhook_handler)
-    app.router.add_get('/', health_check)
-    app.router.add_get('/health', health_check)
+    def __init__(self, text, url=None, callback_data=None, button_type='url'):
+        self.text = text
+        self.url = url
+        self.callback_data = callback_data
+        self.button_type = button_type  # 'url', 'callback', 'inline_query'
     
-    return app
-
-# Instancia del bot
-bot = TelegramBot()
+    def to_telegram_button(self):
+        """Convierte a botón de Telegram"""
+        if self.button_type == 'url' and self.url:
+            return cached_button(self.text, url=self.url)
+        elif self.button_type == 'callback' and self.callback_data:
+            return cached_button(self.text, callback_data=self.callback_data)
+        else:
+            return cached_button(self.text, url=self.url or "https://t.me")
 
-def main():
-    """Función principal"""
-    import asyncio
+class ForwardedPost:
+    """Clase para manejar publicaciones reenviadas.
     
-    try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        app = loop.run_until_complete(init_app())
-        
-        logger.info(f"🚀 Bot Replicador con Botones INICIADO")
-        logger.info(f"🌐 Puerto: {PORT}")
-        logger.info(f"🔗 Webhook: {WEBHOOK_URL}")
-        logger.info(f"🔄 Funcionalidad: Reenvío + Botones + Multi-canal")
-        
-        web.run_app(app, host='0.0.0.0', port=PORT)
-        
-    except Exception as e:
-        logger.error(f"❌ Error crítico: {e}")
-
-if __name__ == "__main__":
-    main()markup=InlineKeyboardMarkup(keyboard),
-            parse_mode=ParseMode.MARKDOWN
-        )
+    Del mensaje original solo se extrae lo que hace falta para replicarlo
+    (ids de origen, texto, entidades y file_ids); el Message no se conserva.
+    """
+    __slots__ = (
+        'text', 'entities', 'media', 'target_channels', '_buttons', '_button_layout',
+        'original_date', 'forward_from', 'publish_key', 'source_chat_id',
+        'source_message_ids', 'text_edited', 'copy_unavailable', '_keyboards'
+    )
     
-    async def manage_channels(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Gestionar canales"""
-        user_id = update.effective_user.id
-        data = self.get_user_data(user_id)
-        
-        if not data['channels']:
-            keyboard = [[InlineKeyboardButton("➕ Añadir Canal", callback_data="add_channel")]]
-            text = """📺 **Gestión de Canales**
-
-❌ No tienes canales configurados.
-
-**Para replicar contenido necesitas:**
-1. Añadir el bot como administrador del canal
-2. Darle permisos de publicación
-3. Registrar el canal en el bot
-
-🔄 **Una vez configurado, simplemente reenvía cualquier publicación al bot**"""
-        else:
-            keyboard = [
-                [InlineKeyboardButton("➕ Añadir Canal", callback_data="add_channel")],
-                [InlineKeyboardButton("🗑️ Eliminar Canal", callback_data="remove_channel")]
-            ]
-            
-            text = f"📺 **Canales Configurados** ({len(data['channels'])})\n\n"
-            
-            for i, (ch_id, ch_info) in enumerate(list(data['channels'].items())[:10], 1):
-                title = ch_info.get('title', 'Canal sin nombre')
-                username = ch_info.get('username', '')
-                if username:
-                    text += f"{i}. **{title}** (@{username})\n"
-                else:
-                    text += f"{i}. **{title}**\n"
-                    
-            if len(data['channels']) > 10:
-                text += f"\n... y {len(data['channels']) - 10} canales más"
-        
-        await update.message.reply_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode=ParseMode.MARKDOWN
-        )
+    def __init__(self, original_message):
+        self._keyboards = {}
+        self.text = self.extract_text(original_message)
+        self.entities = self.extract_entities(original_message)
+        self.media = self.extract_media(original_message)
+        self.target_channels = set()
+        self.buttons = []
+        self.button_layout = "horizontal"
+        self.original_date = original_message.date
+        self.forward_from = self.get_forward_info(original_message)
+        # Clave de idempotencia: una publicación se replica una sola vez
+        self.publish_key = uuid.uuid4().hex
+        # Origen para replicar con copy_message sin reconstruir el contenido
+        self.source_chat_id = original_message.chat_id
+        self.source_message_ids = [original_message.message_id]
+        self.text_edited = False
+        self.copy_unavailable = False
     
-    async def add_channel(self, update, user_id, channel_text):
-        """Añade un canal con validación mejorada"""
-        data = self.get_user_data(user_id)
-        
-        # Limpiar y normalizar texto
-        channel_text = channel_text.strip()
-        original_text = channel_text
-        
-        # Convertir diferentes formatos
-        if channel_text.startswith('https://t.me/'):
-            channel_text = channel_text.replace('https://t.me/', '@')
-        elif channel_text.startswith('t.me/'):
-            channel_text = channel_text.replace('t.me/', '@')
-        elif not channel_text.startswith('@') and not channel_text.startswith('-'):
-            channel_text = f'@{channel_text}'
-        
-        try:
-            # Obtener información del chat
-            if channel_text.startswith('@'):
-                chat = await self.app.bot.get_chat(channel_text)
-            elif channel_text.startswith('-'):
-                chat_id = int(channel_text)
-                chat = await self.app.bot.get_chat(chat_id)
-            else:
-                raise BadRequest("Formato inválido")
-            
-            # Verificar permisos del bot
-            bot_member = await self.app.bot.get_chat_member(chat.id, self.app.bot.id)
-            if bot_member.status not in ['administrator', 'creator']:
-                await update.message.reply_text(
-                    f"❌ **Sin permisos de administrador**\n\n"
-                    f"📢 Canal: **{chat.title}**\n\n"
-                    f"**Solución:**\n"
-                    f"1. Añade el bot como administrador\n"
-                    f"2. Otorga permisos de publicación\n"
-                    f"3. Intenta nuevamente"
-                )
-                return
-            
-            # Verificar si ya existe
-            if str(chat.id) in data['channels']:
-                await update.message.reply_text(
-                    f"⚠️ **Canal ya configurado**\n\n📢 {chat.title}\n\n"
-                    f"🔄 Puedes empezar a reenviar publicaciones para replicar"
-                )
-                return
-            
-            # Guardar canal
-            data['channels'][str(chat.id)] = {
-                'title': chat.title,
-                'username': chat.username,
-                'type': chat.type,
-                'added_date': datetime.now().isoformat()
-            }
-            
-            data['step'] = 'idle'
-            
-            keyboard = [
-                [InlineKeyboardButton("➕ Añadir Otro Canal", callback_data="add_channel")]
-            ]
-            
-            await update.message.reply_text(
-                f"✅ **Canal añadido exitosamente**\n\n"
-                f"📢 **Nombre:** {chat.title}\n"
-                f"📊 **Total canales:** {len(data['channels'])}\n\n"
-                f"🔄 **¡Listo!** Ahora reenvía cualquier publicación al bot y él te permitirá añadir botones y replicarla en tus canales.",
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode=ParseMode.MARKDOWN
-            )
-            
-        except Exception as e:
-            logger.error(f"Error añadiendo canal {original_text}: {e}")
-            await update.message.reply_text(
-                f"❌ **Error:** No se pudo añadir el canal\n\n"
-                f"🔍 **Verificar:**\n"
-                f"• El bot es administrador\n"
-                f"• Tiene permisos de publicación\n"
-                f"• El identificador es correcto\n\n"
-                f"Formato enviado: `{original_text}`",
-                parse_mode=ParseMode.MARKDOWN
-            )
-    
-    async def show_button_template_selection(self, query, data):
-        """Muestra selección de plantillas de botones"""
-        templates = data.get('button_templates', {})
-        
-        keyboard = []
-        for template_name in templates.keys():
-            keyboard.append([InlineKeyboardButton(
-                f"📋 {template_name.title()}",
-                callback_data=f"template_{template_name}"
-            )])
-        
-        keyboard.append([InlineKeyboardButton("⬅️ Volver", callback_data="manage_buttons")])
-        
-        text = "📋 **Plantillas de Botones**\n\n"
-        for name, buttons in templates.items():
-            text += f"**{name.title()}:**\n"
-            for btn in buttons[:2]:
-                text += f"• {btn['text']}\n"
-            if len(buttons) > 2:
-                text += f"• ... y {len(buttons) - 2} más\n"
-            text += "\n"
-        
-        text += "💡 **Tip:** Las plantillas reemplazan botones existentes"
-        
-        await query.edit_message_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode=ParseMode.MARKDOWN
-        )
-
-    async def show_post_menu(self, query, data):
-        """Muestra el menú principal de publicación"""
-        post = data.get('current_post')
-        if not post:
-            await query.edit_message_text("❌ No hay publicación activa")
-            return
-        
-        keyboard = [
-            [InlineKeyboardButton("🔘 Gestionar Botones", callback_data="manage_buttons")],
-            [InlineKeyboardButton("✏️ Editar Texto", callback_data="edit_text"),
-             InlineKeyboardButton("🎯 Seleccionar Canales", callback_data="select_channels")],
-            [InlineKeyboardButton("📋 Usar Plantilla", callback_data="button_templates")],
-            [InlineKeyboardButton("👀 Vista Previa", callback_data="preview"),
-             InlineKeyboardButton("📤 Replicar", callback_data="publish")],
-            [InlineKeyboardButton("❌ Cancelar", callback_data="cancel")]
-        ]
-        
-        # Info del contenido
-        content_type = "📝 Texto"
-        if post.media:
-            media_type = post.media[0]['type']
-            content_icons = {
-                'photo': '📸 Imagen', 'video': '🎥 Video', 'animation': '🎭 GIF',
-                'audio': '🎵 Audio', 'voice': '🎤 Voz', 'document': '📄 Documento',
-                'sticker': '😀 Sticker'
-            }
-            content_type = content_icons.get(media_type, '📎 Media')
-        
-        text = f"🔄 **Replicación de Contenido**\n\n"
-        text += f"📂 **Tipo:** {content_type}\n"
-        text += f"📺 **Canales disponibles:** {len(data['channels'])}\n"
-        text += f"🔘 **Botones:** {len(post.buttons)}\n"
-        text += f"🎯 **Seleccionados:** {len(post.target_channels)}\n\n"
-        text += f"**¿Qué quieres hacer?**"
-        
-        await query.edit_message_text(
-            text,
-            reply_import logging
-import os
-import json
-from datetime import datetime
-from typing import Dict, List, Optional, Set
-from aiohttp import web
-from aiohttp.web_request import Request
-from aiohttp.web_response import Response
-
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
-from telegram.constants import ParseMode
-from telegram.error import TelegramError, Forbidden, BadRequest
-
-# Configuración
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
-
-BOT_TOKEN = os.getenv('BOT_TOKEN')
-PORT = int(os.getenv('PORT', 10000))
-WEBHOOK_URL = os.getenv('WEBHOOK_URL', f'https://botonesbot.onrender.com')
-
-if not BOT_TOKEN:
-    raise ValueError("❌ BOT_TOKEN no configurado")
-
-# Almacenamiento en memoria
-user_data = {}
-
-class PostButton:
-    """Clase para representar un botón de publicación"""
-    def __init__(self, text, url=None, callback_data=None, button_type='url'):
-        self.text = text
-        self.url = url
-        self.callback_data = callback_data
-        self.button_type = button_type  # 'url', 'callback', 'inline_query'
-    
-    def to_telegram_button(self):
-        """Convierte a botón de Telegram"""
-        if self.button_type == 'url' and self.url:
-            return InlineKeyboardButton(self.text, url=self.url)
-        elif self.button_type == 'callback' and self.callback_data:
-            return InlineKeyboardButton(self.text, callback_data=self.callback_data)
-        else:
-            return InlineKeyboardButton(self.text, url=self.url or "https://t.me")
-
-class ForwardedPost:
-    """Clase para manejar publicaciones reenviadas"""
-    def __init__(self, original_message):
-        self.original_message = original_message
-        self.text = self.extract_text()
-        self.media = self.extract_media()
-        self.target_channels = set()
-        self.buttons = []
-        self.button_layout = "horizontal"
-        self.original_date = original_message.date
-        self.forward_from = self.get_forward_info()
+    @classmethod
+    def from_album(cls, messages):
+        """Crea una publicación con todos los elementos de un álbum"""
+        post = cls(messages[0])
+        post.source_message_ids = [m.message_id for m in messages]
+        for message in messages[1:]:
+            post.media.extend(post.extract_media(message))
+            if not post.text:
+                post.text = post.extract_text(message)
+                post.entities = post.extract_entities(message)
+        return post
     
-    def extract_text(self):
+    def extract_text(self, message):
         """Extrae el texto del mensaje original"""
-        if self.original_message.text:
-            return self.original_message.text
-        elif self.original_message.caption:
-            return self.original_message.caption
+        if message.text:
+            return message.text
+        elif message.caption:
+            return message.caption
         return ""
     
-    def extract_media(self):
+    def extract_entities(self, message):
+        """Entidades de formato del texto o caption, como dicts serializables"""
+        entities = message.entities if message.text else message.caption_entities
+        return tuple(entity.to_dict() for entity in entities or ())
+    
+    def extract_media(self, message):
         """Extrae media del mensaje original"""
-        media = []
-        
-        if self.original_message.photo:
-            photo = self.original_message.photo[-1]  # Mejor resolución
-            media.append({
-                'file_id': photo.file_id,
-                'type': 'photo'
-            })
-        elif self.original_message.video:
-            media.append({
-                'file_id': self.original_message.video.file_id,
-                'type': 'video'
-            })
-        elif self.original_message.animation:
-            media.append({
-                'file_id': self.original_message.animation.file_id,
-                'type': 'animation'
-            })
-        elif self.original_message.audio:
-            media.append({
-                'file_id': self.original_message.audio.file_id,
-                'type': 'audio'
-            })
-        elif self.original_message.voice:
-            media.append({
-                'file_id': self.original_message.voice.file_id,
-                'type': 'voice'
-            })
-        elif self.original_message.document:
-            media.append({
-                'file_id': self.original_message.document.file_id,
-                'type': 'document'
-            })
-        elif self.original_message.sticker:
-            media.append({
-                'file_id': self.original_message.sticker.file_id,
-                'type': 'sticker'
-            })
-        
-        return media
-    
-    def get_forward_info(self):
+        for attribute in MEDIA_ATTRIBUTES:
+            item = getattr(message, attribute, None)
+            if item:
+                if attribute == 'photo':
+                    item = item[-1]  # Mejor resolución
+                return [MediaItem(attribute, item.file_id)]
+        return []
+    
+    def get_forward_info(self, message):
         """Obtiene información del reenvío - VERSIÓN CORREGIDA"""
         try:
             # Verificar si es un mensaje reenviado usando los nuevos atributos
-            if hasattr(self.original_message, 'forward_origin') and self.original_message.forward_origin:
-                forward_origin = self.original_message.forward_origin
+            if hasattr(message, 'forward_origin') and message.forward_origin:
+                forward_origin = message.forward_origin
                 
                 # Verificar el tipo de origen del reenvío
                 if hasattr(forward_origin, 'type'):
@@ -567,12 +280,12 @@ class ForwardedPost:
                 return "Mensaje reenviado"
             
             # Verificar atributos legacy por compatibilidad (versiones anteriores)
-            elif hasattr(self.original_message, 'forward_from') and self.original_message.forward_from:
-                return f"Usuario: {self.original_message.forward_from.first_name}"
-            elif hasattr(self.original_message, 'forward_from_chat') and self.original_message.forward_from_chat:
-                return f"Canal: {self.original_message.forward_from_chat.title}"
-            elif hasattr(self.original_message, 'forward_sender_name') and self.original_message.forward_sender_name:
-                return f"Cuenta oculta: {self.original_message.forward_sender_name}"
+            elif hasattr(message, 'forward_from') and message.forward_from:
+                return f"Usuario: {message.forward_from.first_name}"
+            elif hasattr(message, 'forward_from_chat') and message.forward_from_chat:
+                return f"Canal: {message.forward_from_chat.title}"
+            elif hasattr(message, 'forward_sender_name') and message.forward_sender_name:
+                return f"Cuenta oculta: {message.forward_sender_name}"
             
             # Si no es un reenvío, indicar que es mensaje original
             return "Mensaje original"
@@ -581,17 +294,94 @@ class ForwardedPost:
             logger.error(f"Error obteniendo info de reenvío: {e}")
             return "Mensaje original"
     
+    def format_kwargs(self, caption=False):
+        """Formato al reconstruir: entidades originales, o Markdown si el texto se editó"""
+        if self.entities and not self.text_edited:
+            entities = [MessageEntity.de_json(entity) for entity in self.entities]
+            return {'caption_entities' if caption else 'entities': entities}
+        return {'parse_mode': ParseMode.MARKDOWN}
+    
+    @property
+    def buttons(self):
+        return self._buttons
+    
+    @buttons.setter
+    def buttons(self, buttons):
+        self._buttons = buttons
+        self.invalidate_keyboards()
+    
+    @property
+    def button_layout(self):
+        return self._button_layout
+    
+    @button_layout.setter
+    def button_layout(self, layout):
+        self._button_layout = layout
+        self.invalidate_keyboards()
+    
+    def invalidate_keyboards(self):
+        """Descarta los teclados memoizados tras cambiar botones o layout"""
+        self._keyboards = {}
+    
+    def keyboard(self, name, key, build):
+        """Teclado `name` memoizado mientras `key` no cambie y no haya mutaciones"""
+        cached = self._keyboards.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        markup = build()
+        self._keyboards[name] = (key, markup)
+        return markup
+    
+    def toggle_channel(self, ch_id):
+        """Marca o desmarca un canal destino"""
+        if ch_id in self.target_channels:
+            self.target_channels.remove(ch_id)
+        else:
+            self.target_channels.add(ch_id)
+        self._keyboards.pop('channels', None)
+
+    def select_channels(self, ch_ids):
+        """Marca varios canales destino de una vez"""
+        self.target_channels.update(ch_ids)
+        self._keyboards.pop('channels', None)
+
+    def deselect_channels(self, ch_ids):
+        """Desmarca varios canales destino de una vez"""
+        self.target_channels.difference_update(ch_ids)
+        self._keyboards.pop('channels', None)
+
+    def invert_channels(self, ch_ids):
+        """Invierte la selección dentro de `ch_ids`"""
+        self.target_channels.symmetric_difference_update(ch_ids)
+        self._keyboards.pop('channels', None)
+
+    def intersect_channels(self, ch_ids):
+        """Deja seleccionados solo los canales que también están en `ch_ids`"""
+        self.target_channels.intersection_update(ch_ids)
+        self._keyboards.pop('channels', None)
+
+    def replace_channels(self, ch_ids):
+        """Sustituye la selección completa"""
+        self.target_channels = set(ch_ids)
+        self._keyboards.pop('channels', None)
+
     def add_button(self, text, url=None, callback_data=None, button_type='url'):
         """Añade un botón a la publicación"""
         button = PostButton(text, url, callback_data, button_type)
         self.buttons.append(button)
+        self.invalidate_keyboards()
     
     def remove_button(self, index):
         """Elimina un botón por índice"""
         if 0 <= index < len(self.buttons):
             self.buttons.pop(index)
+            self.invalidate_keyboards()
     
     def get_inline_keyboard(self):
+        """Teclado inline de la publicación (se construye una vez por versión)"""
+        return self.keyboard('post', None, self.build_inline_keyboard)
+    
+    def build_inline_keyboard(self):
         """Genera el teclado inline para la publicación"""
         if not self.buttons:
             return None
@@ -618,14 +408,144 @@ class ForwardedPost:
                     keyboard.append(row)
                     row = []
         
-        return InlineKeyboardMarkup(keyboard) if keyboard else None
+        return CachedMarkup(keyboard) if keyboard else None
     
     def has_content(self):
         return bool(self.text or self.media)
+    
+    def can_copy(self):
+        """True si se puede replicar copiando el mensaje original tal cual"""
+        return bool(self.source_chat_id and self.source_message_ids) \
+            and not self.text_edited and not self.copy_unavailable
+    
+    def to_dict(self):
+        """Serializa la publicación"""
+        return {
+            'text': self.text,
+            'entities': list(self.entities),
+            'media': [{'file_id': item.file_id, 'type': item.type} for item in self.media],
+            'buttons': [
+                {'text': b.text, 'url': b.url, 'callback_data': b.callback_data, 'button_type': b.button_type}
+                for b in self.buttons
+            ],
+            'button_layout': self.button_layout,
+            'target_channels': sorted(self.target_channels),
+            'original_date': self.original_date.isoformat() if self.original_date else None,
+            'forward_from': self.forward_from,
+            'publish_key': self.publish_key,
+            'source_chat_id': self.source_chat_id,
+            'source_message_ids': self.source_message_ids,
+            'text_edited': self.text_edited
+        }
+    
+    @classmethod
+    def from_dict(cls, payload):
+        """Reconstruye una publicación serializada con `to_dict`"""
+        post = cls.__new__(cls)
+        post._keyboards = {}
+        post.text = payload.get('text', '')
+        post.entities = tuple(payload.get('entities', ()))
+        post.media = [MediaItem(item['type'], item['file_id']) for item in payload.get('media', [])]
+        post.buttons = [PostButton(**b) for b in payload.get('buttons', [])]
+        post.button_layout = payload.get('button_layout', 'horizontal')
+        post.target_channels = set(payload.get('target_channels', []))
+        original_date = payload.get('original_date')
+        post.original_date = datetime.fromisoformat(original_date) if original_date else None
+        post.forward_from = payload.get('forward_from', 'Mensaje original')
+        post.publish_key = payload.get('publish_key') or uuid.uuid4().hex
+        post.source_chat_id = payload.get('source_chat_id')
+        post.source_message_ids = payload.get('source_message_ids', [])
+        post.text_edited = payload.get('text_edited', False)
+        post.copy_unavailable = False
+        return post
+
+def serialize_session(data):
+    """Convierte una sesión de usuario a JSON"""
+    raw = dict(data)
+    post = raw.get('current_post')
+    raw['current_post'] = post.to_dict() if post else None
+    raw.pop(INDEX_KEY, None)
+    raw['last_activity'] = raw['last_activity'].isoformat()
+    return json.dumps(raw, ensure_ascii=False)
+
+def deserialize_session(text):
+    """Reconstruye una sesión guardada con `serialize_session`"""
+    data = json.loads(text)
+    if data.get('current_post'):
+        data['current_post'] = ForwardedPost.from_dict(data['current_post'])
+    data['last_activity'] = datetime.fromisoformat(data['last_activity'])
+    return data
+
+def normalize_channel_identifier(channel_text):
+    """Normaliza `@nombre`, `t.me/nombre` o `-100…` al formato que acepta la API"""
+    channel_text = channel_text.strip()
+    
+    # Convertir diferentes formatos
+    if channel_text.startswith('https://t.me/'):
+        channel_text = channel_text.replace('https://t.me/', '@')
+    elif channel_text.startswith('t.me/'):
+        channel_text = channel_text.replace('t.me/', '@')
+    elif not channel_text.startswith('@') and not channel_text.startswith('-'):
+        channel_text = f'@{channel_text}'
+    return channel_text
+
+def split_channel_identifiers(text):
+    """Separa una lista pegada o un CSV en identificadores de canal"""
+    # Solo saltos de línea y comas: un nombre con espacios sigue siendo un solo canal
+    tokens = (token.strip() for token in re.split(r'[\n,]', text))
+    return [token for token in tokens if token]
+
+def update_key(update):
+    """Clave de orden de un update: su usuario, o el chat si no lo hay"""
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return update.update_id
 
 class TelegramBot:
     def __init__(self):
-        self.app = Application.builder().token(BOT_TOKEN).build()
+        self.lanes = PriorityLanes()
+        # Carril interactivo: respuestas a botones, ediciones y mensajes al usuario
+        self.app = Application.builder().token(BOT_TOKEN).base_url(TELEGRAM_API_URL).base_file_url(
+            TELEGRAM_FILE_URL
+        ).request(
+            InstrumentedRequest(INTERACTIVE, self.lanes)
+        ).build()
+        # Carril masivo: replicación y verificación en lote, con su propio pool de conexiones
+        self.bulk_request = InstrumentedRequest(BULK, self.lanes)
+        self.bulk_bot = Bot(
+            BOT_TOKEN, base_url=TELEGRAM_API_URL, base_file_url=TELEGRAM_FILE_URL,
+            request=self.bulk_request, get_updates_request=self.bulk_request
+        )
+        self.fanout = FanoutDispatcher()
+        self.store = create_store()
+        self.cluster = create_cluster()
+        self.retry_queue = RetryQueue(self.resend_payload, shared=self.cluster.retries if self.cluster else None)
+        self.sessions = SessionManager(
+            self.store, self.decode_session, self.new_session, serialize_session,
+            # En modo multi-instancia cada update ya escribe su sesión; expulsar no debe volver a hacerlo
+            write_on_evict=self.cluster is None
+        )
+        self.update_queue = UpdateQueue(self.process_update)
+        self.seen_updates = TTLCache()
+        self.published_posts = TTLCache()
+        self.upstream = UpstreamHealth(self.app.bot.get_me)
+        self.loop_monitor = LoopLagMonitor()
+        self.albums = AlbumAggregator(
+            self.handle_album, shared=self.cluster.albums if self.cluster else None,
+            decode=lambda payload: Message.de_json(payload, self.app.bot)
+        )
+        self.scheduler = PublishScheduler(self.run_scheduled_job, shared=self.cluster.jobs if self.cluster else None)
+        self.templates = TemplateRegistry(store=self.cluster.templates if self.cluster else None)
+        self.channels = ChannelCache(
+            # Revalidaciones de fondo: carril masivo, no compiten con las respuestas al usuario
+            lambda ch_id: self.bulk_bot.get_chat_member(int(ch_id), self.app.bot.id),
+            lambda ch_id: self.bulk_bot.get_chat(int(ch_id))
+        )
+        self.router = CallbackRouter()
+        self.startup: Optional[StartupTimer] = None
+        self.setup_callback_routes()
         self.setup_handlers()
     
     def setup_handlers(self):
@@ -635,6 +555,7 @@ class TelegramBot:
         self.app.add_handler(CommandHandler("canales", self.manage_channels))
         self.app.add_handler(CommandHandler("estado", self.status))
         self.app.add_handler(CommandHandler("cancelar", self.cancel))
+        self.app.add_handler(CommandHandler("programadas", self.list_scheduled))
         
         self.app.add_handler(CallbackQueryHandler(self.callback_handler))
         
@@ -643,50 +564,70 @@ class TelegramBot:
             filters.ALL & ~filters.COMMAND, 
             self.handle_forwarded_message
         ))
+        
+        # Tras cada update, programar el guardado de la sesión modificada
+        self.app.add_handler(TypeHandler(Update, self.persist_session), group=1)
+    
+    async def process_update(self, update):
+        """Procesa un update con la sesión de su usuario ya en memoria"""
+        async with self.user_session(update_key(update)):
+            await self.app.process_update(update)
+    
+    @asynccontextmanager
+    async def user_session(self, user_id):
+        """Carga y retiene la sesión sin bloquear el event loop; en modo multi-instancia, con el usuario bloqueado en todo el despliegue"""
+        with self.sessions.pinned(user_id):
+            if self.cluster is None:
+                await self.sessions.aget(user_id)
+                yield
+                return
+            async with self.cluster.user_lock(user_id):
+                # Otra instancia pudo atender a este usuario desde la última vez
+                await self.sessions.reload(user_id)
+                await self.templates.prefetch(self.sessions.peek(user_id))
+                try:
+                    yield
+                finally:
+                    # Escritura inmediata: el siguiente update puede llegar a otra instancia
+                    await self.store.flush_users([user_id])
     
     def get_user_data(self, user_id):
         """Obtiene datos del usuario"""
-        if user_id not in user_data:
-            user_data[user_id] = {
-                'current_post': None,
-                'step': 'idle',
-                'channels': {},
-                'last_activity': datetime.now(),
-                'button_templates': self.get_default_button_templates()
-            }
-        user_data[user_id]['last_activity'] = datetime.now()
-        return user_data[user_id]
+        data = self.sessions.get(user_id)
+        self.mark_session_dirty(user_id)
+        return data
     
-    def get_default_button_templates(self):
-        """Plantillas de botones predefinidas"""
+    def new_session(self):
+        """Sesión vacía para un usuario nuevo"""
+        # Las plantillas predefinidas viven en el registro compartido
         return {
-            'ecommerce': [
-                {'text': '🛒 Comprar Ahora', 'url': 'https://ejemplo.com/producto'},
-                {'text': '📞 Contactar', 'url': 'https://wa.me/1234567890'},
-                {'text': '⭐ Valorar', 'url': 'https://ejemplo.com/review'}
-            ],
-            'social': [
-                {'text': '👍 Me Gusta', 'callback_data': 'like_post'},
-                {'text': '💬 Comentar', 'url': 'https://t.me/mi_canal'},
-                {'text': '🔄 Compartir', 'callback_data': 'share_post'}
-            ],
-            'news': [
-                {'text': '📖 Leer Más', 'url': 'https://ejemplo.com/noticia'},
-                {'text': '🔔 Suscribirse', 'url': 'https://t.me/noticias'},
-                {'text': '📤 Compartir', 'callback_data': 'share_news'}
-            ],
-            'educational': [
-                {'text': '📚 Ver Curso', 'url': 'https://ejemplo.com/curso'},
-                {'text': '🎓 Inscribirse', 'url': 'https://ejemplo.com/registro'},
-                {'text': '💬 Preguntas', 'url': 'https://t.me/soporte'}
-            ],
-            'contact': [
-                {'text': '📞 WhatsApp', 'url': 'https://wa.me/1234567890'},
-                {'text': '📧 Email', 'url': 'mailto:contacto@ejemplo.com'},
-                {'text': '🌐 Web', 'url': 'https://ejemplo.com'}
-            ]
+            'current_post': None,
+            'step': 'idle',
+            'channels': {},
+            'last_activity': datetime.now()
         }
     
+    def decode_session(self, user_id, stored):
+        """Sesión a partir del texto guardado, con migraciones y caducidad aplicadas"""
+        if not stored:
+            return None
+        data = deserialize_session(stored)
+        self.templates.migrate(data)
+        if expire_stale_post(data):
+            logger.info(f"🗑️ Publicación abandonada descartada para {user_id}")
+        return data
+    
+    def mark_session_dirty(self, user_id):
+        """Programa el guardado diferido de la sesión"""
+        session = self.sessions.peek(user_id)
+        if session is not None:
+            self.store.mark_dirty(user_id, lambda: serialize_session(session))
+    
+    async def persist_session(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Marca la sesión del usuario tras procesar el update"""
+        if update.effective_user:
+            self.mark_session_dirty(update.effective_user.id)
+    
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Comando /start"""
         user = update.effective_user
@@ -743,7 +684,10 @@ class TelegramBot:
         
         # Manejar pasos específicos
         if step == 'adding_channel':
-            await self.add_channel(update, user_id, message.text)
+            if message.document:
+                await self.add_channels_from_file(update, user_id)
+            else:
+                await self.add_channel(update, user_id, message.text)
             return
         elif step.startswith('adding_button_'):
             await self.handle_button_creation(update, data, message.text)
@@ -751,6 +695,25 @@ class TelegramBot:
         elif step == 'adding_text' and data.get('current_post'):
             await self.handle_custom_text(update, data, message.text)
             return
+        elif step == 'naming_template':
+            await self.save_template(update, data, message.text or "")
+            return
+        elif step == 'importing_template':
+            await self.import_template(update, data, message.text or "")
+            return
+        elif step == 'searching_channels':
+            query_text = message.text or ""
+            await self.search_channels(update, data, "" if query_text.strip() == "*" else query_text)
+            return
+        elif step == 'naming_group':
+            await self.save_channel_group(update, data, message.text or "")
+            return
+        elif step == 'combining_channels':
+            await self.combine_channels(update, data, message.text or "")
+            return
+        elif step == 'tagging_channels':
+            await self.tag_selected_channels(update, data, message.text or "")
+            return
         
         # Manejar botones del teclado principal
         if message.text:
@@ -779,9 +742,32 @@ class TelegramBot:
             )
             return
         
+        # Los álbumes llegan como varios mensajes: se agrupan antes de capturar
+        if message.media_group_id:
+            await self.albums.add(user_id, message)
+            return
+        
+        await self.capture_post(data, [message])
+    
+    async def handle_album(self, user_id, messages):
+        """Crea una sola publicación con todos los elementos de un álbum"""
+        # Llega desde el temporizador del agregador, fuera de process_update: mismo bloqueo,
+        # recarga y escritura que un update
+        async with self.user_session(user_id):
+            data = self.get_user_data(user_id)
+            await self.capture_post(data, messages)
+            self.mark_session_dirty(user_id)
+    
+    async def capture_post(self, data, messages):
+        """Crea la publicación desde los mensajes y muestra el menú de edición"""
+        message = messages[0]
+        
         # AQUÍ ES LA MAGIA: Crear publicación desde mensaje
         try:
-            forwarded_post = ForwardedPost(message)
+            if len(messages) > 1:
+                forwarded_post = ForwardedPost.from_album(messages)
+            else:
+                forwarded_post = ForwardedPost(message)
             data['current_post'] = forwarded_post
             data['step'] = 'editing'
         except Exception as e:
@@ -795,7 +781,7 @@ class TelegramBot:
         # Determinar tipo de contenido
         content_type = "📝 Texto"
         if forwarded_post.media:
-            media_type = forwarded_post.media[0]['type']
+            media_type = forwarded_post.media[0].type
             content_icons = {
                 'photo': '📸 Imagen',
                 'video': '🎥 Video', 
@@ -806,13 +792,16 @@ class TelegramBot:
                 'sticker': '😀 Sticker'
             }
             content_type = content_icons.get(media_type, '📎 Media')
+        if len(forwarded_post.media) > 1:
+            content_type = f"🖼️ Álbum ({len(forwarded_post.media)} elementos)"
         
         # Mostrar menú de edición
         keyboard = [
             [InlineKeyboardButton("🔘 Añadir Botones", callback_data="manage_buttons")],
             [InlineKeyboardButton("✏️ Editar Texto", callback_data="edit_text"),
              InlineKeyboardButton("🎯 Seleccionar Canales", callback_data="select_channels")],
-            [InlineKeyboardButton("📋 Usar Plantilla", callback_data="button_templates")],
+            [InlineKeyboardButton("📋 Usar Plantilla", callback_data="button_templates"),
+             InlineKeyboardButton("⏰ Programar", callback_data="schedule_menu")],
             [InlineKeyboardButton("👀 Vista Previa", callback_data="preview"),
              InlineKeyboardButton("📤 Replicar", callback_data="publish")],
             [InlineKeyboardButton("❌ Cancelar", callback_data="cancel")]
@@ -839,142 +828,403 @@ class TelegramBot:
         )
     
     async def callback_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Maneja callbacks de botones"""
+        """Maneja callbacks de botones midiendo la duración de cada acción"""
+        route, args = self.router.resolve(update.callback_query.data or "")
+        started = time.perf_counter()
+        try:
+            await self.route_callback(update, route, args)
+        except Exception:
+            CALLBACK_ERRORS.labels(route.action).inc()
+            raise
+        finally:
+            CALLBACK_LATENCY.labels(route.action).observe(time.perf_counter() - started)
+    
+    async def route_callback(self, update: Update, route, args):
+        """Despacha el callback a la acción correspondiente"""
         query = update.callback_query
         await query.answer()
         
+        if route.handler is None:
+            if route.action == 'expired':
+                await query.edit_message_text("⚠️ Este menú ha caducado, vuelve a abrirlo")
+            return
+        
         user_id = query.from_user.id
         data = self.get_user_data(user_id)
-        callback_data = query.data
+        await route.handler(query, data, user_id, *args)
+    
+    def setup_callback_routes(self):
+        """Registra las acciones de los botones inline"""
+        router = self.router
         
         # Gestión de botones
-        if callback_data == "manage_buttons":
-            await self.show_button_management(query, data)
-        elif callback_data == "add_button":
-            await self.add_button_menu(query, data)
-        elif callback_data == "remove_button":
-            await self.remove_button_menu(query, data)
-        elif callback_data == "button_layout":
-            await self.button_layout_menu(query, data)
-        elif callback_data.startswith("layout_"):
-            layout = callback_data.replace("layout_", "")
-            if data.get('current_post'):
-                data['current_post'].button_layout = layout
-                await query.edit_message_text(
-                    f"✅ **Layout actualizado**: {layout.title()}",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-        elif callback_data.startswith("template_"):
-            template_name = callback_data.replace("template_", "")
-            await self.apply_button_template(query, data, template_name)
-        elif callback_data.startswith("remove_btn_"):
-            btn_index = int(callback_data.replace("remove_btn_", ""))
-            if data.get('current_post'):
-                data['current_post'].remove_button(btn_index)
-                await self.show_button_management(query, data)
+        router.add("manage_buttons", lambda query, data, user_id: self.show_button_management(query, data))
+        router.add("add_button", lambda query, data, user_id: self.add_button_menu(query, data))
+        router.add("remove_button", lambda query, data, user_id: self.remove_button_menu(query, data))
+        router.add("button_layout", lambda query, data, user_id: self.button_layout_menu(query, data))
+        router.add_prefix("layout_", self.on_layout)
+        router.add_prefix("template_", lambda query, data, user_id, name: self.apply_button_template(query, data, name))
+        router.add("save_template", self.prompt_save_template)
+        router.add("import_template", self.prompt_import_template)
+        router.add_prefix("share_tpl_", lambda query, data, user_id, name: self.share_template(query, data, user_id, name))
+        router.add_prefix("del_tpl_", self.on_delete_template)
+        router.add_prefix("remove_btn_", self.on_remove_button)
+        router.add_compact("r", self.on_remove_button, "remove_btn_", (int,))
         
         # Callbacks para creación de botones
-        elif callback_data == "add_url_button":
-            data['step'] = 'adding_button_text'
-            await query.edit_message_text(
-                "➕ **Crear Botón con Link**\n\n"
-                "✍️ **Paso 1:** Envía el texto del botón\n\n"
-                "**Ejemplos:**\n"
-                "• `🛒 Comprar Ahora`\n"
-                "• `📞 Contactar`\n"
-                "• `📖 Leer Más`\n\n"
-                "Para cancelar, usa /cancelar",
-                parse_mode=ParseMode.MARKDOWN
-            )
-        elif callback_data == "add_whatsapp_button":
-            data['step'] = 'adding_whatsapp_text'
-            await query.edit_message_text(
-                "📞 **Crear Botón de WhatsApp**\n\n"
-                "✍️ **Paso 1:** Envía el texto del botón\n\n"
-                "**Ejemplos:**\n"
-                "• `📞 Contactar por WhatsApp`\n"
-                "• `💬 Chatear ahora`\n"
-                "• `📱 Escribir mensaje`\n\n"
-                "Para cancelar, usa /cancelar",
-                parse_mode=ParseMode.MARKDOWN
-            )
-        elif callback_data == "add_telegram_button":
-            data['step'] = 'adding_telegram_text'
-            await query.edit_message_text(
-                "📺 **Crear Botón de Telegram**\n\n"
-                "✍️ **Paso 1:** Envía el texto del botón\n\n"
-                "**Ejemplos:**\n"
-                "• `📺 Unirse al Canal`\n"
-                "• `💬 Ir al Grupo`\n"
-                "• `📢 Seguir Canal`\n\n"
-                "Para cancelar, usa /cancelar",
-                parse_mode=ParseMode.MARKDOWN
-            )
-        
-        elif callback_data == "button_templates":
-            await self.show_button_template_selection(query, data)
-        
-        elif callback_data == "back_to_post":
-            await self.show_post_menu(query, data)
+        for action in NEW_BUTTON_PROMPTS:
+            router.add(action, self.prompt_new_button)
+        router.add("button_templates", lambda query, data, user_id: self.show_button_template_selection(query, data))
+        router.add("back_to_post", lambda query, data, user_id: self.show_post_menu(query, data))
         
         # Callbacks principales
-        elif callback_data == "add_channel":
-            data['step'] = 'adding_channel'
+        router.add("add_channel", self.prompt_add_channel)
+        router.add("select_channels", self.on_select_channels)
+        router.add_prefix("toggle_", self.on_toggle_channel)
+        router.add_compact("t", self.on_toggle_channel, "toggle_", (int,))
+        router.add_compact("p", self.on_channel_page, "channel_page", (int,))
+        router.add("ch_all", self.on_select_all, "channel_bulk")
+        router.add("ch_none", self.on_select_none, "channel_bulk")
+        router.add("ch_invert", self.on_invert_selection, "channel_bulk")
+        router.add("ch_search", self.prompt_channel_search)
+        router.add("ch_tags", lambda query, data, user_id: self.show_tag_menu(query, data))
+        router.add("ch_tag_prompt", self.prompt_tag_channels)
+        router.add("ch_groups", lambda query, data, user_id: self.show_group_menu(query, data))
+        router.add("grp_save", self.prompt_save_group)
+        router.add("ch_combine", self.prompt_combine_channels)
+        router.add_compact("s", self.on_channel_set, "channel_set", (str, str))
+        router.add_compact("gd", self.on_delete_group, "channel_group_delete", (str,))
+        router.add_compact("m", self.on_channel_list_page, "channel_list_page", (int,))
+        # Indicador de página: solo se responde al callback
+        router.add("noop", None)
+        router.add("edit_text", self.prompt_edit_text)
+        router.add("preview", lambda query, data, user_id: self.show_preview(query, data))
+        router.add("publish", lambda query, data, user_id: self.publish_post(query, user_id))
+        router.add("schedule_menu", lambda query, data, user_id: self.show_schedule_menu(query, data))
+        router.add_prefix("schedule_", lambda query, data, user_id, option: self.schedule_post(query, user_id, option))
+        router.add_prefix("unschedule_", self.on_unschedule)
+        router.add("cancel", self.on_cancel)
+    
+    async def on_layout(self, query, data, user_id, layout):
+        if data.get('current_post'):
+            data['current_post'].button_layout = layout
             await query.edit_message_text(
-                """➕ **Añadir Canal**
-
-**Instrucciones:**
-1️⃣ Añade el bot como administrador del canal
-2️⃣ Otorga permisos de publicación  
-3️⃣ Envía el identificador del canal
-
-**Formatos válidos:**
-• `@nombre_canal`
-• `https://t.me/nombre_canal`
-• `-100xxxxxxxxx`
+                f"✅ **Layout actualizado**: {layout.title()}",
+                parse_mode=ParseMode.MARKDOWN
+            )
+    
+    async def prompt_save_template(self, query, data, user_id):
+        data['step'] = 'naming_template'
+        await query.edit_message_text(
+            "💾 **Guardar Plantilla**\n\n"
+            "✍️ Envía un nombre para la plantilla con los botones actuales\n\n"
+            "Para cancelar, usa /cancelar",
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def prompt_import_template(self, query, data, user_id):
+        data['step'] = 'importing_template'
+        await query.edit_message_text(
+            "📥 **Importar Plantilla**\n\n"
+            "🔑 Envía el código de la plantilla compartida\n\n"
+            "Para cancelar, usa /cancelar",
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def on_delete_template(self, query, data, user_id, name):
+        self.templates.delete_user_template(data, name)
+        await self.show_button_template_selection(query, data)
+    
+    async def on_remove_button(self, query, data, user_id, btn_index):
+        if data.get('current_post'):
+            data['current_post'].remove_button(int(btn_index))
+            await self.show_button_management(query, data)
+    
+    async def prompt_new_button(self, query, data, user_id):
+        step, text = NEW_BUTTON_PROMPTS[query.data]
+        data['step'] = step
+        await query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN)
+    
+    async def prompt_add_channel(self, query, data, user_id):
+        data['step'] = 'adding_channel'
+        await query.edit_message_text(
+            """➕ **Añadir Canal**
+
+**Instrucciones:**
+1️⃣ Añade el bot como administrador del canal
+2️⃣ Otorga permisos de publicación  
+3️⃣ Envía el identificador del canal
+
+**Formatos válidos:**
+• `@nombre_canal`
+• `https://t.me/nombre_canal`
+• `-100xxxxxxxxx`
+
+📥 **Importación masiva:** envía varios identificadores (uno por línea o separados por comas) o un archivo `.txt`/`.csv`
 
 📝 **Envía el identificador:**""",
-                parse_mode=ParseMode.MARKDOWN
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def on_select_channels(self, query, data, user_id):
+        if not data.get('current_post'):
+            await query.edit_message_text("❌ No hay publicación activa")
+            return
+        await self.show_channel_selection(query, data)
+    
+    async def on_toggle_channel(self, query, data, user_id, ch_id):
+        if data.get('current_post'):
+            data['current_post'].toggle_channel(str(ch_id))
+            await self.show_channel_selection(query, data)
+    
+    async def on_channel_page(self, query, data, user_id, page):
+        if data.get('current_post'):
+            picker_state(data)['page'] = page
+            await self.show_channel_selection(query, data)
+    
+    async def on_select_all(self, query, data, user_id):
+        if data.get('current_post'):
+            data['current_post'].select_channels(self.visible_channel_ids(data))
+            await self.show_channel_selection(query, data)
+    
+    async def on_select_none(self, query, data, user_id):
+        if data.get('current_post'):
+            post = data['current_post']
+            post.deselect_channels(channel_index(data).filter(picker_state(data)['query']))
+            await self.show_channel_selection(query, data)
+    
+    async def on_invert_selection(self, query, data, user_id):
+        if data.get('current_post'):
+            data['current_post'].invert_channels(self.visible_channel_ids(data))
+            await self.show_channel_selection(query, data)
+    
+    async def prompt_channel_search(self, query, data, user_id):
+        data['step'] = 'searching_channels'
+        await query.edit_message_text(
+            "🔍 **Buscar Canales**\n\n"
+            "✍️ Envía parte del nombre, @usuario o id del canal\n"
+            "Envía `*` para quitar el filtro\n\n"
+            "Para cancelar, usa /cancelar",
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def prompt_tag_channels(self, query, data, user_id):
+        data['step'] = 'tagging_channels'
+        await query.edit_message_text(
+            "🏷️ **Etiquetar Selección**\n\n"
+            "✍️ Envía una etiqueta para los canales seleccionados\n"
+            "Con `-` delante se quita (p. ej. `-ventas`)\n\n"
+            "Para cancelar, usa /cancelar",
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def prompt_save_group(self, query, data, user_id):
+        data['step'] = 'naming_group'
+        await query.edit_message_text(
+            "💾 **Guardar Grupo**\n\n"
+            "✍️ Envía un nombre para el grupo con los canales seleccionados\n\n"
+            "Para cancelar, usa /cancelar",
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def prompt_combine_channels(self, query, data, user_id):
+        data['step'] = 'combining_channels'
+        await query.edit_message_text(
+            "🧮 **Combinar Grupos y Etiquetas**\n\n"
+            "✍️ Envía una expresión; el resultado sustituye la selección\n\n"
+            "• `#etiqueta` o `grupo` - sus canales\n"
+            "• `*` - todos los canales\n"
+            "• `+` unión, `&` intersección, `-` exclusión\n"
+            "• Se evalúa de izquierda a derecha; usa paréntesis para agrupar\n\n"
+            "Ejemplo: `(#promo + ventas) - #pausados`\n\n"
+            "Para cancelar, usa /cancelar",
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def on_channel_set(self, query, data, user_id, operation, term):
+        post = data.get('current_post')
+        if not post:
+            return
+        try:
+            members = channel_index(data).term(term)
+        except ValueError:
+            await self.show_channel_selection(query, data)
+            return
+        if operation == 'u':
+            blocked = self.channels.unwritable(members)
+            post.select_channels(members - blocked)
+        elif operation == 'i':
+            post.intersect_channels(members)
+        elif operation == 'x':
+            post.deselect_channels(members)
+        await self.show_channel_selection(query, data)
+    
+    async def on_delete_group(self, query, data, user_id, name):
+        delete_group(data, name)
+        await self.show_group_menu(query, data)
+    
+    async def on_channel_list_page(self, query, data, user_id, page):
+        text, keyboard = self.render_channel_list(data, page)
+        await query.edit_message_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def prompt_edit_text(self, query, data, user_id):
+        data['step'] = 'adding_text'
+        current_text = data['current_post'].text if data.get('current_post') else ""
+        await query.edit_message_text(
+            f"✏️ **Editar Texto**\n\n"
+            f"📝 **Texto actual:**\n_{current_text}_\n\n"
+            f"Envía el nuevo texto o usa /cancelar para mantener el actual",
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def on_unschedule(self, query, data, user_id, job_id):
+        if await self.scheduler.cancel(job_id, user_id):
+            await query.edit_message_text("🗑️ **Programación cancelada**", parse_mode=ParseMode.MARKDOWN)
+        else:
+            await query.edit_message_text("❌ La programación ya no existe o está en curso")
+    
+    async def on_cancel(self, query, data, user_id):
+        data['current_post'] = None
+        data['step'] = 'idle'
+        await query.edit_message_text(
+            "❌ **Replicación cancelada**\n\n"
+            "🔄 Puedes reenviar otra publicación cuando quieras"
+        )
+    
+    async def show_schedule_menu(self, query, data):
+        """Menú para programar la replicación"""
+        post = data.get('current_post')
+        if not post:
+            await query.edit_message_text("❌ No hay publicación activa")
+            return
+        
+        keyboard = [
+            [InlineKeyboardButton(label, callback_data=f"schedule_{key}")]
+            for key, (label, _, _) in SCHEDULE_OPTIONS.items()
+        ]
+        keyboard.append([InlineKeyboardButton("⬅️ Volver", callback_data="back_to_post")])
+        
+        await query.edit_message_text(
+            f"⏰ **Programar Replicación**\n\n"
+            f"🎯 **Canales seleccionados:** {len(post.target_channels)}\n\n"
+            f"**Escalonar** reparte los canales en tandas a lo largo del periodo "
+            f"para no superar los límites de Telegram.\n\n"
+            f"Selecciona cuándo publicar:",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def schedule_post(self, query, user_id, option):
+        """Programa la publicación actual para más tarde"""
+        data = self.get_user_data(user_id)
+        post = data.get('current_post')
+        
+        if option not in SCHEDULE_OPTIONS:
+            await query.edit_message_text("❌ Opción de programación no válida")
+            return
+        
+        if not post:
+            await query.edit_message_text("❌ No hay publicación activa")
+            return
+        
+        if not post.target_channels:
+            await query.edit_message_text("❌ Selecciona al menos un canal")
+            return
+        
+        if not post.has_content():
+            await query.edit_message_text("❌ La publicación está vacía")
+            return
+        
+        label, delay_minutes, spread_minutes = SCHEDULE_OPTIONS[option]
+        start = time.time() + delay_minutes * 60
+        payload = post.to_dict()
+        
+        if spread_minutes:
+            jobs = await self.scheduler.schedule_spread(
+                user_id, payload, post.target_channels, start,
+                spread_minutes * 60, max(1, spread_minutes // SCHEDULE_SPREAD_STEP_MINUTES)
             )
+        else:
+            jobs = [await self.scheduler.schedule(user_id, payload, post.target_channels, start)]
         
-        elif callback_data == "select_channels":
-            if not data.get('current_post'):
-                await query.edit_message_text("❌ No hay publicación activa")
-                return
-            await self.show_channel_selection(query, data)
+        # Limpiar datos
+        data['current_post'] = None
+        data['step'] = 'idle'
         
-        elif callback_data.startswith("toggle_"):
-            ch_id = callback_data.replace("toggle_", "")
-            if data.get('current_post'):
-                if ch_id in data['current_post'].target_channels:
-                    data['current_post'].target_channels.remove(ch_id)
-                else:
-                    data['current_post'].target_channels.add(ch_id)
-                await self.show_channel_selection(query, data)
-        
-        elif callback_data == "edit_text":
-            data['step'] = 'adding_text'
-            current_text = data['current_post'].text if data.get('current_post') else ""
-            await query.edit_message_text(
-                f"✏️ **Editar Texto**\n\n"
-                f"📝 **Texto actual:**\n_{current_text}_\n\n"
-                f"Envía el nuevo texto o usa /cancelar para mantener el actual",
+        text = f"⏰ **Replicación programada**\n\n"
+        text += f"🎯 **Canales:** {len(post.target_channels)}\n"
+        text += f"🔘 **Botones:** {len(post.buttons)}\n\n"
+        for job in jobs:
+            when = datetime.fromtimestamp(job['due']).strftime('%d/%m %H:%M')
+            text += f"• {when} → {len(job['channels'])} canales\n"
+        text += f"\n📋 Consulta o cancela con /programadas"
+        
+        await query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN)
+    
+    async def list_scheduled(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Lista las replicaciones programadas del usuario"""
+        user_id = update.effective_user.id
+        await self.scheduler.refresh()
+        jobs = self.scheduler.jobs_for(user_id)
+        
+        if not jobs:
+            await update.message.reply_text(
+                "⏰ **No tienes replicaciones programadas**\n\n"
+                "Usa el botón ⏰ Programar al preparar una publicación.",
                 parse_mode=ParseMode.MARKDOWN
             )
+            return
         
-        elif callback_data == "preview":
-            await self.show_preview(query, data)
+        text = f"⏰ **Replicaciones Programadas** ({len(jobs)})\n\n"
+        keyboard = []
+        for i, job in enumerate(jobs[:10], 1):
+            when = datetime.fromtimestamp(job['due']).strftime('%d/%m %H:%M')
+            preview = (job['payload'].get('text') or '📎 Media')[:30]
+            text += f"{i}. **{when}** → {len(job['channels'])} canales\n   _{preview}_\n"
+            keyboard.append([InlineKeyboardButton(f"🗑️ Cancelar {i} ({when})", callback_data=f"unschedule_{job['id']}")])
         
-        elif callback_data == "publish":
-            await self.publish_post(query, user_id)
+        if len(jobs) > 10:
+            text += f"\n... y {len(jobs) - 10} más"
         
-        elif callback_data == "cancel":
-            data['current_post'] = None
-            data['step'] = 'idle'
-            await query.edit_message_text(
-                "❌ **Replicación cancelada**\n\n"
-                "🔄 Puedes reenviar otra publicación cuando quieras"
-            )
+        await update.message.reply_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def run_scheduled_job(self, job):
+        """Ejecuta una replicación programada y avisa al usuario"""
+        post = ForwardedPost.from_dict(job['payload'])
+        reply_markup = post.get_inline_keyboard()
+        user_id = job['user_id']
+        
+        blocked = self.channels.unwritable(job['channels'])
+        outcomes = await self.fanout.run(
+            [ch_id for ch_id in job['channels'] if ch_id not in blocked],
+            lambda ch_id: self.deliver_to_channel(ch_id, post, reply_markup, user_id)
+        )
+        success_count = sum(1 for _, ok, _ in outcomes if ok)
+        queued_count = sum(1 for _, _, error in outcomes if isinstance(error, QueuedForRetry))
+        for ch_id, ok, error in outcomes:
+            if not ok and not isinstance(error, QueuedForRetry):
+                logger.error(f"Error replicando en {ch_id}: {error}")
+        
+        text = f"⏰ **Replicación programada completada**\n\n"
+        text += f"✅ **Exitosas:** {success_count}/{len(job['channels'])}\n"
+        if queued_count:
+            text += f"⏳ **En reintento:** {queued_count}\n"
+        if blocked:
+            text += f"🔒 **Omitidos sin permisos:** {len(blocked)}\n"
+        text += f"📅 **Origen:** {post.forward_from}"
+        
+        try:
+            await self.app.bot.send_message(chat_id=user_id, text=text, parse_mode=ParseMode.MARKDOWN)
+        except TelegramError as e:
+            logger.error(f"Error avisando a {user_id} de la programación {job['id']}: {e}")
     
     async def handle_custom_text(self, update, data, text):
         """Maneja texto personalizado para la publicación"""
@@ -985,6 +1235,8 @@ class TelegramBot:
             return
         
         data['current_post'].text = text
+        # El texto ya no es el original: hay que reconstruir, no copiar
+        data['current_post'].text_edited = True
         data['step'] = 'editing'
         
         keyboard = [
@@ -1018,25 +1270,27 @@ class TelegramBot:
                 icon = "🔗" if button.button_type == 'url' else "⚡"
                 text += f"{i}. {icon} {button.text}\n"
         
+        await query.edit_message_text(
+            text,
+            reply_markup=post.keyboard('manage', None, lambda: self.build_button_management_keyboard(post)),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    def build_button_management_keyboard(self, post):
         keyboard = [
-            [InlineKeyboardButton("➕ Añadir Botón", callback_data="add_button")],
-            [InlineKeyboardButton("📐 Cambiar Layout", callback_data="button_layout")],
-            [InlineKeyboardButton("📋 Usar Plantilla", callback_data="button_templates")]
+            [cached_button("➕ Añadir Botón", callback_data="add_button")],
+            [cached_button("📐 Cambiar Layout", callback_data="button_layout")],
+            [cached_button("📋 Usar Plantilla", callback_data="button_templates")]
         ]
         
         if post.buttons:
-            keyboard.insert(1, [InlineKeyboardButton("🗑️ Quitar Botón", callback_data="remove_button")])
+            keyboard.insert(1, [cached_button("🗑️ Quitar Botón", callback_data="remove_button")])
         
         keyboard.extend([
-            [InlineKeyboardButton("👀 Vista Previa", callback_data="preview")],
-            [InlineKeyboardButton("⬅️ Volver", callback_data="back_to_post")]
+            [cached_button("👀 Vista Previa", callback_data="preview")],
+            [cached_button("⬅️ Volver", callback_data="back_to_post")]
         ])
-        
-        await query.edit_message_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode=ParseMode.MARKDOWN
-        )
+        return CachedMarkup(keyboard)
     
     async def add_button_menu(self, query, data):
         """Menú para añadir botón"""
@@ -1081,19 +1335,21 @@ class TelegramBot:
             await query.edit_message_text("❌ No hay botones para quitar")
             return
         
+        await query.edit_message_text(
+            "🗑️ **Quitar Botón**\n\nSelecciona el botón a eliminar:",
+            reply_markup=post.keyboard('remove', None, lambda: self.build_remove_button_keyboard(post))
+        )
+    
+    def build_remove_button_keyboard(self, post):
         keyboard = []
         for i, button in enumerate(post.buttons):
-            keyboard.append([InlineKeyboardButton(
+            keyboard.append([cached_button(
                 f"🗑️ {button.text[:25]}...",
-                callback_data=f"remove_btn_{i}"
+                callback_data=self.router.encode('r', i)
             )])
         
-        keyboard.append([InlineKeyboardButton("⬅️ Volver", callback_data="manage_buttons")])
-        
-        await query.edit_message_text(
-            "🗑️ **Quitar Botón**\n\nSelecciona el botón a eliminar:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        keyboard.append([cached_button("⬅️ Volver", callback_data="manage_buttons")])
+        return CachedMarkup(keyboard)
     
     async def show_preview(self, query, data):
         """Muestra vista previa con botones"""
@@ -1106,13 +1362,16 @@ class TelegramBot:
         
         # Info del contenido
         if post.media:
-            media_type = post.media[0]['type']
+            media_type = post.media[0].type
             content_icons = {
                 'photo': '📸 Imagen', 'video': '🎥 Video', 'animation': '🎭 GIF',
                 'audio': '🎵 Audio', 'voice': '🎤 Voz', 'document': '📄 Documento',
                 'sticker': '😀 Sticker'
             }
-            text += f"📂 **Contenido:** {content_icons.get(media_type, '📎 Media')}\n"
+            if len(post.media) > 1:
+                text += f"📂 **Contenido:** 🖼️ Álbum ({len(post.media)} elementos)\n"
+            else:
+                text += f"📂 **Contenido:** {content_icons.get(media_type, '📎 Media')}\n"
         
         if post.text:
             preview_text = post.text[:150] + "..." if len(post.text) > 150 else post.text
@@ -1149,7 +1408,7 @@ class TelegramBot:
             await query.message.reply_text(
                 post.text or "📢 Tu contenido replicado",
                 reply_markup=preview_keyboard,
-                parse_mode=ParseMode.MARKDOWN
+                **post.format_kwargs()
             )
     
     async def apply_button_template(self, query, data, template_name):
@@ -1159,8 +1418,8 @@ class TelegramBot:
             await query.edit_message_text("❌ No hay publicación activa")
             return
         
-        templates = data.get('button_templates', {})
-        if template_name not in templates:
+        template = self.templates.get(data, template_name)
+        if template is None:
             await query.edit_message_text("❌ Plantilla no encontrada")
             return
         
@@ -1168,7 +1427,7 @@ class TelegramBot:
         post.buttons = []
         
         # Añadir botones de la plantilla
-        for btn_data in templates[template_name]:
+        for btn_data in template:
             post.add_button(
                 text=btn_data['text'],
                 url=btn_data.get('url'),
@@ -1177,7 +1436,7 @@ class TelegramBot:
             )
         
         await query.edit_message_text(
-            f"✅ **Plantilla aplicada: {template_name.title()}**\n\n"
+            f"✅ **Plantilla aplicada: {template_title(template_name)}**\n\n"
             f"📊 Botones añadidos: {len(post.buttons)}\n\n"
             f"Puedes editarlos individualmente si necesitas.",
             parse_mode=ParseMode.MARKDOWN
@@ -1200,109 +1459,58 @@ class TelegramBot:
             await query.edit_message_text("❌ La publicación está vacía")
             return
         
-        # Mostrar progreso
-        await query.edit_message_text("🚀 **Replicando con botones...**\n\n⏳ Enviando a los canales...")
-        
-        # Generar teclado de botones
-        reply_markup = post.get_inline_keyboard()
-        
-        # Replicar en cada canal
-        results = []
-        success_count = 0
+        if not self.published_posts.add(post.publish_key):
+            logger.warning(f"⚠️ Replicación duplicada ignorada: {post.publish_key}")
+            return
         
-        for i, ch_id in enumerate(post.target_channels, 1):
-            try:
-                channel_info = data['channels'][ch_id]
-                channel_name = channel_info.get('title', 'Canal')
-                
-                # Enviar contenido con botones según el tipo
-                if post.media:
-                    media_item = post.media[0]
-                    media_type = media_item['type']
-                    file_id = media_item['file_id']
-                    
-                    if media_type == 'photo':
-                        await self.app.bot.send_photo(
-                            chat_id=ch_id,
-                            photo=file_id,
-                            caption=post.text or "",
-                            reply_markup=reply_markup,
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                    elif media_type == 'video':
-                        await self.app.bot.send_video(
-                            chat_id=ch_id,
-                            video=file_id,
-                            caption=post.text or "",
-                            reply_markup=reply_markup,
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                    elif media_type == 'animation':
-                        await self.app.bot.send_animation(
-                            chat_id=ch_id,
-                            animation=file_id,
-                            caption=post.text or "",
-                            reply_markup=reply_markup,
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                    elif media_type == 'audio':
-                        await self.app.bot.send_audio(
-                            chat_id=ch_id,
-                            audio=file_id,
-                            caption=post.text or "",
-                            reply_markup=reply_markup,
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                    elif media_type == 'voice':
-                        await self.app.bot.send_voice(
-                            chat_id=ch_id,
-                            voice=file_id,
-                            caption=post.text or "",
-                            reply_markup=reply_markup,
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                    elif media_type == 'document':
-                        await self.app.bot.send_document(
-                            chat_id=ch_id,
-                            document=file_id,
-                            caption=post.text or "",
-                            reply_markup=reply_markup,
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                    elif media_type == 'sticker':
-                        # Los stickers no pueden tener caption, enviamos texto separado si hay botones
-                        await self.app.bot.send_sticker(
-                            chat_id=ch_id,
-                            sticker=file_id
-                        )
-                        if post.text or reply_markup:
-                            await self.app.bot.send_message(
-                                chat_id=ch_id,
-                                text=post.text or "📢 Contenido replicado",
-                                reply_markup=reply_markup,
-                                parse_mode=ParseMode.MARKDOWN
-                            )
-                else:
-                    # Solo texto con botones
-                    await self.app.bot.send_message(
-                        chat_id=ch_id,
-                        text=post.text or "📢 Contenido replicado",
-                        reply_markup=reply_markup,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                
+        try:
+            # Mostrar progreso
+            await query.edit_message_text("🚀 **Replicando con botones...**\n\n⏳ Enviando a los canales...")
+            
+            # Generar teclado de botones
+            reply_markup = post.get_inline_keyboard()
+            
+            # Replicar en todos los canales a la vez
+            results = []
+            success_count = 0
+            
+            # Canales donde ya se sabe que el bot no puede publicar: no gastar llamadas
+            blocked = self.channels.unwritable(post.target_channels)
+            for ch_id in blocked:
+                channel_name = data['channels'].get(ch_id, {}).get('title', 'Canal')
+                results.append(f"🔒 **{channel_name}**: Sin permisos (omitido)")
+            
+            outcomes = await self.fanout.run(
+                [ch_id for ch_id in post.target_channels if ch_id not in blocked],
+                lambda ch_id: self.deliver_to_channel(ch_id, post, reply_markup, user_id)
+            )
+        except Exception:
+            # No se llegó a replicar: liberar la clave para que el usuario pueda reintentar
+            self.published_posts.discard(post.publish_key)
+            raise
+        
+        for ch_id, ok, error in outcomes:
+            channel_name = data['channels'].get(ch_id, {}).get('title', 'Canal')
+            if ok:
                 results.append(f"✅ **{channel_name}**")
                 success_count += 1
-                
-            except Exception as e:
+            elif isinstance(error, QueuedForRetry):
+                results.append(f"⏳ **{channel_name}**: Reintento programado")
+            else:
                 results.append(f"❌ **{channel_name}**: Error")
-                logger.error(f"Error replicando en {ch_id}: {e}")
+                logger.error(f"Error replicando en {ch_id}: {error}")
         
         # Mostrar resultados
         result_text = f"📊 **Resultados de Replicación**\n\n"
         result_text += f"✅ **Exitosas:** {success_count}/{len(post.target_channels)}\n"
+        queued_count = sum(1 for _, _, error in outcomes if isinstance(error, QueuedForRetry))
+        if queued_count:
+            result_text += f"⏳ **En reintento:** {queued_count}\n"
+        if blocked:
+            result_text += f"🔒 **Omitidos sin permisos:** {len(blocked)}\n"
         result_text += f"🔘 **Con botones:** {len(post.buttons)}\n"
         result_text += f"📐 **Layout:** {post.button_layout.title()}\n"
+        result_text += f"⚡ **Modo:** {'Copia exacta' if post.can_copy() else 'Reconstrucción'}\n"
         result_text += f"📅 **Origen:** {post.forward_from}\n\n"
         result_text += "**Detalle:**\n" + "\n".join(results[:10])
         
@@ -1321,6 +1529,173 @@ class TelegramBot:
             parse_mode=ParseMode.MARKDOWN
         )
     
+    async def api_call(self, method, chat_id, **kwargs):
+        """Llamada de envío a la API respetando los límites de tasa"""
+        await self.fanout.throttle(chat_id)
+        return await getattr(self.bulk_bot, method)(chat_id=chat_id, **kwargs)
+    
+    async def deliver_to_channel(self, ch_id, post, reply_markup, user_id=None):
+        """Envía a un canal; los fallos transitorios pasan a la cola de reintentos"""
+        if len(post.media) > 1:
+            media_type = 'album'
+        else:
+            media_type = post.media[0].type if post.media else 'text'
+        started = time.perf_counter()
+        # Pasos ya entregados (álbum, sticker...): los reintentos no los repiten
+        progress = {}
+        try:
+            sent = await send_with_retry(
+                lambda: self.send_post_to_channel(ch_id, post, reply_markup, progress),
+                on_flood_wait=lambda seconds: self.fanout.pause(ch_id, seconds)
+            )
+            PUBLISH_SENDS.labels(media_type, 'ok').inc()
+            return sent
+        except Exception as e:
+            if not is_retryable(e):
+                PUBLISH_SENDS.labels(media_type, 'error').inc()
+                if is_permanent_denial(e):
+                    self.channels.mark_unwritable(ch_id, e)
+                raise
+            PUBLISH_SENDS.labels(media_type, 'queued').inc()
+            await self.retry_queue.enqueue(ch_id, post.to_dict(), e, user_id=user_id, progress=progress)
+            raise QueuedForRetry(e)
+        finally:
+            PUBLISH_SEND_LATENCY.labels(media_type).observe(time.perf_counter() - started)
+    
+    async def resend_payload(self, ch_id, payload, progress=None):
+        """Reenvía una publicación serializada (usado por la cola de reintentos)"""
+        post = ForwardedPost.from_dict(payload)
+        return await self.send_post_to_channel(ch_id, post, post.get_inline_keyboard(), progress)
+    
+    async def send_step(self, progress, step, call):
+        """Ejecuta un paso de un envío en varias partes y lo anota en `progress`; si ya se hizo, no lo repite"""
+        if step in progress:
+            return None
+        sent = await call()
+        progress[step] = True
+        return sent
+    
+    async def send_post_to_channel(self, ch_id, post, reply_markup, progress=None):
+        """Envía la publicación a un canal: copia directa si es posible, si no reconstruye"""
+        progress = {} if progress is None else progress
+        if post.can_copy():
+            try:
+                return await self.copy_post_to_channel(ch_id, post, reply_markup, progress)
+            except BadRequest as e:
+                if not any(error in str(e).lower() for error in COPY_UNAVAILABLE_ERRORS):
+                    raise
+                # Original borrado o con contenido protegido: reconstruir para todos
+                logger.warning(f"⚠️ No se puede copiar el original ({e}), reconstruyendo publicación")
+                post.copy_unavailable = True
+        
+        return await self.rebuild_post_in_channel(ch_id, post, reply_markup, progress)
+    
+    async def copy_post_to_channel(self, ch_id, post, reply_markup, progress):
+        """Copia el mensaje original conservando sus entidades de formato"""
+        if len(post.source_message_ids) > 1:
+            sent = await self.send_step(
+                progress, 'content',
+                lambda: self.api_call(
+                    'copy_messages', ch_id,
+                    from_chat_id=post.source_chat_id,
+                    message_ids=post.source_message_ids
+                )
+            )
+            # Los álbumes no admiten reply_markup: los botones van en un mensaje aparte
+            if reply_markup:
+                sent = await self.send_step(
+                    progress, 'buttons',
+                    lambda: self.api_call(
+                        'send_message', ch_id,
+                        text="📢 Contenido replicado",
+                        reply_markup=reply_markup
+                    )
+                )
+            return sent
+        
+        return await self.api_call(
+            'copy_message', ch_id,
+            from_chat_id=post.source_chat_id,
+            message_id=post.source_message_ids[0],
+            reply_markup=reply_markup
+        )
+    
+    async def rebuild_post_in_channel(self, ch_id, post, reply_markup, progress):
+        """Reconstruye la publicación según el tipo de contenido"""
+        if not post.media:
+            # Solo texto con botones
+            return await self.api_call(
+                'send_message', ch_id,
+                text=post.text or "📢 Contenido replicado",
+                reply_markup=reply_markup,
+                **post.format_kwargs()
+            )
+        
+        if len(post.media) > 1:
+            return await self.send_album_to_channel(ch_id, post, reply_markup, progress)
+        
+        media_type, file_id = post.media[0]
+        
+        if media_type == 'sticker':
+            # Los stickers no pueden tener caption, enviamos texto separado si hay botones
+            sent = await self.send_step(
+                progress, 'content',
+                lambda: self.api_call('send_sticker', ch_id, sticker=file_id)
+            )
+            if post.text or reply_markup:
+                sent = await self.send_step(
+                    progress, 'buttons',
+                    lambda: self.api_call(
+                        'send_message', ch_id,
+                        text=post.text or "📢 Contenido replicado",
+                        reply_markup=reply_markup,
+                        **post.format_kwargs()
+                    )
+                )
+            return sent
+        
+        if media_type not in MEDIA_SEND_METHODS:
+            raise BadRequest(f"Tipo de media no soportado: {media_type}")
+        
+        return await self.api_call(
+            MEDIA_SEND_METHODS[media_type], ch_id,
+            **{media_type: file_id},
+            caption=post.text or "",
+            reply_markup=reply_markup,
+            **post.format_kwargs(caption=True)
+        )
+    
+    async def send_album_to_channel(self, ch_id, post, reply_markup, progress):
+        """Envía un álbum con una sola llamada send_media_group"""
+        media = []
+        for i, item in enumerate(post.media):
+            # El caption del álbum va en el primer elemento
+            input_type = ALBUM_INPUT_TYPES.get(item.type)
+            if input_type is None:
+                raise BadRequest(f"Tipo de media no soportado en álbum: {item.type}")
+            caption = (post.text or None) if i == 0 else None
+            media.append(input_type(
+                item.file_id,
+                caption=caption,
+                **(post.format_kwargs(caption=True) if caption else {})
+            ))
+        sent = await self.send_step(
+            progress, 'content',
+            lambda: self.api_call('send_media_group', ch_id, media=media)
+        )
+        
+        # Los álbumes no admiten reply_markup: los botones van en un mensaje aparte
+        if reply_markup:
+            sent = await self.send_step(
+                progress, 'buttons',
+                lambda: self.api_call(
+                    'send_message', ch_id,
+                    text="📢 Contenido replicado",
+                    reply_markup=reply_markup
+                )
+            )
+        return sent
+    
     async def handle_button_creation(self, update, data, text):
         """Maneja la creación personalizada de botones"""
         step = data.get('step', '')
@@ -1477,4 +1852,1018 @@ class TelegramBot:
                 f"📊 **Total botones:** {len(post.buttons)}",
                 reply_markup=InlineKeyboardMarkup(keyboard),
                 parse_mode=ParseMode.MARKDOWN
-            )
\ No newline at end of file
+            )
+
+    async def show_post_menu(self, query, data):
+        """Muestra el menú principal de publicación"""
+        post = data.get('current_post')
+        if not post:
+            await query.edit_message_text("❌ No hay publicación activa")
+            return
+        
+        keyboard = [
+            [InlineKeyboardButton("🔘 Gestionar Botones", callback_data="manage_buttons")],
+            [InlineKeyboardButton("✏️ Editar Texto", callback_data="edit_text"),
+             InlineKeyboardButton("🎯 Seleccionar Canales", callback_data="select_channels")],
+            [InlineKeyboardButton("📋 Usar Plantilla", callback_data="button_templates"),
+             InlineKeyboardButton("⏰ Programar", callback_data="schedule_menu")],
+            [InlineKeyboardButton("👀 Vista Previa", callback_data="preview"),
+             InlineKeyboardButton("📤 Replicar", callback_data="publish")],
+            [InlineKeyboardButton("❌ Cancelar", callback_data="cancel")]
+        ]
+        
+        # Info del contenido
+        content_type = "📝 Texto"
+        if post.media:
+            media_type = post.media[0].type
+            content_icons = {
+                'photo': '📸 Imagen', 'video': '🎥 Video', 'animation': '🎭 GIF',
+                'audio': '🎵 Audio', 'voice': '🎤 Voz', 'document': '📄 Documento',
+                'sticker': '😀 Sticker'
+            }
+            content_type = content_icons.get(media_type, '📎 Media')
+        if len(post.media) > 1:
+            content_type = f"🖼️ Álbum ({len(post.media)} elementos)"
+        
+        text = f"🔄 **Replicación de Contenido**\n\n"
+        text += f"📂 **Tipo:** {content_type}\n"
+        text += f"📺 **Canales disponibles:** {len(data['channels'])}\n"
+        text += f"🔘 **Botones:** {len(post.buttons)}\n"
+        text += f"🎯 **Seleccionados:** {len(post.target_channels)}\n\n"
+        text += f"**¿Qué quieres hacer?**"
+        
+        await query.edit_message_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def manage_channels(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Gestionar canales"""
+        user_id = update.effective_user.id
+        data = self.get_user_data(user_id)
+        
+        if not data['channels']:
+            keyboard = [[InlineKeyboardButton("➕ Añadir Canal", callback_data="add_channel")]]
+            text = """📺 **Gestión de Canales**
+
+❌ No tienes canales configurados.
+
+**Para replicar contenido necesitas:**
+1. Añadir el bot como administrador del canal
+2. Darle permisos de publicación
+3. Registrar el canal en el bot
+
+🔄 **Una vez configurado, simplemente reenvía cualquier publicación al bot**"""
+        else:
+            text, keyboard = self.render_channel_list(data, 0)
+        
+        await update.message.reply_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    def render_channel_list(self, data, page):
+        """Página del listado de canales configurados"""
+        channels = data['channels']
+        visible, page, pages = paginate(list(channels), page, CHANNEL_LIST_PAGE_SIZE)
+        
+        text = f"📺 **Canales Configurados** ({len(channels)})\n\n"
+        for i, ch_id in enumerate(visible, page * CHANNEL_LIST_PAGE_SIZE + 1):
+            ch_info = channels[ch_id]
+            title = ch_info.get('title', 'Canal sin nombre')
+            username = ch_info.get('username', '')
+            tags = f" 🏷️ {', '.join(ch_info['tags'])}" if ch_info.get('tags') else ""
+            if username:
+                text += f"{i}. **{title}** (@{username}){tags}\n"
+            else:
+                text += f"{i}. **{title}**{tags}\n"
+        
+        keyboard = []
+        if pages > 1:
+            keyboard.append(self.build_page_row('m', page, pages))
+        keyboard.extend([
+            [InlineKeyboardButton("➕ Añadir Canal", callback_data="add_channel")],
+            [InlineKeyboardButton("🗑️ Eliminar Canal", callback_data="remove_channel")]
+        ])
+        return text, keyboard
+    
+    async def verify_channel(self, channel_text, api=None):
+        """Obtiene el chat y el estado del bot en él (consultas en paralelo)"""
+        api = api or self.app.bot
+        if channel_text.startswith('@'):
+            chat_ref = channel_text
+        elif channel_text.startswith('-'):
+            chat_ref = int(channel_text)
+        else:
+            raise BadRequest("Formato inválido")
+        
+        chat, bot_member = await asyncio.gather(
+            api.get_chat(chat_ref),
+            api.get_chat_member(chat_ref, self.app.bot.id)
+        )
+        self.channels.record(chat.id, chat=chat, member=bot_member)
+        return chat, bot_member
+    
+    def store_channel(self, data, chat):
+        """Registra el canal en los datos del usuario"""
+        data['channels'][str(chat.id)] = {
+            'title': chat.title,
+            'username': chat.username,
+            'type': chat.type,
+            'added_date': datetime.now().isoformat()
+        }
+        invalidate_index(data)
+    
+    async def add_channel(self, update, user_id, channel_text):
+        """Añade un canal con validación mejorada"""
+        data = self.get_user_data(user_id)
+        
+        # Varios identificadores a la vez: importación masiva
+        identifiers = split_channel_identifiers(channel_text or "")
+        if len(identifiers) > 1:
+            await self.bulk_add_channels(update, user_id, identifiers)
+            return
+        
+        # Limpiar y normalizar texto
+        channel_text = (channel_text or "").strip()
+        original_text = channel_text
+        channel_text = normalize_channel_identifier(channel_text)
+        
+        try:
+            # Obtener información del chat y verificar permisos del bot
+            chat, bot_member = await self.verify_channel(channel_text)
+            if bot_member.status not in ['administrator', 'creator']:
+                await update.message.reply_text(
+                    f"❌ **Sin permisos de administrador**\n\n"
+                    f"📢 Canal: **{chat.title}**\n\n"
+                    f"**Solución:**\n"
+                    f"1. Añade el bot como administrador\n"
+                    f"2. Otorga permisos de publicación\n"
+                    f"3. Intenta nuevamente"
+                )
+                return
+            
+            # Verificar si ya existe
+            if str(chat.id) in data['channels']:
+                await update.message.reply_text(
+                    f"⚠️ **Canal ya configurado**\n\n📢 {chat.title}\n\n"
+                    f"🔄 Puedes empezar a reenviar publicaciones para replicar"
+                )
+                return
+            
+            # Guardar canal
+            self.store_channel(data, chat)
+            
+            data['step'] = 'idle'
+            
+            keyboard = [
+                [InlineKeyboardButton("➕ Añadir Otro Canal", callback_data="add_channel")]
+            ]
+            
+            await update.message.reply_text(
+                f"✅ **Canal añadido exitosamente**\n\n"
+                f"📢 **Nombre:** {chat.title}\n"
+                f"📊 **Total canales:** {len(data['channels'])}\n\n"
+                f"🔄 **¡Listo!** Ahora reenvía cualquier publicación al bot y él te permitirá añadir botones y replicarla en tus canales.",
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode=ParseMode.MARKDOWN
+            )
+            
+        except Exception as e:
+            logger.error(f"Error añadiendo canal {original_text}: {e}")
+            await update.message.reply_text(
+                f"❌ **Error:** No se pudo añadir el canal\n\n"
+                f"🔍 **Verificar:**\n"
+                f"• El bot es administrador\n"
+                f"• Tiene permisos de publicación\n"
+                f"• El identificador es correcto\n\n"
+                f"Formato enviado: `{original_text}`",
+                parse_mode=ParseMode.MARKDOWN
+            )
+    
+    async def add_channels_from_file(self, update, user_id):
+        """Importa canales desde un archivo .txt/.csv subido"""
+        document = update.message.document
+        filename = (document.file_name or '').lower()
+        if not filename.endswith(('.txt', '.csv')) or (document.file_size or 0) > BULK_CHANNELS_MAX_FILE_SIZE:
+            await update.message.reply_text(
+                "❌ **Archivo no válido**\n\n"
+                "Envía un archivo `.txt` o `.csv` (máx. 256 KB) con un canal por línea o separados por comas.",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        
+        try:
+            telegram_file = await document.get_file()
+            content = bytes(await telegram_file.download_as_bytearray()).decode('utf-8-sig', errors='ignore')
+        except Exception as e:
+            logger.error(f"Error descargando archivo de canales: {e}")
+            await update.message.reply_text("❌ No se pudo leer el archivo, inténtalo de nuevo")
+            return
+        
+        identifiers = split_channel_identifiers(content)
+        if not identifiers:
+            await update.message.reply_text("❌ El archivo no contiene identificadores de canal")
+            return
+        await self.bulk_add_channels(update, user_id, identifiers)
+    
+    async def bulk_add_channels(self, update, user_id, identifiers):
+        """Verifica muchos canales con concurrencia acotada y responde con un resumen"""
+        data = self.get_user_data(user_id)
+        
+        # Quitar duplicados conservando el orden
+        identifiers = list(dict.fromkeys(identifiers))
+        skipped = len(identifiers) - BULK_CHANNELS_MAX
+        identifiers = identifiers[:BULK_CHANNELS_MAX]
+        
+        progress = await update.message.reply_text(
+            f"⏳ **Verificando {len(identifiers)} canales...**",
+            parse_mode=ParseMode.MARKDOWN
+        )
+        
+        semaphore = asyncio.Semaphore(BULK_VERIFY_CONCURRENCY)
+        
+        async def check(original_text):
+            async with semaphore:
+                try:
+                    chat, bot_member = await self.verify_channel(
+                        normalize_channel_identifier(original_text), api=self.bulk_bot
+                    )
+                    return original_text, chat, bot_member, None
+                except Exception as e:
+                    return original_text, None, None, e
+        
+        added, existing, no_admin, failed = [], [], [], []
+        for original_text, chat, bot_member, error in await asyncio.gather(*(check(i) for i in identifiers)):
+            if error is not None:
+                logger.error(f"Error añadiendo canal {original_text}: {error}")
+                failed.append(original_text)
+            elif bot_member.status not in ['administrator', 'creator']:
+                no_admin.append(chat.title)
+            elif str(chat.id) in data['channels']:
+                existing.append(chat.title)
+            else:
+                self.store_channel(data, chat)
+                added.append(chat.title)
+        
+        data['step'] = 'idle'
+        self.mark_session_dirty(user_id)
+        
+        text = f"📥 **Importación de Canales**\n\n"
+        text += f"✅ **Añadidos:** {len(added)}\n"
+        text += f"⚠️ **Ya configurados:** {len(existing)}\n"
+        text += f"🔒 **Sin permisos de admin:** {len(no_admin)}\n"
+        text += f"❌ **Con error:** {len(failed)}\n"
+        text += f"📊 **Total canales:** {len(data['channels'])}\n"
+        
+        if no_admin:
+            text += "\n**Sin permisos:**\n" + "\n".join(f"• {title}" for title in no_admin[:10])
+            if len(no_admin) > 10:
+                text += f"\n... y {len(no_admin) - 10} más"
+            text += "\n"
+        if failed:
+            text += "\n**No encontrados o inválidos:**\n" + "\n".join(f"• `{item}`" for item in failed[:10])
+            if len(failed) > 10:
+                text += f"\n... y {len(failed) - 10} más"
+            text += "\n"
+        if skipped > 0:
+            text += f"\n⚠️ Se omitieron {skipped} identificadores (máximo {BULK_CHANNELS_MAX} por importación)"
+        
+        await progress.edit_text(text, parse_mode=ParseMode.MARKDOWN)
+    
+    async def show_button_template_selection(self, query, data):
+        """Muestra selección de plantillas de botones"""
+        templates = self.templates.templates_for(data)
+        
+        keyboard = []
+        for template_name in templates.keys():
+            if self.templates.is_own(data, template_name):
+                keyboard.append([
+                    InlineKeyboardButton(f"⭐ {template_title(template_name)}", callback_data=f"template_{template_name}"),
+                    InlineKeyboardButton("📤", callback_data=f"share_tpl_{template_name}"),
+                    InlineKeyboardButton("🗑️", callback_data=f"del_tpl_{template_name}")
+                ])
+            else:
+                keyboard.append([InlineKeyboardButton(
+                    f"📋 {template_title(template_name)}",
+                    callback_data=f"template_{template_name}"
+                )])
+        
+        post = data.get('current_post')
+        extra_row = [InlineKeyboardButton("📥 Importar", callback_data="import_template")]
+        if post and post.buttons:
+            extra_row.insert(0, InlineKeyboardButton("💾 Guardar actuales", callback_data="save_template"))
+        keyboard.append(extra_row)
+        keyboard.append([InlineKeyboardButton("⬅️ Volver", callback_data="manage_buttons")])
+        
+        text = "📋 **Plantillas de Botones**\n\n"
+        for name, buttons in templates.items():
+            text += f"**{template_title(name)}:**\n"
+            for btn in buttons[:2]:
+                text += f"• {btn['text']}\n"
+            if len(buttons) > 2:
+                text += f"• ... y {len(buttons) - 2} más\n"
+            text += "\n"
+        
+        text += "💡 **Tip:** Las plantillas reemplazan botones existentes\n"
+        text += "⭐ Propias: 📤 comparte un código, 🗑️ la borra"
+        
+        await query.edit_message_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
+        )
+
+    def render_channel_selection(self, data):
+        """Texto y teclado de la página visible del selector de canales"""
+        post = data['current_post']
+        state = picker_state(data)
+        channels = data['channels']
+        self.channels.track(channels)
+        blocked = self.channels.unwritable(channels)
+        
+        matching = channel_index(data).filter(state['query'])
+        visible, state['page'], pages = paginate(matching, state['page'], CHANNEL_PAGE_SIZE)
+        
+        # Solo se construye la página visible; se reutiliza mientras no cambie nada de ella
+        key = (
+            state['page'], pages, state['query'],
+            tuple((ch_id, channels[ch_id].get('title')) for ch_id in visible),
+            frozenset(blocked.intersection(visible))
+        )
+        reply_markup = post.keyboard('channels', key, lambda: self.build_channel_keyboard(post, channels, visible, blocked, state['page'], pages))
+        
+        button_info = f"🔘 Botones: **{len(post.buttons)}**"
+        blocked_info = f"🔒 Sin permisos: **{len(blocked)}**\n" if blocked else ""
+        filter_info = f"🔍 Filtro: _{state['query']}_ ({len(matching)} canales)\n" if state['query'] else ""
+        
+        text = f"🎯 **Seleccionar Canales Destino**\n\n" \
+               f"✅ Seleccionados: **{len(post.target_channels)}**\n" \
+               f"📺 Disponibles: **{len(channels)}**\n" \
+               f"{blocked_info}" \
+               f"{filter_info}" \
+               f"{button_info}\n\n" \
+               f"Toca los canales donde quieres replicar"
+        return text, reply_markup
+    
+    async def show_channel_selection(self, query, data):
+        """Muestra la selección de canales"""
+        text, reply_markup = self.render_channel_selection(data)
+        await query.edit_message_text(
+            text,
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    def build_channel_keyboard(self, post, channels, visible, blocked, page, pages):
+        keyboard = []
+        for ch_id in visible:
+            selected = ch_id in post.target_channels
+            icon = "✅" if selected else "⬜"
+            if ch_id in blocked:
+                icon = "🔒"
+            title = channels[ch_id].get('title', 'Canal')[:25]
+            keyboard.append([cached_button(
+                f"{icon} {title}",
+                callback_data=self.router.encode('t', ch_id)
+            )])
+        
+        if pages > 1:
+            keyboard.append(self.build_page_row('p', page, pages))
+        
+        keyboard.extend([
+            [cached_button("✅ Todos", callback_data="ch_all"),
+             cached_button("⬜ Ninguno", callback_data="ch_none"),
+             cached_button("🔄 Invertir", callback_data="ch_invert")],
+            [cached_button("🔍 Buscar", callback_data="ch_search"),
+             cached_button("🧮 Combinar", callback_data="ch_combine")],
+            [cached_button("🏷️ Etiquetas", callback_data="ch_tags"),
+             cached_button("📁 Grupos", callback_data="ch_groups")],
+            [cached_button("🔘 Gestionar Botones", callback_data="manage_buttons")],
+            [cached_button("👀 Vista Previa", callback_data="preview"),
+             cached_button("📤 Replicar", callback_data="publish")],
+            [cached_button("⏰ Programar", callback_data="schedule_menu")]
+        ])
+        return CachedMarkup(keyboard)
+    
+    def build_page_row(self, code, page, pages):
+        """Fila ◀️ n/N ▶️ para la acción de paginado `code`"""
+        row = []
+        if page > 0:
+            row.append(cached_button("◀️", callback_data=self.router.encode(code, page - 1)))
+        row.append(cached_button(f"{page + 1}/{pages}", callback_data="noop"))
+        if page < pages - 1:
+            row.append(cached_button("▶️", callback_data=self.router.encode(code, page + 1)))
+        return row
+    
+    def visible_channel_ids(self, data):
+        """Canales que abarca una acción en bloque: los que pasan el filtro y admiten publicar"""
+        matching = channel_index(data).filter(picker_state(data)['query'])
+        blocked = self.channels.unwritable(matching)
+        return [ch_id for ch_id in matching if ch_id not in blocked]
+    
+    def build_set_row(self, label, term):
+        """Fila con las operaciones de conjunto sobre una etiqueta o grupo"""
+        return [
+            InlineKeyboardButton(label, callback_data=self.router.encode('s', 'u', term)),
+            InlineKeyboardButton("∩", callback_data=self.router.encode('s', 'i', term)),
+            InlineKeyboardButton("➖", callback_data=self.router.encode('s', 'x', term)),
+        ]
+    
+    async def show_tag_menu(self, query, data):
+        """Etiquetas de los canales para seleccionarlas en bloque"""
+        tags = channel_index(data).tags
+        keyboard = [self.build_set_row(f"🏷️ {tag} ({len(members)})", f"#{tag}") for tag, members in tags.items()]
+        keyboard.append([InlineKeyboardButton("✍️ Etiquetar selección", callback_data="ch_tag_prompt")])
+        keyboard.append([InlineKeyboardButton("⬅️ Volver", callback_data="select_channels")])
+        
+        text = "🏷️ **Seleccionar por Etiqueta**\n\n"
+        if tags:
+            text += "Toca una etiqueta para añadir sus canales, ∩ para quedarte solo con los que la tienen o ➖ para quitarlos"
+        else:
+            text += "❌ Aún no hay etiquetas.\n\nSelecciona canales y usa ✍️ para etiquetarlos"
+        await query.edit_message_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def show_group_menu(self, query, data):
+        """Grupos de canales guardados"""
+        groups = channel_index(data).groups
+        keyboard = []
+        for name, members in groups.items():
+            row = self.build_set_row(f"📁 {name} ({len(members)})", name)
+            row.append(InlineKeyboardButton("🗑️", callback_data=self.router.encode('gd', name)))
+            keyboard.append(row)
+        keyboard.append([InlineKeyboardButton("💾 Guardar selección", callback_data="grp_save")])
+        keyboard.append([InlineKeyboardButton("⬅️ Volver", callback_data="select_channels")])
+        
+        text = "📁 **Grupos de Canales**\n\n"
+        if groups:
+            text += "Toca un grupo para añadir sus canales, ∩ para quedarte solo con los del grupo o ➖ para quitarlos"
+        else:
+            text += "❌ Aún no hay grupos.\n\nGuarda la selección actual para reutilizarla"
+        await query.edit_message_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def search_channels(self, update, data, text):
+        """Aplica el filtro de búsqueda y muestra la primera página de resultados"""
+        state = picker_state(data)
+        state['query'] = text.strip()[:CHANNEL_SEARCH_MAX]
+        state['page'] = 0
+        data['step'] = 'idle'
+        if not data.get('current_post'):
+            await update.message.reply_text("❌ No hay publicación activa")
+            return
+        text, reply_markup = self.render_channel_selection(data)
+        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+    
+    async def save_channel_group(self, update, data, text):
+        """Guarda los canales seleccionados como grupo con nombre"""
+        post = data.get('current_post')
+        name = label_slug(text)
+        if not post or not post.target_channels:
+            data['step'] = 'idle'
+            await update.message.reply_text("❌ No hay canales seleccionados que guardar")
+            return
+        if not name:
+            await update.message.reply_text(
+                "❌ **Nombre inválido**\n\nUsa letras, números o espacios (máx. 24)",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        
+        data['step'] = 'idle'
+        if not save_group(data, name, post.target_channels):
+            await update.message.reply_text("❌ Has alcanzado el máximo de grupos")
+            return
+        
+        keyboard = [[InlineKeyboardButton("⬅️ Volver a Canales", callback_data="select_channels")]]
+        await update.message.reply_text(
+            f"✅ **Grupo guardado: {name}**\n\n"
+            f"📺 Canales: {len(post.target_channels)}",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def combine_channels(self, update, data, text):
+        """Sustituye la selección por el resultado de una expresión de grupos y etiquetas"""
+        post = data.get('current_post')
+        if not post:
+            data['step'] = 'idle'
+            await update.message.reply_text("❌ No hay publicación activa")
+            return
+        try:
+            result = channel_index(data).resolve(text)
+        except ValueError as e:
+            await update.message.reply_text(
+                f"❌ **Expresión no válida**: {e}\n\nCorrígela o usa /cancelar",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        
+        data['step'] = 'idle'
+        blocked = self.channels.unwritable(result)
+        post.replace_channels(result - blocked)
+        text, reply_markup = self.render_channel_selection(data)
+        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+    
+    async def tag_selected_channels(self, update, data, text):
+        """Añade (o quita, con `-` delante) una etiqueta a los canales seleccionados"""
+        post = data.get('current_post')
+        text = text.strip()
+        remove = text.startswith('-')
+        tag = label_slug(text.lstrip('-'))
+        if not post or not post.target_channels:
+            data['step'] = 'idle'
+            await update.message.reply_text("❌ No hay canales seleccionados que etiquetar")
+            return
+        if not tag:
+            await update.message.reply_text(
+                "❌ **Etiqueta inválida**\n\nUsa letras, números o espacios (máx. 24)",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        
+        data['step'] = 'idle'
+        changed = tag_channels(data, post.target_channels, tag, remove=remove)
+        keyboard = [[InlineKeyboardButton("⬅️ Volver a Canales", callback_data="select_channels")]]
+        action = "quitada de" if remove else "añadida a"
+        await update.message.reply_text(
+            f"🏷️ **Etiqueta {tag}** {action} {changed} canales",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def save_template(self, update, data, text):
+        """Guarda los botones de la publicación actual como plantilla propia"""
+        post = data.get('current_post')
+        name = template_slug(text)
+        if not post or not post.buttons:
+            data['step'] = 'idle'
+            await update.message.reply_text("❌ La publicación no tiene botones que guardar")
+            return
+        if not name:
+            await update.message.reply_text(
+                "❌ **Nombre inválido**\n\nUsa letras, números o espacios (máx. 24)",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        
+        if not self.templates.save_user_template(data, name, buttons_to_template(post.buttons)):
+            data['step'] = 'idle'
+            await update.message.reply_text("❌ Has alcanzado el máximo de plantillas propias")
+            return
+        
+        data['step'] = 'idle'
+        keyboard = [[InlineKeyboardButton("⬅️ Volver a la Publicación", callback_data="back_to_post")]]
+        await update.message.reply_text(
+            f"✅ **Plantilla guardada: {template_title(name)}**\n\n"
+            f"📊 Botones: {len(post.buttons)}",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def import_template(self, update, data, text):
+        """Importa una plantilla compartida por código"""
+        name = await self.templates.import_shared(data, text)
+        data['step'] = 'idle'
+        if name is None:
+            await update.message.reply_text("❌ Código no válido o límite de plantillas alcanzado")
+            return
+        
+        keyboard = []
+        if data.get('current_post'):
+            keyboard.append([InlineKeyboardButton("⬅️ Volver a la Publicación", callback_data="back_to_post")])
+        await update.message.reply_text(
+            f"✅ **Plantilla importada: {template_title(name)}**",
+            reply_markup=InlineKeyboardMarkup(keyboard) if keyboard else None,
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def share_template(self, query, data, user_id, template_name):
+        """Publica una plantilla propia y muestra su código"""
+        if not self.templates.is_own(data, template_name):
+            await query.edit_message_text("❌ Solo puedes compartir tus propias plantillas")
+            return
+        
+        code = await self.templates.share(data, template_name, user_id)
+        keyboard = [[InlineKeyboardButton("⬅️ Volver", callback_data="button_templates")]]
+        await query.edit_message_text(
+            f"📤 **Plantilla compartida: {template_title(template_name)}**\n\n"
+            f"🔑 Código: `{code}`\n\n"
+            f"Quien lo reciba puede usarlo en Plantillas → 📥 Importar",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def show_button_templates_main(self, update, data):
+        """Muestra plantillas de botones desde el menú principal"""
+        templates = self.templates.templates_for(data)
+        
+        text = "📋 **Plantillas de Botones Disponibles**\n\n"
+        
+        for name, buttons in templates.items():
+            text += f"**{template_title(name)}:**\n"
+            for btn in buttons:
+                text += f"• {btn['text']}\n"
+            text += "\n"
+        
+        text += "💡 **Uso:** Reenvía una publicación al bot y selecciona 'Usar Plantilla'"
+        
+        await update.message.reply_text(
+            text,
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Mostrar estado actual"""
+        user_id = update.effective_user.id
+        data = self.get_user_data(user_id)
+        
+        text = f"📊 **Estado del Bot Replicador**\n\n"
+        text += f"👤 **Usuario:** {update.effective_user.first_name}\n"
+        text += f"📺 **Canales configurados:** {len(data['channels'])}\n"
+        text += f"🔄 **Estado actual:** {data['step']}\n"
+        text += f"🕐 **Última actividad:** {data['last_activity'].strftime('%H:%M')}\n\n"
+        
+        if data.get('current_post'):
+            post = data['current_post']
+            text += f"📝 **Publicación en Proceso:**\n"
+            text += f"• **Contenido:** {'✅' if post.text or post.media else '❌'}\n"
+            text += f"• **Botones:** {len(post.buttons)} ({post.button_layout})\n"
+            text += f"• **Canales destino:** {len(post.target_channels)} seleccionados\n"
+            text += f"• **Origen:** {post.forward_from}\n\n"
+            
+            text += f"📤 **Listo para replicar:** {'✅' if post.target_channels and post.has_content() else '❌'}"
+        else:
+            text += f"💡 **Tip:** Reenvía cualquier publicación para empezar a replicar con botones"
+        
+        await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+    
+    async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Cancelar acción actual"""
+        user_id = update.effective_user.id
+        data = self.get_user_data(user_id)
+        
+        data['current_post'] = None
+        data['step'] = 'idle'
+        data.pop('temp_button_text', None)
+        
+        await update.message.reply_text(
+            "❌ **Replicación cancelada**\n\n"
+            "🔄 Puedes reenviar otra publicación cuando quieras."
+        )
+    
+    async def help_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Comando de ayuda mejorado"""
+        text = """🚀 **Bot Replicador con Botones Interactivos**
+
+**🔄 CÓMO FUNCIONA:**
+1. **Reenvía** cualquier publicación al bot
+2. El bot la **captura automáticamente**
+3. **Añade botones** interactivos
+4. **Selecciona canales** destino
+5. **¡Replica con un clic!**
+
+**📋 COMANDOS:**
+• `/canales` - Gestionar canales destino
+• `/estado` - Ver estado actual
+• `/programadas` - Ver replicaciones programadas
+• `/help` - Esta ayuda
+
+**🔘 TIPOS DE BOTONES:**
+• **🔗 Links externos** - Sitios web, tiendas online
+• **📞 WhatsApp** - Contacto directo (wa.me)
+• **📺 Telegram** - Canales y grupos
+• **📧 Email** - Contacto por correo
+• **🛒 E-commerce** - Botones de compra
+
+**📋 PLANTILLAS INCLUIDAS:**
+• **E-commerce** - Comprar, Contactar, Valorar
+• **Social** - Me Gusta, Comentar, Compartir  
+• **Noticias** - Leer Más, Suscribirse
+• **Educativo** - Ver Curso, Inscribirse
+• **Contacto** - WhatsApp, Email, Web
+
+**🎯 EJEMPLOS DE USO:**
+
+```
+🛒 Reenvías: "Nueva oferta 50% OFF"
+➕ Añades: [🛒 Comprar] [📞 WhatsApp]
+📤 Replicas en 5 canales simultáneamente
+```
+
+```
+📰 Reenvías: Noticia importante
+➕ Añades: [📖 Leer Más] [🔔 Suscribirse]  
+📤 Se publica con botones en todos tus canales
+```
+
+**⚙️ LAYOUTS DISPONIBLES:**
+• **Horizontal** - Botones en fila (1-3 por fila)
+• **Vertical** - Un botón por fila
+• **Grid** - Cuadrícula 2x2
+
+**💡 VENTAJAS:**
+✅ **Rápido** - Sin crear desde cero
+✅ **Consistente** - Mismo contenido, múltiples canales
+✅ **Interactivo** - Botones aumentan engagement
+✅ **Profesional** - Aspecto uniforme
+
+**🚀 ¡Convierte cualquier contenido en publicación interactiva!**"""
+        
+        keyboard = [
+            [KeyboardButton("📺 Mis Canales"), KeyboardButton("🔘 Plantillas")],
+            [KeyboardButton("📊 Estado"), KeyboardButton("❓ Ayuda")]
+        ]
+        
+        await update.message.reply_text(
+            text,
+            reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True),
+            parse_mode=ParseMode.MARKDOWN
+        )
+
+# Resto del código del servidor web
+WEBHOOK_OUTCOMES = {
+    outcome: WEBHOOK_REQUESTS.labels(outcome)
+    for outcome in ('queued', 'duplicate', 'ignored', 'busy', 'invalid')
+}
+
+REGISTRY.gauge('bot_active_users', 'Sesiones de usuario en memoria', lambda: len(bot.sessions))
+REGISTRY.gauge('bot_spilled_sessions', 'Sesiones movidas de memoria al almacén', lambda: len(bot.sessions.spilled))
+REGISTRY.gauge('bot_update_queue_depth', 'Updates esperando en la cola', lambda: bot.update_queue.depth)
+REGISTRY.gauge('bot_update_queue_dropped', 'Updates rechazados por cola llena', lambda: bot.update_queue.dropped)
+REGISTRY.gauge('bot_retry_queue_size', 'Envíos pendientes de reintento', lambda: len(bot.retry_queue))
+REGISTRY.gauge('bot_cluster_leader', 'Esta instancia es líder (1) o no (0)', lambda: int(bot.cluster is None or bot.cluster.is_leader))
+REGISTRY.gauge('bot_scheduled_jobs', 'Replicaciones programadas pendientes', lambda: len(bot.scheduler))
+REGISTRY.gauge('bot_state_pending_writes', 'Sesiones pendientes de guardar', lambda: bot.store.pending_writes)
+REGISTRY.gauge('bot_channels_unwritable', 'Canales conocidos sin permiso de publicación',
+               lambda: bot.channels.status()['unwritable'])
+REGISTRY.gauge('bot_event_loop_lag_seconds', 'Retraso del event loop', lambda: bot.loop_monitor.lag)
+REGISTRY.gauge('bot_api_interactive_in_flight', 'Llamadas en curso en el carril interactivo',
+               lambda: bot.lanes.in_flight[INTERACTIVE])
+REGISTRY.gauge('bot_api_interactive_waiting', 'Llamadas esperando turno en el carril interactivo',
+               lambda: bot.lanes.waiting(INTERACTIVE))
+REGISTRY.gauge('bot_api_bulk_in_flight', 'Llamadas en curso en el carril masivo', lambda: bot.lanes.in_flight[BULK])
+REGISTRY.gauge('bot_api_bulk_waiting', 'Llamadas esperando turno en el carril masivo', lambda: bot.lanes.waiting(BULK))
+REGISTRY.gauge('bot_startup_seconds', 'Duración del último arranque hasta estar listo',
+               lambda: bot.startup.total if bot.startup else 0)
+
+async def webhook_handler(request: Request) -> Response:
+    """Maneja webhooks de Telegram: valida, encola y responde al instante"""
+    received_at = time.monotonic()
+    outcome, response = await ingest_update(request, received_at)
+    WEBHOOK_OUTCOMES[outcome].inc()
+    WEBHOOK_LATENCY.observe(time.monotonic() - received_at)
+    return response
+
+async def ingest_update(request, received_at):
+    """Valida el update y lo encola; devuelve (resultado, respuesta HTTP)"""
+    try:
+        # Bytes crudos directo al parser, sin decodificar a str
+        body = await request.read()
+        payload = fastjson.loads(body)
+        update_id = payload['update_id']
+    except Exception as e:
+        logger.error(f"Error en webhook: {e}")
+        return 'invalid', Response(text="ERROR", status=400)
+    
+    # Filtro barato: tipos sin manejador no llegan a deserializarse
+    if not any(update_type in payload for update_type in HANDLED_UPDATE_TYPES):
+        return 'ignored', Response(text="OK")
+    
+    # Reentrega de Telegram: ya está encolado o procesado
+    if update_id in bot.seen_updates:
+        logger.info(f"🔁 Update duplicado ignorado: {update_id}")
+        return 'duplicate', Response(text="OK")
+    
+    try:
+        update = Update.de_json(payload, bot.app.bot)
+    except Exception as e:
+        logger.error(f"Error en webhook: {e}")
+        return 'invalid', Response(text="ERROR", status=400)
+    
+    # Con varias instancias, la reentrega puede haber llegado a otra
+    if bot.cluster is not None and not await claim_update(update_id):
+        bot.seen_updates.add(update_id)
+        logger.info(f"🔁 Update duplicado ignorado (otra instancia): {update_id}")
+        return 'duplicate', Response(text="OK")
+    
+    # Mismo usuario -> misma cola, para conservar el orden de sus updates
+    if not bot.update_queue.submit(update, update_key(update), received_at):
+        # Telegram reintentará la entrega más tarde
+        logger.warning(f"⚠️ Cola de updates llena, update {update.update_id} rechazado")
+        if bot.cluster is not None:
+            await bot.cluster.release_update(update_id)
+        return 'busy', Response(text="BUSY", status=503)
+    
+    bot.seen_updates.add(update_id)
+    return 'queued', Response(text="OK")
+
+async def claim_update(update_id):
+    """Reclama el update en el backend compartido; si no responde, se procesa igualmente"""
+    try:
+        return await bot.cluster.claim_update(update_id)
+    except Exception as e:
+        logger.error(f"Error reclamando update {update_id}: {e}")
+        return True
+
+async def health_check(request: Request) -> Response:
+    """Health check mejorado (sin llamadas a Telegram: usa la identidad en caché)"""
+    try:
+        return Response(
+            text=json.dumps({
+                "status": "OK",
+                "bot_username": bot.upstream.username,
+                "active_users": len(bot.sessions),
+                "sessions": bot.sessions.status(),
+                "update_queue": bot.update_queue.stats(),
+                "duplicate_updates": bot.seen_updates.hits,
+                "channels": bot.channels.status(),
+                "cluster": bot.cluster.status() if bot.cluster else None,
+                "startup": bot.startup.status() if bot.startup else None,
+                "api_lanes": bot.lanes.status(),
+                "features": ["forward_replication", "interactive_buttons", "multi_channel"],
+                "version": "2.0 - Forwarder Edition",
+                "timestamp": datetime.now().isoformat()
+            }),
+            content_type="application/json"
+        )
+    except Exception as e:
+        return Response(text=f"ERROR: {e}", status=500)
+
+async def metrics_handler(request: Request) -> Response:
+    """Métricas en formato de texto de Prometheus"""
+    return Response(
+        body=REGISTRY.render().encode('utf-8'),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+async def liveness_check(request: Request) -> Response:
+    """Liveness: el proceso responde"""
+    return Response(text="OK")
+
+async def readiness_check(request: Request) -> Response:
+    """Readiness: estado en caché de Telegram, cola de updates y lag del event loop"""
+    queue_stats = bot.update_queue.stats()
+    loop_stats = bot.loop_monitor.status()
+    ready = (
+        bot.upstream.identity is not None
+        and bot.upstream.healthy
+        and queue_stats['depth'] < queue_stats['capacity']
+    )
+    return Response(
+        text=json.dumps({
+            "ready": ready,
+            "upstream": bot.upstream.status(),
+            "update_queue": queue_stats,
+            "event_loop": loop_stats,
+            "timestamp": datetime.now().isoformat()
+        }),
+        status=200 if ready else 503,
+        content_type="application/json"
+    )
+
+async def setup_webhook():
+    """Configura webhook"""
+    try:
+        webhook_url = f"{WEBHOOK_URL}/webhook"
+        await bot.app.bot.set_webhook(url=webhook_url, allowed_updates=list(HANDLED_UPDATE_TYPES))
+        logger.info(f"✅ Webhook configurado: {webhook_url}")
+    except Exception as e:
+        logger.error(f"❌ Error webhook: {e}")
+
+def start_background_jobs():
+    """Trabajos de fondo que deben correr en una sola instancia"""
+    bot.scheduler.start()
+    bot.retry_queue.start()
+    bot.channels.start()
+
+async def become_leader():
+    """Tareas exclusivas del líder: registrar el webhook y los trabajos de fondo"""
+    await setup_webhook()
+    await bot.scheduler.refresh()
+    start_background_jobs()
+
+async def step_down():
+    await bot.scheduler.stop()
+    await bot.retry_queue.stop()
+    await bot.channels.stop()
+
+async def shutdown(app):
+    """Guarda el estado pendiente al apagar"""
+    await bot.upstream.stop()
+    await bot.loop_monitor.stop()
+    await bot.sessions.stop()
+    await bot.update_queue.stop()
+    if bot.cluster:
+        await bot.cluster.stop()
+    await bot.scheduler.stop()
+    await bot.channels.stop()
+    await bot.retry_queue.stop()
+    await bot.bulk_request.shutdown()
+    # init_app arrancó la Application: se detiene antes de cerrar el almacén
+    if bot.app.running:
+        await bot.app.stop()
+    await bot.app.shutdown()
+    await bot.store.close()
+
+def load_state():
+    """Estado en disco (reintentos, programaciones, plantillas); solo lectura de ficheros"""
+    bot.retry_queue.load()
+    if bot.cluster is None:
+        bot.scheduler.load()
+    bot.templates.load()
+
+async def init_app(startup: Optional[StartupTimer] = None):
+    """Inicializa aplicación"""
+    startup = startup or StartupTimer()
+    with startup.phase('construct'):
+        get_bot()
+    bot.startup = startup
+    
+    # get_me, el registro del webhook y la lectura del estado no dependen entre sí
+    steps = [
+        startup.timed('initialize', asyncio.gather(bot.app.initialize(), bot.bulk_request.initialize())),
+        startup.timed('state', asyncio.to_thread(load_state)),
+    ]
+    if bot.cluster is None:
+        steps.append(startup.timed('webhook', setup_webhook()))
+    await asyncio.gather(*steps)
+    
+    with startup.phase('workers'):
+        await bot.app.start()
+        # initialize() ya hizo get_me: se reutiliza como identidad en caché
+        bot.upstream.record(bot.app.bot.bot)
+        bot.upstream.start()
+        bot.loop_monitor.start()
+        
+        bot.store.start()
+        bot.sessions.start()
+        bot.update_queue.start()
+        if bot.cluster is None:
+            start_background_jobs()
+        else:
+            # Todas las instancias atienden /webhook; solo el líder lo registra y corre
+            # programaciones, reintentos y revalidación de canales
+            bot.cluster.start_election(become_leader, step_down)
+    
+    startup.mark_ready()
+    logger.info(f"⏱️ Arranque listo en {startup.summary()}")
+    return create_web_app()
+
+# Rutas HTTP del servicio (también las despacha startup.py tras el arranque en frío)
+ROUTES = [
+    ('POST', '/webhook', webhook_handler),
+    ('GET', '/', health_check),
+    ('GET', '/health', health_check),
+    ('GET', '/livez', liveness_check),
+    ('GET', '/readyz', readiness_check),
+    ('GET', '/metrics', metrics_handler),
+]
+
+def create_web_app():
+    app = web.Application()
+    app.on_cleanup.append(shutdown)
+    for method, path, handler in ROUTES:
+        app.router.add_route(method, path, handler)
+    return app
+
+# Instancia del bot: se construye al arrancar (o en el primer get_bot), no al importar
+bot: Optional[TelegramBot] = None
+
+def get_bot() -> TelegramBot:
+    global bot
+    if bot is None:
+        bot = TelegramBot()
+    return bot
+
+def main():
+    """Función principal"""
+    import asyncio
+    
+    try:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        
+        app = loop.run_until_complete(init_app())
+        
+        logger.info(f"🚀 Bot Replicador con Botones INICIADO")
+        logger.info(f"🌐 Puerto: {PORT}")
+        logger.info(f"🔗 Webhook: {WEBHOOK_URL}")
+        logger.info(f"🔄 Funcionalidad: Reenvío + Botones + Multi-canal")
+        
+        web.run_app(app, host='0.0.0.0', port=PORT, loop=loop)
+        
+    except Exception as e:
+        logger.error(f"❌ Error crítico: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Índice precalculado de etiquetas y grupos de canales con selección por álgebra de conjuntos"""
+import re
+from typing import Dict, FrozenSet, List, Tuple
+
+# Clave de la sesión donde vive el índice; no se serializa, se reconstruye al cargar
+INDEX_KEY = '_channel_index'
+
+SET_OPERATIONS = {
+    '+': frozenset.union,
+    '|': frozenset.union,
+    '&': frozenset.intersection,
+    '-': frozenset.difference,
+}
+
+_TOKEN = re.compile(r'\s*(?:([()*+|&-])|(#?[a-z0-9_]+))')
+
+
+class ChannelIndex:
+    """Pertenencia de canales a etiquetas y grupos, calculada una sola vez.
+
+    Se construye en una pasada sobre `data['channels']` y `data['channel_groups']`
+    y queda en la sesión hasta que algo los modifica (`invalidate_index`). Resolver
+    una etiqueta o un grupo es una búsqueda en un dict y combinarlos son
+    operaciones entre frozensets, sin volver a recorrer los canales.
+    """
+    __slots__ = ('order', 'all', 'tags', 'groups', 'search')
+
+    def __init__(self, channels: Dict[str, Dict], groups: Dict[str, List[str]]):
+        self.order: Tuple[str, ...] = tuple(channels)
+        self.all: FrozenSet[str] = frozenset(self.order)
+        tags: Dict[str, set] = {}
+        search = []
+        for ch_id, ch_info in channels.items():
+            for tag in ch_info.get('tags', ()):
+                tags.setdefault(tag, set()).add(ch_id)
+            # Texto de búsqueda en minúsculas preparado de antemano
+            search.append((ch_id, f"{(ch_info.get('title') or '').lower()}\n{(ch_info.get('username') or '').lower()}\n{ch_id}"))
+        self.tags: Dict[str, FrozenSet[str]] = {tag: frozenset(members) for tag, members in sorted(tags.items())}
+        # Los grupos solo conservan canales que siguen registrados
+        self.groups: Dict[str, FrozenSet[str]] = {
+            name: self.all.intersection(members) for name, members in sorted(groups.items())
+        }
+        self.search = tuple(search)
+
+    def filter(self, query) -> List[str]:
+        """Ids (en orden de alta) cuyo título, @usuario o id contienen `query`"""
+        if not query:
+            return list(self.order)
+        needle = query.lower().lstrip('@')
+        return [ch_id for ch_id, haystack in self.search if needle in haystack]
+
+    def term(self, name) -> FrozenSet[str]:
+        """Canales de `#etiqueta`, de un grupo o de todos (`*`)"""
+        if name == '*':
+            return self.all
+        if name.startswith('#'):
+            members = self.tags.get(name[1:])
+            if members is None:
+                raise ValueError(f"Etiqueta desconocida: {name}")
+            return members
+        members = self.groups.get(name)
+        if members is None:
+            raise ValueError(f"Grupo desconocido: {name}")
+        return members
+
+    def resolve(self, expression) -> FrozenSet[str]:
+        """Evalúa una expresión como `#promo + ventas - #pausados & (#es | #mx)`.
+
+        `+`/`|` unen, `&` intersecta y `-` excluye. Todos los operadores tienen
+        la misma prioridad y se aplican de izquierda a derecha; los paréntesis
+        agrupan.
+        """
+        tokens = tokenize(expression)
+        if not tokens:
+            raise ValueError("Expresión vacía")
+        result, position = self._expression(tokens, 0)
+        if position != len(tokens):
+            raise ValueError(f"Sobra «{tokens[position]}»")
+        return result
+
+    def _expression(self, tokens, position):
+        result, position = self._operand(tokens, position)
+        while position < len(tokens) and tokens[position] in SET_OPERATIONS:
+            operation = SET_OPERATIONS[tokens[position]]
+            operand, position = self._operand(tokens, position + 1)
+            result = operation(result, operand)
+        return result, position
+
+    def _operand(self, tokens, position):
+        if position >= len(tokens):
+            raise ValueError("Falta un grupo o etiqueta al final")
+        token = tokens[position]
+        if token == '(':
+            result, position = self._expression(tokens, position + 1)
+            if position >= len(tokens) or tokens[position] != ')':
+                raise ValueError("Falta cerrar un paréntesis")
+            return result, position + 1
+        if token in SET_OPERATIONS or token == ')':
+            raise ValueError(f"Se esperaba un grupo o etiqueta antes de «{token}»")
+        return self.term(token), position + 1
+
+
+def tokenize(expression) -> List[str]:
+    tokens = []
+    text = expression.strip().lower()
+    position = 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            rest = text[position:].strip()
+            if not rest:
+                break
+            raise ValueError(f"No se entiende «{rest[:20]}»")
+        tokens.append(match.group(1) or match.group(2))
+        position = match.end()
+    return tokens
+
+
+def channel_index(data) -> ChannelIndex:
+    """Índice de la sesión, construido en el primer uso tras cada cambio"""
+    index = data.get(INDEX_KEY)
+    if index is None:
+        index = data[INDEX_KEY] = ChannelIndex(data['channels'], data.get('channel_groups') or {})
+    return index
+
+
+def invalidate_index(data):
+    """Descarta el índice tras modificar canales, etiquetas o grupos"""
+    data.pop(INDEX_KEY, None)
@@ -0,0 +1,191 @@
+"""Caché de metadatos de canales y permisos del bot con revalidación en segundo plano"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from telegram.error import BadRequest, Forbidden
+
+logger = logging.getLogger(__name__)
+
+# Tiempo durante el que el estado de permisos se considera fresco
+CHANNEL_STATUS_TTL = float(os.getenv('CHANNEL_STATUS_TTL', 600))
+# Título/username cambian poco: se vuelven a pedir con menos frecuencia
+CHANNEL_META_TTL = float(os.getenv('CHANNEL_META_TTL', 6 * 3600))
+CHANNEL_REVALIDATE_INTERVAL = float(os.getenv('CHANNEL_REVALIDATE_INTERVAL', 60))
+CHANNEL_REVALIDATE_BATCH = int(os.getenv('CHANNEL_REVALIDATE_BATCH', 20))
+
+
+def can_post(member):
+    """True si el bot puede publicar con ese estado de miembro"""
+    if member.status == 'creator':
+        return True
+    # En canales el administrador necesita además el permiso de publicar
+    return member.status == 'administrator' and getattr(member, 'can_post_messages', None) is not False
+
+
+def is_permanent_denial(error):
+    """Errores que indican que el bot ya no puede escribir en el chat"""
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and any(
+        reason in str(error).lower() for reason in ('chat not found', 'not enough rights', 'need administrator rights')
+    )
+
+
+class ChannelCache:
+    """Estado conocido de cada canal: metadatos y si el bot puede publicar.
+
+    Las lecturas nunca salen a la red: devuelven lo que haya en caché aunque
+    esté caducado y, en ese caso, programan una revalidación (stale-while-
+    revalidate). Un bucle en segundo plano recorre por tandas los canales
+    con el estado más antiguo. Como mucho `batch` revalidaciones consultan
+    Telegram a la vez, vengan de lecturas o del bucle.
+    """
+    def __init__(self, fetch_member: Callable[[str], Awaitable[object]],
+                 fetch_chat: Callable[[str], Awaitable[object]],
+                 ttl=CHANNEL_STATUS_TTL, meta_ttl=CHANNEL_META_TTL,
+                 interval=CHANNEL_REVALIDATE_INTERVAL, batch=CHANNEL_REVALIDATE_BATCH):
+        self.fetch_member = fetch_member
+        self.fetch_chat = fetch_chat
+        self.ttl = ttl
+        self.meta_ttl = meta_ttl
+        self.interval = interval
+        self.batch = batch
+        self.entries: Dict[str, Dict] = {}
+        self._refreshing: Set[str] = set()
+        self._slots = asyncio.Semaphore(batch)
+        self._tasks = set()
+        self._task = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _entry(self, chat_id):
+        chat_id = str(chat_id)
+        entry = self.entries.get(chat_id)
+        if entry is None:
+            entry = self.entries[chat_id] = {
+                'title': None, 'username': None, 'type': None, 'writable': None,
+                'status_checked': 0.0, 'meta_checked': 0.0, 'error': None,
+            }
+        return entry
+
+    def track(self, chat_ids: Iterable):
+        """Registra canales para que el bucle de fondo los revalide"""
+        for chat_id in chat_ids:
+            self._entry(chat_id)
+
+    def record(self, chat_id, chat=None, member=None):
+        """Guarda el resultado de un get_chat / get_chat_member hecho por otra vía"""
+        entry = self._entry(chat_id)
+        now = time.time()
+        if chat is not None:
+            entry.update(title=chat.title, username=chat.username, type=chat.type, meta_checked=now)
+        if member is not None:
+            entry.update(writable=can_post(member), status_checked=now, error=None)
+
+    def mark_unwritable(self, chat_id, error):
+        """Anota un fallo definitivo observado al publicar"""
+        entry = self._entry(chat_id)
+        entry.update(writable=False, status_checked=time.time(), error=str(error))
+
+    def get(self, chat_id) -> Optional[Dict]:
+        """Entrada en caché (posiblemente caducada); si lo está, se revalida en segundo plano"""
+        entry = self.entries.get(str(chat_id))
+        if entry is not None and self._is_stale(entry):
+            self._schedule_refresh(str(chat_id))
+        return entry
+
+    def unwritable(self, chat_ids: Iterable) -> Set[str]:
+        """Canales de la lista en los que se sabe que el bot no puede publicar"""
+        blocked = set()
+        for chat_id in chat_ids:
+            entry = self.get(chat_id)
+            if entry is not None and entry['writable'] is False:
+                blocked.add(str(chat_id))
+        return blocked
+
+    def _is_stale(self, entry, now=None):
+        return (now or time.time()) - entry['status_checked'] >= self.ttl
+
+    def _schedule_refresh(self, chat_id):
+        if chat_id in self._refreshing:
+            return
+        self._refreshing.add(chat_id)
+        task = asyncio.create_task(self._refresh(chat_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, chat_id):
+        self._refreshing.add(chat_id)
+        try:
+            async with self._slots:
+                entry = self._entry(chat_id)
+                if not self._is_stale(entry):
+                    # Otro camino lo actualizó mientras esperaba turno
+                    return
+                if time.time() - entry['meta_checked'] >= self.meta_ttl:
+                    member, chat = await asyncio.gather(self.fetch_member(chat_id), self.fetch_chat(chat_id))
+                else:
+                    member, chat = await self.fetch_member(chat_id), None
+            was_writable = entry['writable']
+            self.record(chat_id, chat=chat, member=member)
+            if was_writable is not None and was_writable != entry['writable']:
+                logger.info(f"📡 Permisos de {entry['title'] or chat_id} actualizados: "
+                            f"{'puede publicar' if entry['writable'] else 'sin permisos'}")
+        except Exception as e:
+            entry = self._entry(chat_id)
+            if is_permanent_denial(e):
+                self.mark_unwritable(chat_id, e)
+            else:
+                # Fallo transitorio: se conserva el último estado conocido
+                entry['error'] = str(e)
+                entry['status_checked'] = time.time()
+            logger.warning(f"⚠️ No se pudo revalidar el canal {chat_id}: {e}")
+        finally:
+            self._refreshing.discard(chat_id)
+
+    async def revalidate(self, limit=None):
+        """Revalida los canales caducados más antiguos, `batch` a la vez"""
+        now = time.time()
+        stale = sorted(
+            (chat_id for chat_id, entry in self.entries.items()
+             if self._is_stale(entry, now) and chat_id not in self._refreshing),
+            key=lambda chat_id: self.entries[chat_id]['status_checked']
+        )
+        if limit is not None:
+            stale = stale[:limit]
+        for i in range(0, len(stale), self.batch):
+            await asyncio.gather(*(self._refresh(chat_id) for chat_id in stale[i:i + self.batch]))
+        return len(stale)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # Como mucho una tanda por ciclo para no competir con los envíos
+                await self.revalidate(limit=self.batch)
+            except Exception as e:
+                logger.error(f"Error revalidando canales: {e}")
+
+    def status(self):
+        return {
+            'tracked': len(self.entries),
+            'unwritable': sum(1 for entry in self.entries.values() if entry['writable'] is False),
+            'stale': sum(1 for entry in self.entries.values() if self._is_stale(entry)),
+        }
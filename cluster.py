@@ -0,0 +1,462 @@
+"""Modo multi-instancia: coordinación por un backend compartido, líder elegido y orden por usuario"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from dedup import DEDUP_TTL
+from storage import REDIS_URL, STATE_BACKEND
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_MODE = os.getenv('CLUSTER_MODE', '').lower() in ('1', 'true', 'yes')
+# Render define RENDER_INSTANCE_ID en cada instancia
+INSTANCE_ID = os.getenv('RENDER_INSTANCE_ID') or f"{socket.gethostname()}-{os.getpid()}"
+CLUSTER_KEY_PREFIX = os.getenv('CLUSTER_KEY_PREFIX', 'botonesbot:')
+# El líder renueva su concesión cada CLUSTER_RENEW_INTERVAL; si cae, otra instancia la toma tras el TTL
+CLUSTER_LEASE_TTL = float(os.getenv('CLUSTER_LEASE_TTL', 15))
+CLUSTER_RENEW_INTERVAL = float(os.getenv('CLUSTER_RENEW_INTERVAL', 5))
+# Bloqueo por usuario mientras una instancia procesa sus updates (se renueva mientras dure)
+CLUSTER_USER_LOCK_TTL = float(os.getenv('CLUSTER_USER_LOCK_TTL', 30))
+CLUSTER_LOCK_POLL = 0.02
+CLUSTER_LOCK_POLL_MAX = 0.25
+
+# Comparar y actuar de forma atómica: solo el dueño renueva o libera
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+# Campos de hash: sobrescribir solo si existe y leer-y-borrar en un paso
+_HREPLACE_SCRIPT = """
+if redis.call('hexists', KEYS[1], ARGV[1]) == 1 then
+    redis.call('hset', KEYS[1], ARGV[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+_HPOP_SCRIPT = """
+local value = redis.call('hget', KEYS[1], ARGV[1])
+if value then
+    redis.call('hdel', KEYS[1], ARGV[1])
+end
+return value
+"""
+
+
+class Coordinator:
+    """Primitivas compartidas entre instancias: concesiones con TTL y hashes.
+
+    Una concesión (`acquire`) es una clave con dueño y caducidad; solo el
+    dueño puede renovarla o liberarla. Con ella se construyen la elección de
+    líder, los bloqueos por usuario y la deduplicación de updates.
+    """
+    async def acquire(self, key, token, ttl) -> bool:
+        raise NotImplementedError
+
+    async def renew(self, key, token, ttl) -> bool:
+        raise NotImplementedError
+
+    async def release(self, key, token) -> bool:
+        raise NotImplementedError
+
+    async def owner(self, key) -> Optional[str]:
+        raise NotImplementedError
+
+    async def hget(self, name, key) -> Optional[str]:
+        raise NotImplementedError
+
+    async def hgetall(self, name) -> Dict[str, str]:
+        raise NotImplementedError
+
+    async def hset(self, name, key, value):
+        raise NotImplementedError
+
+    async def hdel(self, name, key) -> bool:
+        raise NotImplementedError
+
+    async def hsetnx(self, name, key, value) -> bool:
+        """Crea el campo solo si no existe"""
+        raise NotImplementedError
+
+    async def hreplace(self, name, key, value) -> bool:
+        """Sobrescribe el campo solo si sigue existiendo"""
+        raise NotImplementedError
+
+    async def hpop(self, name, key) -> Optional[str]:
+        """Lee y borra el campo de forma atómica (None si ya no estaba)"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class LocalCoordinator(Coordinator):
+    """Sustituto local y en memoria del backend compartido (pruebas o una sola instancia).
+
+    Varias instancias de TelegramBot en el mismo proceso pueden compartir un
+    mismo objeto para ensayar elección de líder y bloqueos sin Redis.
+    """
+    def __init__(self):
+        self.leases: Dict[str, Tuple[str, float]] = {}
+        self.hashes: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def _live_owner(self, key, now):
+        lease = self.leases.get(key)
+        if lease is None:
+            return None
+        if lease[1] <= now:
+            del self.leases[key]
+            return None
+        return lease[0]
+
+    async def acquire(self, key, token, ttl):
+        with self._lock:
+            now = time.monotonic()
+            if self._live_owner(key, now) is not None:
+                return False
+            self.leases[key] = (token, now + ttl)
+            return True
+
+    async def renew(self, key, token, ttl):
+        with self._lock:
+            now = time.monotonic()
+            if self._live_owner(key, now) != token:
+                return False
+            self.leases[key] = (token, now + ttl)
+            return True
+
+    async def release(self, key, token):
+        with self._lock:
+            if self._live_owner(key, time.monotonic()) != token:
+                return False
+            del self.leases[key]
+            return True
+
+    async def owner(self, key):
+        with self._lock:
+            return self._live_owner(key, time.monotonic())
+
+    async def hget(self, name, key):
+        with self._lock:
+            return self.hashes.get(name, {}).get(str(key))
+
+    async def hgetall(self, name):
+        with self._lock:
+            return dict(self.hashes.get(name, {}))
+
+    async def hset(self, name, key, value):
+        with self._lock:
+            self.hashes.setdefault(name, {})[str(key)] = value
+
+    async def hdel(self, name, key):
+        with self._lock:
+            return self.hashes.get(name, {}).pop(str(key), None) is not None
+
+    async def hsetnx(self, name, key, value):
+        with self._lock:
+            fields = self.hashes.setdefault(name, {})
+            if str(key) in fields:
+                return False
+            fields[str(key)] = value
+            return True
+
+    async def hreplace(self, name, key, value):
+        with self._lock:
+            fields = self.hashes.get(name, {})
+            if str(key) not in fields:
+                return False
+            fields[str(key)] = value
+            return True
+
+    async def hpop(self, name, key):
+        with self._lock:
+            return self.hashes.get(name, {}).pop(str(key), None)
+
+
+class RedisCoordinator(Coordinator):
+    """Coordinación sobre Redis (SET NX PX y scripts de comparar-y-actuar)"""
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def _text(value):
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    async def acquire(self, key, token, ttl):
+        return bool(await asyncio.to_thread(self.client.set, key, token, nx=True, px=int(ttl * 1000)))
+
+    async def renew(self, key, token, ttl):
+        return bool(await asyncio.to_thread(self.client.eval, _RENEW_SCRIPT, 1, key, token, int(ttl * 1000)))
+
+    async def release(self, key, token):
+        return bool(await asyncio.to_thread(self.client.eval, _RELEASE_SCRIPT, 1, key, token))
+
+    async def owner(self, key):
+        return self._text(await asyncio.to_thread(self.client.get, key))
+
+    async def hget(self, name, key):
+        return self._text(await asyncio.to_thread(self.client.hget, name, str(key)))
+
+    async def hgetall(self, name):
+        raw = await asyncio.to_thread(self.client.hgetall, name)
+        return {self._text(k): self._text(v) for k, v in raw.items()}
+
+    async def hset(self, name, key, value):
+        await asyncio.to_thread(self.client.hset, name, str(key), value)
+
+    async def hdel(self, name, key):
+        return bool(await asyncio.to_thread(self.client.hdel, name, str(key)))
+
+    async def hsetnx(self, name, key, value):
+        return bool(await asyncio.to_thread(self.client.hsetnx, name, str(key), value))
+
+    async def hreplace(self, name, key, value):
+        return bool(await asyncio.to_thread(self.client.eval, _HREPLACE_SCRIPT, 1, name, str(key), value))
+
+    async def hpop(self, name, key):
+        return self._text(await asyncio.to_thread(self.client.eval, _HPOP_SCRIPT, 1, name, str(key)))
+
+    async def close(self):
+        await asyncio.to_thread(self.client.close)
+
+
+class LeaderElector:
+    """Mantiene la concesión de líder y avisa al ganarla o perderla.
+
+    Solo el líder registra el webhook y ejecuta los trabajos de fondo; todas
+    las instancias atienden `/webhook`.
+    """
+    def __init__(self, coordinator: Coordinator, key, instance_id,
+                 on_elected: Callable[[], Awaitable[None]], on_demoted: Callable[[], Awaitable[None]],
+                 ttl=CLUSTER_LEASE_TTL, interval=CLUSTER_RENEW_INTERVAL):
+        self.coordinator = coordinator
+        self.key = key
+        self.instance_id = instance_id
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.ttl = ttl
+        self.interval = interval
+        self.is_leader = False
+        self.elections = 0
+        self._task = None
+
+    async def step(self):
+        """Un ciclo: renovar si se es líder, intentar serlo si no"""
+        try:
+            if self.is_leader:
+                still_leader = await self.coordinator.renew(self.key, self.instance_id, self.ttl)
+            else:
+                still_leader = await self.coordinator.acquire(self.key, self.instance_id, self.ttl)
+        except Exception as e:
+            # Sin backend no se puede garantizar la exclusividad
+            logger.error(f"Error en la elección de líder: {e}")
+            still_leader = False
+        if still_leader and not self.is_leader:
+            self.is_leader = True
+            self.elections += 1
+            logger.info(f"👑 Instancia {self.instance_id} elegida líder")
+            await self._notify(self.on_elected)
+        elif not still_leader and self.is_leader:
+            self.is_leader = False
+            logger.warning(f"⚠️ Instancia {self.instance_id} ha perdido el liderazgo")
+            await self._notify(self.on_demoted)
+
+    async def _notify(self, callback):
+        try:
+            await callback()
+        except Exception as e:
+            logger.error(f"Error en el cambio de liderazgo: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            await self._notify(self.on_demoted)
+            # Liberar ya para que otra instancia no espere al TTL
+            await self.coordinator.release(self.key, self.instance_id)
+
+    async def _run(self):
+        while True:
+            await self.step()
+            await asyncio.sleep(self.interval)
+
+
+class SharedJobStore:
+    """Entradas (trabajos programados, envíos pendientes) en un hash compartido, un campo JSON por entrada"""
+    def __init__(self, coordinator: Coordinator, name):
+        self.coordinator = coordinator
+        self.name = name
+
+    async def load_all(self) -> List[Dict]:
+        return [json.loads(value) for value in (await self.coordinator.hgetall(self.name)).values()]
+
+    async def get(self, entry_id) -> Optional[Dict]:
+        value = await self.coordinator.hget(self.name, entry_id)
+        return json.loads(value) if value is not None else None
+
+    async def add(self, job) -> bool:
+        return await self.coordinator.hsetnx(self.name, job['id'], json.dumps(job, ensure_ascii=False))
+
+    async def update(self, job) -> bool:
+        """Guarda el trabajo modificado; False si ya no estaba (no lo resucita)"""
+        return await self.coordinator.hreplace(self.name, job['id'], json.dumps(job, ensure_ascii=False))
+
+    async def take(self, job_id) -> Optional[Dict]:
+        """Retira el trabajo para ejecutarlo y devuelve su última versión (None si otro lo tomó)"""
+        value = await self.coordinator.hpop(self.name, job_id)
+        return json.loads(value) if value is not None else None
+
+    async def remove(self, job_id) -> bool:
+        """Quita el trabajo; False si ya no estaba (cancelado o tomado por otra instancia)"""
+        return await self.coordinator.hdel(self.name, job_id)
+
+
+class SharedAlbumParts:
+    """Elementos de álbum recibidos por cualquier instancia, agrupados por usuario y media_group_id"""
+    def __init__(self, coordinator: Coordinator, prefix, instance_id, claim_ttl=DEDUP_TTL):
+        self.coordinator = coordinator
+        self.prefix = prefix
+        self.instance_id = instance_id
+        self.claim_ttl = claim_ttl
+
+    def _name(self, user_id, group_id):
+        return f"{self.prefix}{user_id}:{group_id}"
+
+    async def add(self, user_id, group_id, message_id, payload):
+        name = self._name(user_id, group_id)
+        await self.coordinator.hset(name, message_id, json.dumps(payload, ensure_ascii=False))
+        await self.coordinator.hset(name, 'last', repr(time.time()))
+
+    async def quiet_for(self, user_id, group_id) -> float:
+        """Segundos desde el último elemento recibido en cualquier instancia"""
+        last = await self.coordinator.hget(self._name(user_id, group_id), 'last')
+        return time.time() - float(last) if last is not None else float('inf')
+
+    async def claim(self, user_id, group_id) -> bool:
+        """True solo para la primera instancia que entrega el álbum"""
+        return await self.coordinator.acquire(f"{self._name(user_id, group_id)}:claim", self.instance_id, self.claim_ttl)
+
+    async def take(self, user_id, group_id) -> List[Dict]:
+        """Retira todos los elementos, ordenados por message_id"""
+        name = self._name(user_id, group_id)
+        fields = await self.coordinator.hgetall(name)
+        for field in fields:
+            await self.coordinator.hdel(name, field)
+        parts = sorted((int(field), value) for field, value in fields.items() if field != 'last')
+        return [json.loads(value) for _, value in parts]
+
+
+class Cluster:
+    """Coordinación de esta instancia con el resto del despliegue"""
+    def __init__(self, coordinator: Coordinator, instance_id=INSTANCE_ID, prefix=CLUSTER_KEY_PREFIX,
+                 user_lock_ttl=CLUSTER_USER_LOCK_TTL, dedup_ttl=DEDUP_TTL):
+        self.coordinator = coordinator
+        self.instance_id = instance_id
+        self.prefix = prefix
+        self.user_lock_ttl = user_lock_ttl
+        self.dedup_ttl = dedup_ttl
+        self.jobs = SharedJobStore(coordinator, f"{prefix}scheduled_jobs")
+        self.retries = SharedJobStore(coordinator, f"{prefix}retry_queue")
+        self.templates = SharedJobStore(coordinator, f"{prefix}shared_templates")
+        self.albums = SharedAlbumParts(coordinator, f"{prefix}album:", instance_id)
+        self.elector: Optional[LeaderElector] = None
+        self.lock_waits = 0
+        self.lock_wait_total = 0.0
+
+    @property
+    def is_leader(self):
+        return self.elector is not None and self.elector.is_leader
+
+    def start_election(self, on_elected, on_demoted):
+        self.elector = LeaderElector(self.coordinator, f"{self.prefix}leader", self.instance_id, on_elected, on_demoted)
+        self.elector.start()
+
+    async def claim_update(self, update_id) -> bool:
+        """True si esta instancia es la primera en recibir el update"""
+        return await self.coordinator.acquire(f"{self.prefix}update:{update_id}", self.instance_id, self.dedup_ttl)
+
+    async def release_update(self, update_id):
+        """Devuelve un update reclamado que no se pudo encolar (Telegram lo reintentará)"""
+        await self.coordinator.release(f"{self.prefix}update:{update_id}", self.instance_id)
+
+    @asynccontextmanager
+    async def user_lock(self, user_id):
+        """Exclusión entre instancias para los updates de un usuario (conserva su orden)"""
+        key = f"{self.prefix}user:{user_id}"
+        token = f"{self.instance_id}:{uuid.uuid4().hex[:8]}"
+        started = time.monotonic()
+        delay = CLUSTER_LOCK_POLL
+        while not await self.coordinator.acquire(key, token, self.user_lock_ttl):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CLUSTER_LOCK_POLL_MAX)
+        waited = time.monotonic() - started
+        if waited > CLUSTER_LOCK_POLL:
+            self.lock_waits += 1
+            self.lock_wait_total += waited
+        # Una publicación puede tardar más que el TTL: se renueva mientras se procesa
+        keeper = asyncio.create_task(self._keep_lock(key, token))
+        try:
+            yield
+        finally:
+            keeper.cancel()
+            await asyncio.gather(keeper, return_exceptions=True)
+            await self.coordinator.release(key, token)
+
+    async def _keep_lock(self, key, token):
+        while True:
+            await asyncio.sleep(self.user_lock_ttl / 3)
+            if not await self.coordinator.renew(key, token, self.user_lock_ttl):
+                logger.warning(f"⚠️ Bloqueo {key} perdido durante el procesamiento")
+                return
+
+    async def stop(self):
+        if self.elector:
+            await self.elector.stop()
+        await self.coordinator.close()
+
+    def status(self):
+        return {
+            'instance': self.instance_id,
+            'leader': self.is_leader,
+            'elections': self.elector.elections if self.elector else 0,
+            'user_lock_waits': self.lock_waits,
+            'user_lock_wait_avg_ms': round(1000 * self.lock_wait_total / self.lock_waits, 3) if self.lock_waits else 0,
+        }
+
+
+def create_cluster(enabled=CLUSTER_MODE) -> Optional[Cluster]:
+    """Coordinación multi-instancia si CLUSTER_MODE está activo (Redis o sustituto local)"""
+    if not enabled:
+        return None
+    if STATE_BACKEND != 'redis':
+        logger.warning(f"⚠️ CLUSTER_MODE con STATE_BACKEND={STATE_BACKEND}: las sesiones no se comparten entre instancias")
+    if not REDIS_URL:
+        logger.warning("⚠️ CLUSTER_MODE sin REDIS_URL: coordinación local, válida solo para una instancia")
+        return Cluster(LocalCoordinator())
+    try:
+        import redis
+    except ImportError:
+        raise ValueError("❌ CLUSTER_MODE requiere el paquete 'redis'")
+    return Cluster(RedisCoordinator(redis.Redis.from_url(REDIS_URL)))
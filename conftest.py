@@ -0,0 +1,42 @@
+"""Configuración común de las pruebas"""
+import os
+from types import SimpleNamespace
+
+import pytest
+
+# bot.py lee la configuración al importarse; sin red ni ficheros de estado
+os.environ.setdefault('BOT_TOKEN', '123:test')
+os.environ.setdefault('STATE_BACKEND', 'memory')
+
+
+class StubApi:
+    """API de envío simulada: registra cada llamada y lanza los errores programados en `failures`"""
+    def __init__(self):
+        self.calls = []
+        self.failures = {}
+
+    def __getattr__(self, method):
+        async def call(chat_id=None, **kwargs):
+            self.calls.append((method, chat_id))
+            pending = self.failures.get(method)
+            if pending:
+                raise pending.pop(0)
+            return SimpleNamespace(message_id=len(self.calls), chat=SimpleNamespace(id=chat_id))
+        return call
+
+    def methods(self):
+        return [method for method, _ in self.calls]
+
+
+@pytest.fixture
+def stub_bot(tmp_path):
+    """TelegramBot cuyo carril masivo es una StubApi, sin límites de tasa"""
+    import bot as bot_module
+    telegram_bot = bot_module.TelegramBot()
+    telegram_bot.bulk_bot = StubApi()
+    telegram_bot.retry_queue.path = str(tmp_path / 'retry_queue.json')
+
+    async def no_throttle(chat_id):
+        pass
+    telegram_bot.fanout.throttle = no_throttle
+    return telegram_bot
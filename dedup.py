@@ -0,0 +1,55 @@
+"""Caché acotada con TTL para descartar updates y publicaciones duplicadas"""
+import os
+import time
+from collections import OrderedDict
+
+DEDUP_TTL = float(os.getenv('DEDUP_TTL', 3600))
+DEDUP_MAX_SIZE = int(os.getenv('DEDUP_MAX_SIZE', 50000))
+
+
+class TTLCache:
+    """Conjunto de claves vistas recientemente, con caducidad y tamaño máximo.
+
+    Las claves se guardan en orden de inserción, así las caducadas y las más
+    antiguas (LRU) siempre están al principio: comprobar y registrar es O(1)
+    amortizado y la memoria queda fija en `maxsize` entradas.
+    """
+    def __init__(self, ttl=DEDUP_TTL, maxsize=DEDUP_MAX_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[object, float]' = OrderedDict()
+        self.hits = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expire(self, now):
+        entries = self._entries
+        while entries:
+            key, expires_at = next(iter(entries.items()))
+            if expires_at > now:
+                break
+            entries.popitem(last=False)
+
+    def __contains__(self, key):
+        now = time.monotonic()
+        self._expire(now)
+        if key in self._entries:
+            self.hits += 1
+            return True
+        return False
+
+    def add(self, key) -> bool:
+        """Registra `key`; devuelve False si ya se había visto (duplicado)"""
+        now = time.monotonic()
+        self._expire(now)
+        if key in self._entries:
+            self.hits += 1
+            return False
+        self._entries[key] = now + self.ttl
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return True
+
+    def discard(self, key):
+        self._entries.pop(key, None)
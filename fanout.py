@@ -0,0 +1,201 @@
+"""Motor de envío concurrente (fan-out) con limitación de tasa por chat y carriles de prioridad"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Límites de Telegram: ~30 mensajes/s globales y ~20 mensajes/min por grupo o canal
+FANOUT_CONCURRENCY = int(os.getenv('FANOUT_CONCURRENCY', 10))
+GLOBAL_RATE = float(os.getenv('FANOUT_GLOBAL_RATE', 25))
+PER_CHAT_RATE = float(os.getenv('FANOUT_PER_CHAT_RATE', 20 / 60))
+PER_CHAT_BURST = float(os.getenv('FANOUT_PER_CHAT_BURST', 3))
+
+# Carriles de la API: conexiones de cada pool y llamadas masivas simultáneas mientras hay tráfico interactivo
+INTERACTIVE_POOL_SIZE = int(os.getenv('INTERACTIVE_POOL_SIZE', 64))
+BULK_POOL_SIZE = int(os.getenv('BULK_POOL_SIZE', 32))
+BULK_YIELD_CONCURRENCY = int(os.getenv('BULK_YIELD_CONCURRENCY', 8))
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+
+class TokenBucket:
+    """Cubeta de tokens: `rate` tokens por segundo con ráfaga máxima `capacity`"""
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens=1):
+        """Espera hasta poder consumir `tokens`"""
+        async with self._lock:
+            while True:
+                self._refill(time.monotonic())
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+    def is_idle(self):
+        """True si la cubeta está llena y nadie espera"""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity and not self._lock.locked()
+
+
+class FanoutDispatcher:
+    """Envía a muchos chats a la vez con ventana de concurrencia acotada"""
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(self, concurrency=FANOUT_CONCURRENCY, global_rate=GLOBAL_RATE,
+                 per_chat_rate=PER_CHAT_RATE, per_chat_burst=PER_CHAT_BURST):
+        self.concurrency = concurrency
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.chat_buckets: Dict[str, TokenBucket] = {}
+        self.paused_until: Dict[str, float] = {}
+
+    def _chat_bucket(self, chat_id):
+        key = str(chat_id)
+        bucket = self.chat_buckets.get(key)
+        if bucket is None:
+            if len(self.chat_buckets) >= self.MAX_CHAT_BUCKETS:
+                self._prune_buckets()
+            bucket = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+            self.chat_buckets[key] = bucket
+        return bucket
+
+    def _prune_buckets(self):
+        """Descarta cubetas llenas y sin uso para acotar la memoria"""
+        for key in [k for k, b in self.chat_buckets.items() if b.is_idle()]:
+            del self.chat_buckets[key]
+
+    def pause(self, chat_id, seconds):
+        """Detiene los envíos a un chat durante un flood-wait de Telegram"""
+        key = str(chat_id)
+        self.paused_until[key] = max(self.paused_until.get(key, 0.0), time.monotonic() + seconds)
+
+    async def throttle(self, chat_id):
+        """Espera turno en el límite por chat y en el límite global"""
+        paused_until = self.paused_until.get(str(chat_id))
+        if paused_until is not None:
+            delay = paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                del self.paused_until[str(chat_id)]
+        await self._chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+
+    async def run(self, targets: Iterable[str],
+                  send: Callable[[str], Awaitable[object]]) -> List[Tuple[str, bool, object]]:
+        """Ejecuta `send(chat_id)` para cada destino.
+
+        Devuelve `(chat_id, ok, resultado_o_excepción)` en el mismo orden que `targets`.
+        """
+        targets = list(targets)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def worker(chat_id):
+            async with semaphore:
+                try:
+                    return chat_id, True, await send(chat_id)
+                except Exception as e:
+                    return chat_id, False, e
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(worker(ch_id) for ch_id in targets))
+        logger.info(f"📤 Fan-out a {len(targets)} canales en {time.monotonic() - started:.2f}s")
+        return results
+
+
+class PriorityLanes:
+    """Admisión de llamadas a la API en dos carriles, con prioridad para el interactivo.
+
+    Cada carril admite como mucho tantas llamadas como conexiones tiene su pool.
+    Mientras haya llamadas interactivas en curso o esperando, el carril masivo
+    baja a `bulk_yield` llamadas simultáneas: un fan-out grande no compite con
+    las respuestas a los botones.
+    """
+    def __init__(self, interactive=INTERACTIVE_POOL_SIZE, bulk=BULK_POOL_SIZE, bulk_yield=BULK_YIELD_CONCURRENCY):
+        self.limits = {INTERACTIVE: interactive, BULK: bulk}
+        self.bulk_yield = max(1, min(bulk_yield, bulk))
+        self.in_flight = {INTERACTIVE: 0, BULK: 0}
+        self.waiters = {INTERACTIVE: deque(), BULK: deque()}
+        self.waited = {INTERACTIVE: 0, BULK: 0}
+
+    def waiting(self, lane):
+        return sum(1 for future in self.waiters[lane] if not future.done())
+
+    def _interactive_busy(self):
+        return self.in_flight[INTERACTIVE] > 0 or self.waiting(INTERACTIVE) > 0
+
+    def _has_room(self, lane):
+        if lane == BULK and self._interactive_busy():
+            return self.in_flight[BULK] < self.bulk_yield
+        return self.in_flight[lane] < self.limits[lane]
+
+    def _wake(self):
+        """Concede huecos libres: primero al carril interactivo"""
+        for lane in (INTERACTIVE, BULK):
+            waiters = self.waiters[lane]
+            while waiters and self._has_room(lane):
+                future = waiters.popleft()
+                # Cancelado mientras esperaba (p. ej. por un timeout): no se le cuenta hueco
+                if future.done():
+                    continue
+                self.in_flight[lane] += 1
+                future.set_result(None)
+
+    async def acquire(self, lane):
+        if not self.waiters[lane] and self._has_room(lane):
+            self.in_flight[lane] += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[lane].append(future)
+        self.waited[lane] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # El hueco llegó a concederse: devolverlo
+                self.release(lane)
+            else:
+                if future in self.waiters[lane]:
+                    self.waiters[lane].remove(future)
+                self._wake()
+            raise
+
+    def release(self, lane):
+        self.in_flight[lane] -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, lane):
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def status(self):
+        return {
+            lane: {
+                'in_flight': self.in_flight[lane],
+                'waiting': self.waiting(lane),
+                'limit': self.limits[lane],
+                'waited_total': self.waited[lane],
+            }
+            for lane in (INTERACTIVE, BULK)
+        }
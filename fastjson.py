@@ -0,0 +1,27 @@
+"""JSON rápido: usa orjson o ujson si están instalados, si no la librería estándar"""
+import json
+
+try:
+    import orjson
+
+    JSON_BACKEND = 'orjson'
+    loads = orjson.loads
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    try:
+        import ujson
+
+        JSON_BACKEND = 'ujson'
+        loads = ujson.loads
+
+        def dumps(obj):
+            return ujson.dumps(obj, ensure_ascii=False)
+    except ImportError:
+        JSON_BACKEND = 'json'
+        # json.loads acepta bytes directamente (UTF-8), sin decodificar antes
+        loads = json.loads
+
+        def dumps(obj):
+            return json.dumps(obj, ensure_ascii=False)
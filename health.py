@@ -0,0 +1,152 @@
+"""Salud del servicio: identidad del bot en caché, lag del event loop y fases del arranque"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_REFRESH_INTERVAL = float(os.getenv('IDENTITY_REFRESH_INTERVAL', 300))
+# Sin un get_me correcto en este tiempo, Telegram se considera no disponible
+UPSTREAM_STALE_AFTER = float(os.getenv('UPSTREAM_STALE_AFTER', 900))
+LOOP_LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL', 0.5))
+
+
+class UpstreamHealth:
+    """Guarda la identidad del bot y el último estado conocido de Telegram.
+
+    `get_me` solo se llama al arrancar y en un refresco periódico en segundo
+    plano; los health checks leen el valor en caché sin salir a la red.
+    """
+    def __init__(self, get_me: Callable[[], Awaitable[object]], interval=IDENTITY_REFRESH_INTERVAL):
+        self.get_me = get_me
+        self.interval = interval
+        self.identity: Optional[object] = None
+        self.last_success: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._task = None
+
+    def record(self, identity):
+        """Guarda una identidad obtenida por otra vía (p. ej. al inicializar)"""
+        self.identity = identity
+        self.last_success = time.time()
+        self.last_error = None
+
+    async def refresh(self):
+        """Consulta get_me y actualiza la caché"""
+        try:
+            self.record(await self.get_me())
+        except Exception as e:
+            self.last_error = str(e)
+            logger.warning(f"⚠️ No se pudo refrescar la identidad del bot: {e}")
+
+    @property
+    def healthy(self):
+        return self.last_success is not None and time.time() - self.last_success < UPSTREAM_STALE_AFTER
+
+    @property
+    def username(self):
+        return self.identity.username if self.identity else None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh()
+
+    def status(self):
+        return {
+            'healthy': self.healthy,
+            'bot_username': self.username,
+            'last_success_age_s': round(time.time() - self.last_success, 1) if self.last_success else None,
+            'last_error': self.last_error,
+        }
+
+
+class LoopLagMonitor:
+    """Mide cuánto se retrasa el event loop respecto a un sleep programado"""
+    def __init__(self, interval=LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - started - self.interval)
+            self.max_lag = max(self.max_lag, self.lag)
+
+    def status(self):
+        return {'lag_ms': round(1000 * self.lag, 3), 'max_lag_ms': round(1000 * self.max_lag, 3)}
+
+
+class StartupTimer:
+    """Duración de cada fase del arranque en frío, medida desde el inicio del proceso"""
+    def __init__(self, started=None):
+        self.started = time.monotonic() if started is None else started
+        self.phases: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @contextmanager
+    def phase(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.monotonic() - started
+
+    async def timed(self, name, awaitable):
+        """Espera `awaitable` midiéndolo como fase (para fases que corren a la vez)"""
+        with self.phase(name):
+            return await awaitable
+
+    def mark_ready(self):
+        self.ready_at = time.monotonic()
+
+    def fail(self, error):
+        self.error = str(error)
+
+    @property
+    def ready(self):
+        return self.ready_at is not None
+
+    @property
+    def total(self):
+        return (self.ready_at or time.monotonic()) - self.started
+
+    def summary(self):
+        phases = " · ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items())
+        return f"{self.total:.2f}s ({phases})" if phases else f"{self.total:.2f}s"
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'elapsed_s': round(self.total, 3),
+            'phases_s': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            'error': self.error,
+        }
@@ -0,0 +1,38 @@
+"""Teclados inline memoizados: botones compartidos y markup serializado una sola vez"""
+import os
+from functools import lru_cache
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+KEYBOARD_BUTTON_CACHE = int(os.getenv('KEYBOARD_BUTTON_CACHE', 8192))
+
+
+class CachedMarkup(InlineKeyboardMarkup):
+    """InlineKeyboardMarkup que guarda su forma serializada.
+
+    Los objetos de telegram son inmutables una vez creados, así que el dict
+    de `to_dict()` se calcula en el primer envío y se reutiliza en todos los
+    demás (p. ej. el mismo teclado en cada canal de un fan-out).
+    """
+    __slots__ = ('_serialized',)
+
+    def __init__(self, inline_keyboard, **kwargs):
+        super().__init__(inline_keyboard, **kwargs)
+        with self._unfrozen():
+            self._serialized = None
+
+    def to_dict(self, recursive=True):
+        if not recursive:
+            return super().to_dict(recursive=False)
+        if self._serialized is None:
+            with self._unfrozen():
+                self._serialized = super().to_dict()
+        return self._serialized
+
+
+@lru_cache(maxsize=KEYBOARD_BUTTON_CACHE)
+def cached_button(text, url=None, callback_data=None) -> InlineKeyboardButton:
+    """Botón compartido entre teclados (son inmutables, no hace falta copiarlos)"""
+    if url is not None:
+        return InlineKeyboardButton(text, url=url)
+    return InlineKeyboardButton(text, callback_data=callback_data)
@@ -0,0 +1,182 @@
+"""Métricas en formato Prometheus con coste mínimo en el camino caliente.
+
+Cada combinación de etiquetas se crea una sola vez y queda en caché; en cada
+llamada solo se busca una tupla en un dict y se suma a un número. El texto
+de las etiquetas se formatea únicamente al servir /metrics.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ('upper_bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, documentation, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple, object] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Devuelve (creándolo una vez) el contador para esos valores de etiqueta"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: se esperaban etiquetas {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._children.items():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {child.value}"]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.upper_bounds + (float('inf'),), child.counts):
+            cumulative += count
+            le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Valor instantáneo calculado al servir /metrics"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, read: Callable[[], float]):
+        self.read = read
+        super().__init__(name, documentation)
+
+    def _new_child(self):
+        return None
+
+    def _render_child(self, values, child):
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [f"{self.name} {value}"]
+
+
+class Registry:
+    """Colección de métricas servida en /metrics"""
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, read):
+        return self._register(Gauge(name, documentation, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+WEBHOOK_REQUESTS = REGISTRY.counter(
+    'bot_webhook_requests_total', 'Peticiones al webhook por resultado', ('outcome',))
+WEBHOOK_LATENCY = REGISTRY.histogram(
+    'bot_webhook_latency_seconds', 'Tiempo de respuesta del webhook',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+CALLBACK_LATENCY = REGISTRY.histogram(
+    'bot_callback_latency_seconds', 'Duración de callback_handler por acción', ('action',))
+CALLBACK_ERRORS = REGISTRY.counter(
+    'bot_callback_errors_total', 'Errores en callback_handler por acción', ('action',))
+PUBLISH_SENDS = REGISTRY.counter(
+    'bot_publish_sends_total', 'Envíos de publish_post por tipo de media y resultado', ('media_type', 'outcome'))
+PUBLISH_SEND_LATENCY = REGISTRY.histogram(
+    'bot_publish_send_latency_seconds', 'Duración de cada envío a un canal', ('media_type',))
+TELEGRAM_API_LATENCY = REGISTRY.histogram(
+    'bot_telegram_api_latency_seconds', 'Latencia de las llamadas a la API de Telegram por carril', ('method', 'lane'))
+TELEGRAM_API_ERRORS = REGISTRY.counter(
+    'bot_telegram_api_errors_total', 'Errores de la API de Telegram por método y tipo', ('method', 'error'))
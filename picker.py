@@ -0,0 +1,77 @@
+"""Selector de canales paginado: búsqueda, páginas, etiquetas y grupos guardados"""
+import os
+import re
+from typing import Iterable, Tuple
+
+from channel_index import invalidate_index
+
+# Canales por página en el selector (un botón por fila)
+CHANNEL_PAGE_SIZE = int(os.getenv('CHANNEL_PAGE_SIZE', 8))
+# Canales por página en el listado de /canales (solo texto)
+CHANNEL_LIST_PAGE_SIZE = int(os.getenv('CHANNEL_LIST_PAGE_SIZE', 20))
+CHANNEL_SEARCH_MAX = 64
+MAX_CHANNEL_GROUPS = 50
+LABEL_NAME_MAX = 24
+
+
+def label_slug(name):
+    """Nombre de grupo o etiqueta apto para callback_data (minúsculas, dígitos y _)"""
+    slug = re.sub(r'[^a-z0-9_]', '', name.strip().lower().lstrip('#').replace(' ', '_'))
+    return slug[:LABEL_NAME_MAX]
+
+
+def picker_state(data):
+    """Página y filtro del selector de la sesión; se crean en el primer uso"""
+    return data.setdefault('channel_picker', {'page': 0, 'query': ''})
+
+
+def paginate(items, page, size) -> Tuple[list, int, int]:
+    """(elementos de la página, página acotada al rango válido, total de páginas)"""
+    pages = max(1, -(-len(items) // size))
+    page = min(max(page, 0), pages - 1)
+    return items[page * size:(page + 1) * size], page, pages
+
+
+def tag_channels(data, ch_ids: Iterable[str], tag, remove=False) -> int:
+    """Añade (o quita) una etiqueta a varios canales; devuelve cuántos cambiaron"""
+    channels = data['channels']
+    changed = 0
+    for ch_id in ch_ids:
+        ch_info = channels.get(ch_id)
+        if ch_info is None:
+            continue
+        tags = ch_info.get('tags', [])
+        if remove and tag in tags:
+            tags.remove(tag)
+            changed += 1
+        elif not remove and tag not in tags:
+            tags.append(tag)
+            changed += 1
+        if tags:
+            ch_info['tags'] = tags
+        else:
+            ch_info.pop('tags', None)
+    if changed:
+        invalidate_index(data)
+    return changed
+
+
+def save_group(data, name, ch_ids: Iterable[str]) -> bool:
+    """Guarda (o reemplaza) un grupo de canales con nombre"""
+    groups = data.setdefault('channel_groups', {})
+    if name not in groups and len(groups) >= MAX_CHANNEL_GROUPS:
+        return False
+    groups[name] = sorted(ch_ids)
+    invalidate_index(data)
+    return True
+
+
+def delete_group(data, name):
+    groups = data.get('channel_groups')
+    if not groups or name not in groups:
+        return
+    del groups[name]
+    if not groups:
+        del data['channel_groups']
+    invalidate_index(data)
+
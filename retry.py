@@ -0,0 +1,232 @@
+"""Reintentos de envío: clasificación de errores, backoff y cola persistente"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from telegram.error import BadRequest, ChatMigrated, Forbidden, NetworkError, RetryAfter, TimedOut
+
+logger = logging.getLogger(__name__)
+
+RETRY_QUEUE_PATH = os.getenv('RETRY_QUEUE_PATH', 'retry_queue.json')
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', 8))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', 2))
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', 600))
+# Esperas de flood-wait más cortas que esto se hacen en línea durante el fan-out
+INLINE_RETRY_LIMIT = float(os.getenv('INLINE_RETRY_LIMIT', 10))
+DEAD_LETTER_LIMIT = 500
+# Con almacén compartido, cada cuánto relee el líder los envíos encolados en otras instancias
+RETRY_SYNC_INTERVAL = float(os.getenv('RETRY_SYNC_INTERVAL', 5))
+
+
+class QueuedForRetry(Exception):
+    """El envío falló de forma transitoria y quedó en la cola de reintentos"""
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+
+def retry_after_seconds(error):
+    """Segundos que pide Telegram en un RetryAfter (int o timedelta)"""
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+def is_retryable(error):
+    """True si el error es transitorio y merece reintento"""
+    if isinstance(error, RetryAfter):
+        return True
+    # BadRequest hereda de NetworkError pero es permanente
+    if isinstance(error, (BadRequest, Forbidden, ChatMigrated)):
+        return False
+    return isinstance(error, (TimedOut, NetworkError))
+
+
+def backoff_delay(attempt, error=None, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Espera antes del intento `attempt` (1..n): retry_after o backoff exponencial con jitter"""
+    if isinstance(error, RetryAfter):
+        # Margen aleatorio para no despertar todos los envíos a la vez
+        return retry_after_seconds(error) + random.uniform(0, 1)
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+async def send_with_retry(send: Callable[[], Awaitable[object]], attempts=2,
+                          on_flood_wait: Optional[Callable[[float], None]] = None):
+    """Ejecuta `send()` reintentando en línea los errores transitorios cortos.
+
+    Relanza el último error si no se consigue; el llamador decide si encolarlo.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return await send()
+        except Exception as e:
+            if not is_retryable(e) or attempt == attempts:
+                raise
+            delay = backoff_delay(attempt, e)
+            if isinstance(e, RetryAfter):
+                if on_flood_wait:
+                    on_flood_wait(retry_after_seconds(e))
+                if delay > INLINE_RETRY_LIMIT:
+                    raise
+            logger.warning(f"⏳ Reintento {attempt}/{attempts} en {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+
+
+class RetryQueue:
+    """Cola persistente de envíos fallidos con reintentos programados.
+
+    Cada entrada guarda el canal y el payload serializado de la publicación,
+    así un reinicio no pierde las entregas pendientes. Con `shared` (modo
+    multi-instancia) las entradas viven en un almacén común: cualquier
+    instancia encola y solo el líder reintenta, releyéndolas cada
+    `sync_interval`; el disco local de una instancia ya no guarda nada.
+    """
+    def __init__(self, sender: Callable[[str, Dict, Dict], Awaitable[object]], path=RETRY_QUEUE_PATH,
+                 max_attempts=RETRY_MAX_ATTEMPTS, shared=None, sync_interval=RETRY_SYNC_INTERVAL):
+        self.sender = sender
+        self.path = path
+        self.max_attempts = max_attempts
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self.entries: Dict[str, Dict] = {}
+        self.dead_letters: List[Dict] = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._save_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self):
+        """Carga la cola guardada en disco"""
+        if self.shared is not None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+            self.entries = {entry['id']: entry for entry in saved.get('pending', [])}
+            self.dead_letters = saved.get('dead', [])
+            logger.info(f"🔁 Cola de reintentos restaurada: {len(self.entries)} envíos pendientes")
+        except Exception as e:
+            logger.error(f"Error cargando cola de reintentos: {e}")
+
+    def _write(self, snapshot):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    async def save(self):
+        """Guarda la cola en disco sin bloquear el event loop"""
+        if self.shared is not None:
+            return
+        snapshot = {'pending': list(self.entries.values()), 'dead': self.dead_letters[-DEAD_LETTER_LIMIT:]}
+        async with self._save_lock:
+            try:
+                await asyncio.to_thread(self._write, snapshot)
+            except Exception as e:
+                logger.error(f"Error guardando cola de reintentos: {e}")
+
+    async def enqueue(self, chat_id, payload, error=None, attempts=1, user_id=None, progress=None):
+        """Programa el reenvío de `payload` a `chat_id`; `progress` anota los pasos ya entregados"""
+        entry = {
+            'id': uuid.uuid4().hex,
+            'chat_id': str(chat_id),
+            'user_id': user_id,
+            'payload': payload,
+            'progress': dict(progress or {}),
+            'attempts': attempts,
+            'due': time.time() + backoff_delay(attempts, error),
+            'last_error': str(error) if error else None,
+        }
+        if self.shared is not None:
+            await self.shared.add(entry)
+        else:
+            self.entries[entry['id']] = entry
+            await self.save()
+        self._wakeup.set()
+        logger.warning(f"🔁 Envío a {chat_id} en cola de reintentos (intento {attempts})")
+        return entry
+
+    def start(self):
+        """Arranca el worker de reintentos"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.save()
+
+    async def refresh(self):
+        """Relee las entradas del almacén compartido"""
+        if self.shared is None:
+            return
+        try:
+            self.entries = {entry['id']: entry for entry in await self.shared.load_all()}
+        except Exception as e:
+            logger.error(f"Error leyendo reintentos compartidos: {e}")
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            await self.refresh()
+            now = time.time()
+            due = [e for e in self.entries.values() if e['due'] <= now]
+            if not due:
+                next_due = min((e['due'] for e in self.entries.values()), default=None)
+                timeout = None if next_due is None else max(0.0, next_due - now)
+                if self.shared is not None:
+                    timeout = self.sync_interval if timeout is None else min(timeout, self.sync_interval)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await asyncio.gather(*(self._attempt(entry) for entry in due))
+            await self.save()
+
+    async def _attempt(self, entry):
+        entry['attempts'] += 1
+        try:
+            await self.sender(entry['chat_id'], entry['payload'], entry.setdefault('progress', {}))
+        except Exception as e:
+            entry['last_error'] = str(e)
+            if is_retryable(e) and entry['attempts'] < self.max_attempts:
+                entry['due'] = time.time() + backoff_delay(entry['attempts'], e)
+                await self._store(entry)
+                logger.warning(f"🔁 Reintento fallido en {entry['chat_id']}: {e}")
+            else:
+                await self._store(entry, remove=True)
+                self.dead_letters.append(entry)
+                logger.error(f"❌ Envío a {entry['chat_id']} descartado tras {entry['attempts']} intentos: {e}")
+            return
+        await self._store(entry, remove=True)
+        logger.info(f"✅ Reintento exitoso en {entry['chat_id']} (intento {entry['attempts']})")
+
+    async def _store(self, entry, remove=False):
+        """Refleja el resultado de un intento en el almacén compartido (en local basta con `save`)"""
+        if remove:
+            self.entries.pop(entry['id'], None)
+        if self.shared is None:
+            return
+        # Se borra tras el envío, no antes: si el líder cae a mitad, el siguiente lo reintenta
+        try:
+            if remove:
+                await self.shared.remove(entry['id'])
+            else:
+                await self.shared.update(entry)
+        except Exception as e:
+            logger.error(f"Error guardando reintento {entry['id']}: {e}")
@@ -0,0 +1,113 @@
+"""Enrutado de callback_data: dict para acciones fijas, trie para prefijos y payloads compactos"""
+import string
+from functools import partial
+from operator import call
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# Payload compacto: "~" + versión + código de acción + "|arg" por argumento
+COMPACT_MARK = '~'
+PAYLOAD_VERSION = '1'
+ARG_SEPARATOR = '|'
+CALLBACK_DATA_MAX_BYTES = 64
+
+_BASE36 = string.digits + string.ascii_lowercase
+
+
+def encode_int(value: int) -> str:
+    """Entero en base 36 (un id de canal de 13 cifras queda en 8 caracteres)"""
+    if value < 0:
+        return '-' + encode_int(-value)
+    digits = []
+    while True:
+        value, remainder = divmod(value, 36)
+        digits.append(_BASE36[remainder])
+        if not value:
+            return ''.join(reversed(digits))
+
+
+# int() admite base 36 y el signo: la decodificación no pasa por Python
+decode_int = partial(int, base=36)
+
+
+class Route(NamedTuple):
+    handler: Optional[Callable[..., Awaitable[None]]]
+    action: str
+
+
+NO_ROUTE = (Route(None, 'other'), ())
+EXPIRED_ROUTE = (Route(None, 'expired'), ())
+
+
+class CallbackRouter:
+    """Resuelve un callback_data a su manejador y argumentos.
+
+    Las acciones sin parámetros se buscan en un dict. Las parametrizadas
+    (`toggle_<id>`) van en un trie de un nivel: por el primer carácter se
+    llega a los pocos prefijos que empiezan igual, ordenados de más largo
+    a más corto, así `schedule_menu` y `schedule_` conviven sin depender
+    del orden de registro. Los payloads compactos (`~1t|…`) llevan versión
+    y argumentos tipados para aprovechar los 64 bytes de Telegram.
+    """
+    def __init__(self):
+        self.exact: Dict[str, Route] = {}
+        self.prefixes: Dict[str, List[Tuple[str, Route]]] = {}
+        self.compact: Dict[str, Tuple[Route, Tuple[type, ...], Tuple[Callable, ...]]] = {}
+
+    def add(self, callback_data, handler, action=None):
+        self.exact[callback_data] = Route(handler, action or callback_data)
+
+    def add_prefix(self, prefix, handler, action=None):
+        bucket = self.prefixes.setdefault(prefix[0], [])
+        bucket.append((prefix, Route(handler, action or prefix)))
+        bucket.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def add_compact(self, code, handler, action, arg_types: Sequence[type] = ()):
+        """Registra una acción con payload compacto (`code` de uno o dos caracteres)"""
+        arg_types = tuple(arg_types)
+        decoders = tuple(decode_int if arg_type is int else arg_type for arg_type in arg_types)
+        self.compact[code] = (Route(handler, action), arg_types, decoders)
+
+    def encode(self, code, *args) -> str:
+        """callback_data compacto para la acción `code` con sus argumentos"""
+        _, arg_types, _ = self.compact[code]
+        parts = [COMPACT_MARK + PAYLOAD_VERSION + code]
+        for arg_type, arg in zip(arg_types, args):
+            parts.append(encode_int(int(arg)) if arg_type is int else str(arg))
+        payload = ARG_SEPARATOR.join(parts)
+        if len(payload.encode('utf-8')) > CALLBACK_DATA_MAX_BYTES:
+            raise ValueError(f"callback_data demasiado largo: {payload}")
+        return payload
+
+    def _resolve_compact(self, callback_data):
+        if callback_data[1:2] != PAYLOAD_VERSION:
+            # Teclado generado con una versión anterior del formato
+            return EXPIRED_ROUTE
+        code, _, rest = callback_data[2:].partition(ARG_SEPARATOR)
+        entry = self.compact.get(code)
+        if entry is None:
+            return NO_ROUTE
+        route, _, decoders = entry
+        try:
+            if len(decoders) == 1:
+                # Caso habitual (un id): sin split ni map
+                return route, (decoders[0](rest),)
+            raw_args = rest.split(ARG_SEPARATOR) if rest else []
+            if len(raw_args) != len(decoders):
+                return NO_ROUTE
+            return route, tuple(map(call, decoders, raw_args))
+        except ValueError:
+            return NO_ROUTE
+
+    def resolve(self, callback_data: str) -> Tuple[Route, Tuple]:
+        """(ruta, argumentos) del callback; ruta sin manejador si no hay coincidencia"""
+        route = self.exact.get(callback_data)
+        if route is not None:
+            return route, ()
+        if not callback_data:
+            return NO_ROUTE
+        if callback_data[0] == COMPACT_MARK:
+            return self._resolve_compact(callback_data)
+        for prefix, route in self.prefixes.get(callback_data[0], ()):
+            if callback_data.startswith(prefix):
+                return route, (callback_data[len(prefix):],)
+        return NO_ROUTE
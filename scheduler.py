@@ -0,0 +1,242 @@
+"""Programación de replicaciones con un heap persistente ordenado por hora"""
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_PATH = os.getenv('SCHEDULE_PATH', 'scheduled_jobs.json')
+# Trabajos con el mismo contenido a menos de este intervalo se fusionan en uno
+SCHEDULE_COALESCE_WINDOW = float(os.getenv('SCHEDULE_COALESCE_WINDOW', 600))
+# Con almacén compartido, cada cuánto relee el líder los trabajos creados en otras instancias
+SCHEDULE_SYNC_INTERVAL = float(os.getenv('SCHEDULE_SYNC_INTERVAL', 5))
+
+
+def content_fingerprint(payload):
+    """Huella del contenido de una publicación (sin canales ni clave de publicación)"""
+    content = {k: v for k, v in payload.items() if k not in ('target_channels', 'publish_key')}
+    return hashlib.sha1(json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class PublishScheduler:
+    """Trabajos de replicación ordenados por hora de ejecución.
+
+    Un único temporizador duerme hasta el próximo trabajo (o hasta que se
+    programe uno anterior); no hay sondeo. Los trabajos se guardan en disco
+    y se restauran al arrancar. Con `shared` (modo multi-instancia) viven en
+    un almacén común: cualquier instancia los crea o cancela y solo el líder
+    los ejecuta, releyéndolos cada `sync_interval`.
+    """
+    def __init__(self, runner: Callable[[Dict], Awaitable[None]], path=SCHEDULE_PATH,
+                 coalesce_window=SCHEDULE_COALESCE_WINDOW, shared=None, sync_interval=SCHEDULE_SYNC_INTERVAL):
+        self.runner = runner
+        self.path = path
+        self.coalesce_window = coalesce_window
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self.jobs: Dict[str, Dict] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._wakeup = asyncio.Event()
+        self._save_lock = asyncio.Lock()
+        self._task = None
+        self._running = set()
+        self._tasks = set()
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def load(self):
+        """Restaura los trabajos guardados en disco"""
+        if self.shared is not None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+            self.jobs = {job['id']: job for job in saved}
+            self._heap = [(job['due'], job['id']) for job in self.jobs.values()]
+            heapq.heapify(self._heap)
+            logger.info(f"⏰ Programaciones restauradas: {len(self.jobs)} trabajos")
+        except Exception as e:
+            logger.error(f"Error cargando programaciones: {e}")
+
+    def _write(self, snapshot):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    async def save(self):
+        snapshot = list(self.jobs.values())
+        async with self._save_lock:
+            try:
+                await asyncio.to_thread(self._write, snapshot)
+            except Exception as e:
+                logger.error(f"Error guardando programaciones: {e}")
+
+    async def refresh(self):
+        """Relee los trabajos del almacén compartido (sin efecto si no lo hay)"""
+        if self.shared is None:
+            return
+        try:
+            saved = await self.shared.load_all()
+        except Exception as e:
+            logger.error(f"Error leyendo programaciones compartidas: {e}")
+            return
+        jobs = {job['id']: job for job in saved}
+        # Los que se están ejecutando ya se retiraron del almacén
+        for job_id in self._running:
+            if job_id in self.jobs:
+                jobs[job_id] = self.jobs[job_id]
+        self.jobs = jobs
+        self._heap = [(job['due'], job['id']) for job in jobs.values() if job['id'] not in self._running]
+        heapq.heapify(self._heap)
+
+    def _find_coalescible(self, user_id, fingerprint, due):
+        for job in self.jobs.values():
+            if job['user_id'] == user_id and job['fingerprint'] == fingerprint \
+                    and abs(job['due'] - due) <= self.coalesce_window and job['id'] not in self._running:
+                return job
+        return None
+
+    async def schedule(self, user_id, payload, channels, due, coalesce=True) -> Dict:
+        """Programa la replicación de `payload` en `channels` para la hora `due` (epoch)"""
+        await self.refresh()
+        fingerprint = content_fingerprint(payload)
+        existing = self._find_coalescible(user_id, fingerprint, due) if coalesce else None
+        if existing:
+            # Mismo contenido en la misma ventana: un solo envío por canal
+            job = dict(existing, channels=sorted(set(existing['channels']) | set(channels)),
+                       due=min(due, existing['due']))
+            # Escritura condicional: si el líder ya lo retiró para ejecutarlo, no se resucita
+            if self.shared is None or await self.shared.update(job):
+                self.jobs[job['id']] = job
+                if job['due'] != existing['due']:
+                    heapq.heappush(self._heap, (job['due'], job['id']))
+                if self.shared is None:
+                    await self.save()
+                logger.info(f"⏰ Programación fusionada en {job['id']} ({len(job['channels'])} canales)")
+                self._wakeup.set()
+                return job
+            self.jobs.pop(existing['id'], None)
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'user_id': user_id,
+            'due': due,
+            'payload': payload,
+            'channels': sorted(channels),
+            'fingerprint': fingerprint,
+            'created_at': time.time(),
+        }
+        self.jobs[job['id']] = job
+        heapq.heappush(self._heap, (due, job['id']))
+        if self.shared is not None:
+            await self.shared.add(job)
+        else:
+            await self.save()
+        self._wakeup.set()
+        return job
+
+    async def schedule_spread(self, user_id, payload, channels, start, spread_seconds, batches) -> List[Dict]:
+        """Reparte los canales en `batches` trabajos espaciados a lo largo de `spread_seconds`"""
+        channels = sorted(channels)
+        batches = max(1, min(batches, len(channels)))
+        step = spread_seconds / batches
+        jobs = []
+        for i in range(batches):
+            chunk = channels[i::batches]
+            # Las tandas de un mismo reparto no deben fusionarse entre sí
+            jobs.append(await self.schedule(user_id, payload, chunk, start + i * step, coalesce=(i == 0)))
+        return jobs
+
+    async def cancel(self, job_id, user_id=None) -> bool:
+        """Cancela un trabajo pendiente (su entrada en el heap se descarta al salir)"""
+        await self.refresh()
+        job = self.jobs.get(job_id)
+        if not job or (user_id is not None and job['user_id'] != user_id) or job_id in self._running:
+            return False
+        del self.jobs[job_id]
+        if self.shared is not None:
+            # Si el líder ya lo tomó, no se puede cancelar
+            if not await self.shared.remove(job_id):
+                return False
+        else:
+            await self.save()
+        self._wakeup.set()
+        return True
+
+    def jobs_for(self, user_id) -> List[Dict]:
+        return sorted((j for j in self.jobs.values() if j['user_id'] == user_id), key=lambda j: j['due'])
+
+    def _peek(self) -> Optional[Tuple[float, str]]:
+        # Descartar entradas de trabajos cancelados o reprogramados
+        while self._heap:
+            due, job_id = self._heap[0]
+            job = self.jobs.get(job_id)
+            if job and job['due'] == due:
+                return due, job_id
+            heapq.heappop(self._heap)
+        return None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Las publicaciones ya empezadas terminan (cortarlas dejaría canales sin replicar)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self):
+        next_sync = 0.0
+        while True:
+            self._wakeup.clear()
+            if self.shared is not None and time.monotonic() >= next_sync:
+                await self.refresh()
+                next_sync = time.monotonic() + self.sync_interval
+            head = self._peek()
+            delay = None if head is None else head[0] - time.time()
+            if delay is None or delay > 0:
+                if self.shared is not None:
+                    delay = self.sync_interval if delay is None else min(delay, self.sync_interval)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            job = self.jobs[head[1]]
+            if self.shared is not None:
+                # Retirarlo del almacén antes de ejecutar: como mucho una instancia lo publica,
+                # y con los canales fusionados desde otra instancia hasta este momento
+                stored = await self.shared.take(job['id'])
+                if stored is None:
+                    self.jobs.pop(job['id'], None)
+                    continue
+                job = self.jobs[job['id']] = stored
+            else:
+                # Igual en local: retirarlo y guardar antes de publicar, así un reinicio
+                # a mitad del fan-out no lo vuelve a enviar a todos los canales
+                self.jobs.pop(job['id'], None)
+                await self.save()
+            self._running.add(job['id'])
+            task = asyncio.create_task(self._execute(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            task.add_done_callback(lambda t, job_id=job['id']: self._running.discard(job_id))
+
+    async def _execute(self, job):
+        try:
+            await self.runner(job)
+        except Exception as e:
+            logger.error(f"Error ejecutando programación {job['id']}: {e}")
+        finally:
+            self.jobs.pop(job['id'], None)
@@ -0,0 +1,175 @@
+"""Sesiones residentes en memoria con expulsión por inactividad y límite LRU"""
+import asyncio
+import logging
+import os
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from storage import StateStore
+
+logger = logging.getLogger(__name__)
+
+# Sesiones sin actividad durante este tiempo salen de memoria al almacén
+SESSION_IDLE_TTL = float(os.getenv('SESSION_IDLE_TTL', 1800))
+# Límite duro de sesiones en memoria; al superarlo se expulsa la menos reciente
+SESSION_MAX_RESIDENT = int(os.getenv('SESSION_MAX_RESIDENT', 50000))
+SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', 60))
+# Publicaciones a medio preparar más antiguas que esto se descartan
+SESSION_POST_TTL = float(os.getenv('SESSION_POST_TTL', 24 * 3600))
+
+
+class SessionManager:
+    """Sesiones de usuario en un OrderedDict ordenado por último acceso.
+
+    Cada acceso mueve la sesión al final, así el principio es siempre la más
+    antigua: la expulsión por inactividad recorre solo las que caducan y el
+    límite LRU quita por el principio, sin recorrer todo el diccionario.
+    Antes de salir de memoria la sesión se encola en el almacén (spill) y
+    `aget` la vuelve a cargar de ahí (en un hilo, viendo también lo aún no
+    volcado) antes de procesar el siguiente update; `get` solo mira memoria.
+    Las sesiones retenidas con `pinned` no se expulsan mientras se usan.
+
+    Con `write_on_evict=False` (modo multi-instancia) la expulsión solo
+    suelta la copia local: cada update ya la escribió con `flush_users`, y
+    volcarla después pisaría lo que otra instancia haya guardado entretanto.
+    """
+    def __init__(self, store: StateStore, decode: Callable[[int, str], Optional[Dict]],
+                 create: Callable[[], Dict], serialize: Callable[[Dict], str],
+                 idle_ttl=SESSION_IDLE_TTL, max_resident=SESSION_MAX_RESIDENT,
+                 interval=SESSION_SWEEP_INTERVAL, write_on_evict=True):
+        self.store = store
+        # Texto guardado -> sesión (se lee en un hilo y se decodifica en el event loop)
+        self.decode = decode
+        self.create = create
+        self.serialize = serialize
+        self.idle_ttl = idle_ttl
+        self.max_resident = max_resident
+        self.interval = interval
+        self.write_on_evict = write_on_evict
+        self.resident: 'OrderedDict[int, Dict]' = OrderedDict()
+        self.spilled = set()
+        self.evicted = 0
+        self._pins = Counter()
+        self._task = None
+
+    def __len__(self):
+        return len(self.resident)
+
+    def __contains__(self, user_id):
+        return user_id in self.resident
+
+    def peek(self, user_id) -> Optional[Dict]:
+        """Sesión residente, sin cargarla ni contar como acceso"""
+        return self.resident.get(user_id)
+
+    async def reload(self, user_id):
+        """Relee la sesión del almacén (otra instancia pudo cambiarla) sin bloquear el event loop"""
+        if self.store.is_dirty(user_id):
+            # Hay cambios locales sin guardar: la copia en memoria es la más nueva
+            return
+        stored = await self.store.read(user_id)
+        self.resident.pop(user_id, None)
+        self._install(user_id, stored)
+
+    async def aget(self, user_id) -> Dict:
+        """Sesión del usuario (desde memoria, el almacén o nueva), cargada sin bloquear el event loop"""
+        if user_id not in self.resident:
+            stored = await self.store.read(user_id)
+            # Otro update del mismo usuario pudo cargarla mientras se leía
+            if user_id not in self.resident:
+                self._install(user_id, stored)
+        return self.get(user_id)
+
+    def _install(self, user_id, stored):
+        session = self.decode(user_id, stored) if stored else None
+        self.resident[user_id] = session or self.create()
+        self.spilled.discard(user_id)
+        self._enforce_cap(keep=user_id)
+
+    def get(self, user_id) -> Dict:
+        """Sesión residente (cargada antes con `aget`) marcada como usada; solo memoria"""
+        session = self.resident[user_id]
+        self.resident.move_to_end(user_id)
+        session['last_activity'] = datetime.now()
+        return session
+
+    @contextmanager
+    def pinned(self, user_id):
+        """Impide expulsar la sesión mientras se procesa un update suyo"""
+        self._pins[user_id] += 1
+        try:
+            yield
+        finally:
+            self._pins[user_id] -= 1
+            if not self._pins[user_id]:
+                del self._pins[user_id]
+
+    def _spill(self, user_id, session):
+        # El volcado diferido la escribe; ya no se retiene en memoria después
+        if self.write_on_evict:
+            self.store.mark_dirty(user_id, lambda: self.serialize(session))
+        self.spilled.add(user_id)
+        self.evicted += 1
+
+    def _enforce_cap(self, keep=None):
+        excess = len(self.resident) - self.max_resident
+        if excess <= 0:
+            return
+        victims = []
+        for user_id in self.resident:
+            if len(victims) == excess:
+                break
+            if user_id != keep and user_id not in self._pins:
+                victims.append(user_id)
+        for user_id in victims:
+            self._spill(user_id, self.resident.pop(user_id))
+
+    def evict_idle(self, now=None) -> int:
+        """Saca de memoria las sesiones inactivas más de `idle_ttl` segundos"""
+        cutoff = (now or datetime.now()) - timedelta(seconds=self.idle_ttl)
+        expired = []
+        for user_id, session in self.resident.items():
+            if session['last_activity'] > cutoff:
+                break
+            if user_id not in self._pins:
+                expired.append(user_id)
+        for user_id in expired:
+            self._spill(user_id, self.resident.pop(user_id))
+        count = len(expired)
+        if count:
+            logger.info(f"💤 Sesiones inactivas movidas al almacén: {count} ({len(self.resident)} residentes)")
+        return count
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"Error expulsando sesiones inactivas: {e}")
+
+    def status(self):
+        return {'resident': len(self.resident), 'spilled': len(self.spilled), 'evicted_total': self.evicted}
+
+
+def expire_stale_post(session, ttl=SESSION_POST_TTL, now=None):
+    """Descarta la publicación en curso de una sesión abandonada hace más de `ttl`"""
+    if session.get('current_post') is None:
+        return False
+    if (now or datetime.now()) - session['last_activity'] < timedelta(seconds=ttl):
+        return False
+    session['current_post'] = None
+    session['step'] = 'idle'
+    return True
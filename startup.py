@@ -0,0 +1,110 @@
+"""Arranque en frío: abre el puerto al instante y carga el bot en segundo plano
+
+En el plan gratuito de Render la instancia se duerme y la primera petición la
+despierta. Este punto de entrada solo importa aiohttp antes de escuchar: los
+probes responden mientras se importa bot.py (python-telegram-bot, httpx), se
+construye TelegramBot y corren a la vez get_me, el webhook y la carga del
+estado. Los updates que llegan entretanto esperan al arranque en vez de fallar.
+"""
+import time
+
+PROCESS_STARTED = time.monotonic()
+
+import asyncio
+import importlib
+import json
+import logging
+import os
+import signal
+
+from aiohttp import web
+
+from health import StartupTimer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PORT = int(os.getenv('PORT', 10000))
+# Un update recibido durante el arranque espera hasta este tiempo; después, 503 y Telegram reintenta
+STARTUP_WEBHOOK_WAIT = float(os.getenv('STARTUP_WEBHOOK_WAIT', 25))
+
+
+class ColdStartServer:
+    """Servidor HTTP que atiende desde el primer instante y delega en bot.py cuando está listo"""
+    def __init__(self):
+        self.timer = StartupTimer(PROCESS_STARTED)
+        self.module = None
+        self.routes = {}
+        # Se activa al terminar el arranque, haya ido bien o mal
+        self.booted = asyncio.Event()
+        self._task = None
+
+    async def boot(self):
+        try:
+            with self.timer.phase('import'):
+                # En un hilo: el event loop sigue respondiendo a los probes
+                module = await asyncio.to_thread(importlib.import_module, 'bot')
+            await module.init_app(self.timer)
+            self.routes = {(method, path): handler for method, path, handler in module.ROUTES}
+            self.module = module
+            logger.info(f"🚀 Bot Replicador con Botones INICIADO (puerto {PORT})")
+        except Exception as e:
+            self.timer.fail(e)
+            logger.error(f"❌ Error crítico en el arranque: {e}")
+            # Como con `python bot.py`, un arranque fallido termina el proceso y Render lo reinicia
+            signal.raise_signal(signal.SIGTERM)
+        finally:
+            self.booted.set()
+
+    async def handle(self, request):
+        if self.module is None and request.path == '/webhook':
+            try:
+                await asyncio.wait_for(self.booted.wait(), STARTUP_WEBHOOK_WAIT)
+            except asyncio.TimeoutError:
+                pass
+        if self.module is None:
+            if request.path == '/livez':
+                return web.Response(text="OK")
+            return self.starting(request)
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            raise web.HTTPNotFound()
+        return await handler(request)
+
+    def starting(self, request):
+        """Health y readiness mientras arranca: el proceso vive, el bot aún no atiende"""
+        failed = self.timer.error is not None
+        status = 200 if request.path in ('/', '/health') and not failed else 503
+        return web.Response(
+            text=json.dumps({"status": "ERROR" if failed else "STARTING", "startup": self.timer.status()}),
+            status=status,
+            content_type="application/json"
+        )
+
+    async def on_startup(self, app):
+        self._task = asyncio.create_task(self.boot())
+
+    async def on_cleanup(self, app):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self.module is not None:
+            await self.module.shutdown(app)
+
+
+def create_app():
+    server = ColdStartServer()
+    app = web.Application()
+    app.on_startup.append(server.on_startup)
+    app.on_cleanup.append(server.on_cleanup)
+    app.router.add_route('*', '/{tail:.*}', server.handle)
+    return app
+
+
+def main():
+    logger.info(f"🌐 Abriendo el puerto {PORT} ({time.monotonic() - PROCESS_STARTED:.2f}s desde el inicio), el bot carga en segundo plano")
+    web.run_app(create_app(), host='0.0.0.0', port=PORT, print=None)
+
+
+if __name__ == "__main__":
+    main()
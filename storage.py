@@ -0,0 +1,300 @@
+"""Almacenamiento persistente de sesiones con escritura diferida (write-behind)"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'sqlite')
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', 'bot_state.db')
+STATE_FLUSH_INTERVAL = float(os.getenv('STATE_FLUSH_INTERVAL', 1.0))
+STATE_FLUSH_BATCH = int(os.getenv('STATE_FLUSH_BATCH', 500))
+REDIS_URL = os.getenv('REDIS_URL')
+
+
+class StateStore:
+    """Interfaz común de los backends de sesiones.
+
+    Los valores son textos JSON por usuario. Las lecturas son búsquedas por
+    clave; las escrituras se acumulan con `mark_dirty` y se vuelcan por lotes
+    en un hilo aparte, así el webhook nunca espera al disco.
+    """
+    def __init__(self, flush_interval=STATE_FLUSH_INTERVAL, flush_batch=STATE_FLUSH_BATCH):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        # Una sola entrada por usuario: escrituras repetidas se fusionan
+        self._dirty: Dict[int, Callable[[], Optional[str]]] = {}
+        # Valores ya sacados de `_dirty` cuya escritura aún no ha terminado
+        self._writing: Dict[int, Optional[str]] = {}
+        self._flush_needed = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    # --- Operaciones de cada backend (síncronas, se ejecutan en un hilo) ---
+
+    def load(self, user_id) -> Optional[str]:
+        raise NotImplementedError
+
+    def load_all(self) -> Iterable[Tuple[int, str]]:
+        raise NotImplementedError
+
+    def write_batch(self, items: List[Tuple[int, Optional[str]]]):
+        """Guarda (`user_id`, valor) en bloque; valor None borra la sesión"""
+        raise NotImplementedError
+
+    def close_backend(self):
+        pass
+
+    async def read(self, user_id) -> Optional[str]:
+        """Valor más reciente: la escritura pendiente o en curso si la hay, si no el del backend (en un hilo)"""
+        snapshot = self._dirty.get(user_id)
+        if snapshot is not None:
+            return snapshot()
+        if user_id in self._writing:
+            return self._writing[user_id]
+        return await asyncio.to_thread(self.load, user_id)
+
+    # --- Escritura diferida ---
+
+    def mark_dirty(self, user_id, snapshot: Callable[[], Optional[str]]):
+        """Programa la escritura de `snapshot()`, evaluado en el momento del volcado"""
+        self._dirty[user_id] = snapshot
+        if len(self._dirty) >= self.flush_batch:
+            self._flush_needed.set()
+
+    def delete(self, user_id):
+        self.mark_dirty(user_id, lambda: None)
+
+    @property
+    def pending_writes(self):
+        return len(self._dirty)
+
+    def is_dirty(self, user_id):
+        return user_id in self._dirty
+
+    async def flush_users(self, user_ids):
+        """Escribe ya las sesiones indicadas (modo multi-instancia: otra instancia puede leerlas enseguida)"""
+        popped = {user_id: self._dirty.pop(user_id) for user_id in user_ids if user_id in self._dirty}
+        items = []
+        for user_id, snapshot in popped.items():
+            try:
+                items.append((user_id, snapshot()))
+            except Exception as e:
+                logger.error(f"Error serializando sesión {user_id}: {e}")
+        if not items:
+            return 0
+        try:
+            await self._write(items)
+        except Exception as e:
+            logger.error(f"Error guardando {len(items)} sesiones: {e}")
+            for user_id, snapshot in popped.items():
+                self._dirty.setdefault(user_id, snapshot)
+            return 0
+        return len(items)
+
+    async def _write(self, items):
+        """Escribe el lote en un hilo; mientras tanto `read` devuelve estos valores"""
+        self._writing.update(items)
+        try:
+            await asyncio.to_thread(self.write_batch, items)
+        finally:
+            for user_id, value in items:
+                if user_id in self._writing and self._writing[user_id] is value:
+                    del self._writing[user_id]
+
+    async def flush(self):
+        """Vuelca las sesiones pendientes en un solo lote"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            dirty, self._dirty = self._dirty, {}
+            items = []
+            for user_id, snapshot in dirty.items():
+                try:
+                    items.append((user_id, snapshot()))
+                except Exception as e:
+                    logger.error(f"Error serializando sesión {user_id}: {e}")
+            try:
+                await self._write(items)
+            except Exception as e:
+                logger.error(f"Error guardando {len(items)} sesiones: {e}")
+                # Reintentar en el próximo volcado sin pisar cambios más nuevos
+                for user_id, snapshot in dirty.items():
+                    self._dirty.setdefault(user_id, snapshot)
+                return 0
+            return len(items)
+
+    def start(self):
+        """Arranca el volcado periódico"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            await self.flush()
+
+    async def close(self):
+        """Detiene el volcado periódico y guarda lo pendiente"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        await asyncio.to_thread(self.close_backend)
+
+
+class MemoryStore(StateStore):
+    """Backend en memoria (no sobrevive a reinicios)"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.rows: Dict[int, str] = {}
+
+    def load(self, user_id):
+        return self.rows.get(user_id)
+
+    def load_all(self):
+        return list(self.rows.items())
+
+    def write_batch(self, items):
+        for user_id, value in items:
+            if value is None:
+                self.rows.pop(user_id, None)
+            else:
+                self.rows[user_id] = value
+
+
+class SQLiteStore(StateStore):
+    """Backend SQLite en modo WAL con escrituras por lotes"""
+    def __init__(self, path=STATE_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at)")
+
+    def load(self, user_id):
+        with self._lock:
+            row = self.conn.execute("SELECT data FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def load_all(self):
+        with self._lock:
+            return self.conn.execute("SELECT user_id, data FROM sessions").fetchall()
+
+    def write_batch(self, items):
+        now = time.time()
+        upserts = [(user_id, value, now) for user_id, value in items if value is not None]
+        deletes = [(user_id,) for user_id, value in items if value is None]
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    "INSERT INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    upserts
+                )
+                self.conn.executemany("DELETE FROM sessions WHERE user_id = ?", deletes)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def close_backend(self):
+        with self._lock:
+            self.conn.close()
+
+
+class LocalRedis:
+    """Sustituto local y en memoria de un cliente Redis (subconjunto de hashes)"""
+    def __init__(self):
+        self.hashes: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def hget(self, name, key):
+        with self._lock:
+            return self.hashes.get(name, {}).get(str(key))
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self.hashes.get(name, {}))
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        with self._lock:
+            table = self.hashes.setdefault(name, {})
+            if key is not None:
+                table[str(key)] = value
+            for k, v in (mapping or {}).items():
+                table[str(k)] = v
+
+    def hdel(self, name, *keys):
+        with self._lock:
+            table = self.hashes.get(name, {})
+            return sum(1 for k in keys if table.pop(str(k), None) is not None)
+
+    def close(self):
+        pass
+
+
+class RedisStore(StateStore):
+    """Backend sobre un hash de Redis (o cualquier cliente compatible)"""
+    def __init__(self, client, key='botonesbot:sessions', **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self.key = key
+
+    @staticmethod
+    def _text(value):
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def load(self, user_id):
+        return self._text(self.client.hget(self.key, user_id))
+
+    def load_all(self):
+        return [(int(self._text(k)), self._text(v)) for k, v in self.client.hgetall(self.key).items()]
+
+    def write_batch(self, items):
+        upserts = {str(user_id): value for user_id, value in items if value is not None}
+        deletes = [str(user_id) for user_id, value in items if value is None]
+        if upserts:
+            self.client.hset(self.key, mapping=upserts)
+        if deletes:
+            self.client.hdel(self.key, *deletes)
+
+    def close_backend(self):
+        self.client.close()
+
+
+def create_store(backend=STATE_BACKEND):
+    """Crea el backend configurado en STATE_BACKEND (memory, sqlite o redis)"""
+    if backend == 'memory':
+        return MemoryStore()
+    if backend == 'sqlite':
+        return SQLiteStore()
+    if backend == 'redis':
+        if not REDIS_URL:
+            logger.warning("⚠️ REDIS_URL no configurado, usando Redis local en memoria")
+            return RedisStore(LocalRedis())
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("❌ STATE_BACKEND=redis requiere el paquete 'redis'")
+        return RedisStore(redis.Redis.from_url(REDIS_URL))
+    raise ValueError(f"❌ STATE_BACKEND desconocido: {backend}")
@@ -0,0 +1,226 @@
+"""Plantillas de botones: registro global compartido y deltas por usuario"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+SHARED_TEMPLATES_PATH = os.getenv('SHARED_TEMPLATES_PATH', 'shared_templates.json')
+MAX_USER_TEMPLATES = 20
+TEMPLATE_NAME_MAX = 24
+
+
+def _freeze(buttons):
+    return tuple(MappingProxyType(dict(button)) for button in buttons)
+
+
+# Una sola copia inmutable para todos los usuarios
+BUILTIN_TEMPLATES: Mapping[str, tuple] = MappingProxyType({
+    'ecommerce': _freeze([
+        {'text': '🛒 Comprar Ahora', 'url': 'https://ejemplo.com/producto'},
+        {'text': '📞 Contactar', 'url': 'https://wa.me/1234567890'},
+        {'text': '⭐ Valorar', 'url': 'https://ejemplo.com/review'}
+    ]),
+    'social': _freeze([
+        {'text': '👍 Me Gusta', 'callback_data': 'like_post'},
+        {'text': '💬 Comentar', 'url': 'https://t.me/mi_canal'},
+        {'text': '🔄 Compartir', 'callback_data': 'share_post'}
+    ]),
+    'news': _freeze([
+        {'text': '📖 Leer Más', 'url': 'https://ejemplo.com/noticia'},
+        {'text': '🔔 Suscribirse', 'url': 'https://t.me/noticias'},
+        {'text': '📤 Compartir', 'callback_data': 'share_news'}
+    ]),
+    'educational': _freeze([
+        {'text': '📚 Ver Curso', 'url': 'https://ejemplo.com/curso'},
+        {'text': '🎓 Inscribirse', 'url': 'https://ejemplo.com/registro'},
+        {'text': '💬 Preguntas', 'url': 'https://t.me/soporte'}
+    ]),
+    'contact': _freeze([
+        {'text': '📞 WhatsApp', 'url': 'https://wa.me/1234567890'},
+        {'text': '📧 Email', 'url': 'mailto:contacto@ejemplo.com'},
+        {'text': '🌐 Web', 'url': 'https://ejemplo.com'}
+    ]),
+})
+
+
+def template_slug(name):
+    """Nombre de plantilla apto para callback_data (minúsculas, dígitos y _)"""
+    slug = re.sub(r'[^a-z0-9_]', '', name.strip().lower().replace(' ', '_'))
+    return slug[:TEMPLATE_NAME_MAX]
+
+
+def template_title(name):
+    """Nombre para mostrar (sin guiones bajos, que rompen el Markdown)"""
+    return name.replace('_', ' ').title()
+
+
+def buttons_to_template(buttons):
+    """Convierte los InlineButton de una publicación al formato de plantilla"""
+    template = []
+    for button in buttons:
+        item = {'text': button.text, 'button_type': button.button_type}
+        if button.url:
+            item['url'] = button.url
+        if button.callback_data:
+            item['callback_data'] = button.callback_data
+        template.append(item)
+    return template
+
+
+class TemplateRegistry:
+    """Plantillas predefinidas y compartidas, comunes a todos los usuarios.
+
+    La sesión de cada usuario solo guarda `template_overrides`, y solo si
+    escribe algo: una lista de botones para plantillas propias, `None` para
+    ocultar una predefinida o `'shared:<código>'` para una importada (se lee
+    del registro, no se copia).
+
+    Con `store` (modo multi-instancia) las compartidas viven en un almacén
+    común y `shared` es solo una caché local: un código compartido en una
+    instancia se puede importar en cualquier otra.
+    """
+    def __init__(self, path=SHARED_TEMPLATES_PATH, store=None):
+        self.path = path
+        self.store = store
+        self.shared: Dict[str, Dict] = {}
+        self._save_lock = asyncio.Lock()
+
+    def load(self):
+        """Restaura las plantillas compartidas guardadas en disco"""
+        if self.store is not None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+            self.shared = {code: dict(entry, buttons=_freeze(entry['buttons'])) for code, entry in saved.items()}
+            logger.info(f"📋 Plantillas compartidas restauradas: {len(self.shared)}")
+        except Exception as e:
+            logger.error(f"Error cargando plantillas compartidas: {e}")
+
+    def _write(self, snapshot):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    async def save(self):
+        """Guarda las plantillas compartidas sin bloquear el event loop"""
+        snapshot = {
+            code: dict(entry, buttons=[dict(button) for button in entry['buttons']])
+            for code, entry in self.shared.items()
+        }
+        async with self._save_lock:
+            try:
+                await asyncio.to_thread(self._write, snapshot)
+            except Exception as e:
+                logger.error(f"Error guardando plantillas compartidas: {e}")
+
+    def _resolve_override(self, value):
+        if isinstance(value, str) and value.startswith('shared:'):
+            entry = self.shared.get(value[len('shared:'):])
+            return entry['buttons'] if entry else None
+        return value
+
+    def templates_for(self, data) -> Dict[str, tuple]:
+        """Vista combinada (predefinidas + deltas del usuario), sin copiar botones"""
+        overrides = data.get('template_overrides')
+        if not overrides:
+            return BUILTIN_TEMPLATES
+        merged = dict(BUILTIN_TEMPLATES)
+        for name, value in overrides.items():
+            buttons = self._resolve_override(value)
+            if buttons is None:
+                merged.pop(name, None)
+            else:
+                merged[name] = buttons
+        return merged
+
+    def get(self, data, name) -> Optional[tuple]:
+        return self.templates_for(data).get(name)
+
+    def is_own(self, data, name):
+        """True si la plantilla es del usuario (creada o importada)"""
+        return (data.get('template_overrides') or {}).get(name) is not None
+
+    def save_user_template(self, data, name, buttons) -> bool:
+        """Crea o reemplaza una plantilla propia (copy-on-write sobre la sesión)"""
+        overrides = data.setdefault('template_overrides', {})
+        if name not in overrides and len(overrides) >= MAX_USER_TEMPLATES:
+            return False
+        overrides[name] = [dict(button) for button in buttons]
+        return True
+
+    def delete_user_template(self, data, name):
+        """Borra una plantilla propia (si tapaba una predefinida, esta vuelve a verse)"""
+        overrides = data.get('template_overrides')
+        if not overrides or overrides.get(name) is None:
+            return
+        del overrides[name]
+        if not overrides:
+            del data['template_overrides']
+
+    async def share(self, data, name, owner) -> Optional[str]:
+        """Publica una plantilla en el registro y devuelve su código"""
+        buttons = self.get(data, name)
+        if buttons is None:
+            return None
+        plain = [dict(button) for button in buttons]
+        # Mismo contenido, mismo código: compartir dos veces no duplica
+        code = hashlib.sha1(json.dumps([name, plain], sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:10]
+        if code not in self.shared:
+            self.shared[code] = {'name': name, 'owner': owner, 'buttons': _freeze(plain)}
+            if self.store is not None:
+                await self.store.add({'id': code, 'name': name, 'owner': owner, 'buttons': plain})
+            else:
+                await self.save()
+        return code
+
+    async def _fetch(self, code) -> Optional[Dict]:
+        """Plantilla compartida por código, desde la caché o el almacén común"""
+        entry = self.shared.get(code)
+        if entry is None and self.store is not None:
+            stored = await self.store.get(code)
+            if stored is not None:
+                entry = self.shared[code] = {
+                    'name': stored['name'], 'owner': stored['owner'], 'buttons': _freeze(stored['buttons'])
+                }
+        return entry
+
+    async def prefetch(self, data):
+        """Trae al caché las compartidas que usa la sesión (importadas desde otra instancia)"""
+        if self.store is None or not data:
+            return
+        for value in (data.get('template_overrides') or {}).values():
+            if isinstance(value, str) and value.startswith('shared:') and value[len('shared:'):] not in self.shared:
+                await self._fetch(value[len('shared:'):])
+
+    async def import_shared(self, data, code) -> Optional[str]:
+        """Añade una plantilla compartida a las del usuario; devuelve su nombre"""
+        entry = await self._fetch(code.strip().lower())
+        if entry is None:
+            return None
+        overrides = data.setdefault('template_overrides', {})
+        name = entry['name']
+        if name not in overrides and len(overrides) >= MAX_USER_TEMPLATES:
+            return None
+        overrides[name] = f"shared:{code.strip().lower()}"
+        return name
+
+    def migrate(self, data):
+        """Convierte el antiguo `button_templates` (copia completa) en deltas"""
+        legacy = data.pop('button_templates', None)
+        if not legacy:
+            return
+        for name, buttons in legacy.items():
+            builtin = BUILTIN_TEMPLATES.get(name)
+            if builtin is None or [dict(button) for button in builtin] != buttons:
+                data.setdefault('template_overrides', {})[name] = buttons
+        for name in BUILTIN_TEMPLATES:
+            if name not in legacy:
+                data.setdefault('template_overrides', {})[name] = None
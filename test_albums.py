@@ -0,0 +1,57 @@
+"""Pruebas de la agrupación de álbumes"""
+import asyncio
+from types import SimpleNamespace
+
+from albums import AlbumAggregator
+from cluster import LocalCoordinator, SharedAlbumParts
+
+
+def part(message_id, group='g1'):
+    return SimpleNamespace(
+        message_id=message_id, media_group_id=group,
+        to_dict=lambda: {'message_id': message_id, 'media_group_id': group}
+    )
+
+
+def decode(payload):
+    return SimpleNamespace(**payload)
+
+
+def test_album_split_across_instances_is_delivered_once_and_complete():
+    async def scenario():
+        coordinator = LocalCoordinator()
+        delivered = []
+
+        async def on_album(user_id, messages):
+            delivered.append((user_id, [m.message_id for m in messages]))
+
+        instances = [
+            AlbumAggregator(on_album, delay=0.05, decode=decode,
+                            shared=SharedAlbumParts(coordinator, 'album:', instance_id))
+            for instance_id in ('a', 'b')
+        ]
+        await instances[0].add(1, part(11))
+        await instances[1].add(1, part(12))
+        await asyncio.sleep(0.03)
+        # Llega tarde a la primera instancia, cuya ventana ya iba a vencer
+        await instances[1].add(1, part(10))
+        await asyncio.sleep(0.2)
+        assert delivered == [(1, [10, 11, 12])]
+        assert await coordinator.hgetall('album:1:g1') == {}
+    asyncio.run(scenario())
+
+
+def test_local_album_waits_for_quiet_window():
+    async def scenario():
+        delivered = []
+
+        async def on_album(user_id, messages):
+            delivered.append([m.message_id for m in messages])
+
+        albums = AlbumAggregator(on_album, delay=0.05)
+        await albums.add(1, part(2))
+        await albums.add(1, part(1))
+        await albums.add(2, part(3, group='g2'))
+        await asyncio.sleep(0.15)
+        assert sorted(delivered) == [[1, 2], [3]]
+    asyncio.run(scenario())
@@ -0,0 +1,59 @@
+"""Pruebas del envío a canales de TelegramBot: copia directa o reconstrucción"""
+import asyncio
+
+import pytest
+from telegram.error import BadRequest
+
+from bot import ForwardedPost
+
+
+def photo_post(**overrides):
+    payload = {
+        'text': 'Oferta',
+        'media': [{'file_id': 'foto', 'type': 'photo'}],
+        'buttons': [],
+        'target_channels': ['-1', '-2', '-3'],
+        'source_chat_id': 42,
+        'source_message_ids': [7],
+    }
+    payload.update(overrides)
+    return ForwardedPost.from_dict(payload)
+
+
+def test_unedited_post_is_copied(stub_bot):
+    post = photo_post()
+    asyncio.run(stub_bot.send_post_to_channel('-1', post, None))
+    assert stub_bot.bulk_bot.methods() == ['copy_message']
+
+
+def test_post_with_edited_text_is_rebuilt(stub_bot):
+    # Tras «Editar Texto» la copia llevaría el texto original
+    post = photo_post(text='Texto nuevo', text_edited=True)
+    asyncio.run(stub_bot.send_post_to_channel('-1', post, None))
+    assert stub_bot.bulk_bot.methods() == ['send_photo']
+
+
+def test_missing_original_switches_remaining_channels_to_rebuild(stub_bot):
+    async def scenario():
+        api = stub_bot.bulk_bot
+        api.failures['copy_message'] = [BadRequest('Message to copy not found')]
+        post = photo_post()
+        for ch_id in ('-1', '-2', '-3'):
+            await stub_bot.send_post_to_channel(ch_id, post, None)
+        assert post.copy_unavailable
+        # Solo el primer canal intenta copiar; el resto reconstruye directamente
+        assert api.calls == [('copy_message', '-1'), ('send_photo', '-1'), ('send_photo', '-2'), ('send_photo', '-3')]
+    asyncio.run(scenario())
+
+
+def test_per_chat_error_does_not_disable_copy_for_other_channels(stub_bot):
+    async def scenario():
+        api = stub_bot.bulk_bot
+        api.failures['copy_message'] = [BadRequest('Not enough rights to send photos to the chat')]
+        post = photo_post()
+        with pytest.raises(BadRequest):
+            await stub_bot.send_post_to_channel('-1', post, None)
+        assert not post.copy_unavailable
+        await stub_bot.send_post_to_channel('-2', post, None)
+        assert api.calls == [('copy_message', '-1'), ('copy_message', '-2')]
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+"""Pruebas del índice de etiquetas y grupos (ChannelIndex)"""
+import pytest
+
+from channel_index import ChannelIndex, channel_index
+from picker import delete_group, save_group, tag_channels
+
+
+def make_data():
+    return {
+        'channels': {
+            '-1': {'title': 'Ofertas ES', 'tags': ['promo', 'es']},
+            '-2': {'title': 'Ofertas MX', 'tags': ['promo', 'mx']},
+            '-3': {'title': 'Noticias', 'tags': ['es']},
+            '-4': {'title': 'Pausado', 'tags': ['promo', 'pausados']},
+        },
+        'channel_groups': {'ventas': ['-1', '-3', '-99']},
+    }
+
+
+def resolve(expression, data=None):
+    data = data or make_data()
+    return set(ChannelIndex(data['channels'], data['channel_groups']).resolve(expression))
+
+
+def test_operators_apply_left_to_right():
+    assert resolve('#promo + ventas') == {'-1', '-2', '-3', '-4'}
+    assert resolve('#promo - #pausados') == {'-1', '-2'}
+    # Misma prioridad: (#mx | #es) & #promo, no #mx | (#es & #promo)
+    assert resolve('#mx | #es & #promo') == {'-1', '-2'}
+    assert resolve('* - #promo') == {'-3'}
+
+
+def test_parentheses_group_subexpressions():
+    assert resolve('#mx | (#es & #promo)') == {'-1', '-2'}
+    assert resolve('#promo - (#pausados | #mx)') == {'-1'}
+    assert resolve('((#es))') == {'-1', '-3'}
+
+
+def test_groups_ignore_channels_no_longer_registered():
+    assert resolve('ventas') == {'-1', '-3'}
+
+
+@pytest.mark.parametrize('expression, message', [
+    ('#inexistente', 'Etiqueta desconocida'),
+    ('fantasma', 'Grupo desconocido'),
+    ('', 'Expresión vacía'),
+    ('#promo +', 'Falta un grupo'),
+    ('+ #promo', 'Se esperaba'),
+    ('(#promo', 'Falta cerrar'),
+    ('#promo )', 'Sobra'),
+    ('#promo ventas', 'Sobra'),
+    ('#promo $ #es', 'No se entiende'),
+])
+def test_invalid_expressions_raise_value_error(expression, message):
+    with pytest.raises(ValueError, match=message):
+        resolve(expression)
+
+
+def test_index_is_cached_until_tags_or_groups_change():
+    data = make_data()
+    index = channel_index(data)
+    assert channel_index(data) is index
+    tag_channels(data, ['-3'], 'promo')
+    assert '-3' in channel_index(data).resolve('#promo')
+    tag_channels(data, ['-1', '-2', '-4'], 'promo', remove=True)
+    assert set(channel_index(data).resolve('#promo')) == {'-3'}
+    save_group(data, 'mx', ['-2'])
+    assert set(channel_index(data).resolve('mx | ventas')) == {'-1', '-2', '-3'}
+    delete_group(data, 'ventas')
+    with pytest.raises(ValueError, match='Grupo desconocido'):
+        channel_index(data).resolve('ventas')
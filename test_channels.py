@@ -0,0 +1,34 @@
+"""Pruebas de la revalidación de ChannelCache"""
+import asyncio
+from types import SimpleNamespace
+
+from channels import ChannelCache
+
+
+def test_stale_reads_refresh_at_most_batch_at_once():
+    async def scenario():
+        active = peak = calls = 0
+
+        async def fetch_member(chat_id):
+            nonlocal active, peak, calls
+            calls += 1
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.001)
+            active -= 1
+            return SimpleNamespace(status='administrator', can_post_messages=True)
+
+        async def fetch_chat(chat_id):
+            return SimpleNamespace(title=f'Canal {chat_id}', username=None, type='channel')
+
+        cache = ChannelCache(fetch_member, fetch_chat, batch=5)
+        channels = [str(-1001000000000 - i) for i in range(200)]
+        # Como render_channel_selection: registrar y consultar a la vez
+        cache.track(channels)
+        cache.unwritable(channels)
+        cache.unwritable(channels)
+        await asyncio.gather(*cache._tasks)
+        assert peak <= 5
+        assert calls == len(channels)
+        assert cache.status()['stale'] == 0
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+"""Pruebas de la importación masiva de canales: separadores, duplicados, tope y archivo"""
+import asyncio
+from types import SimpleNamespace
+
+import bot as bot_module
+from bot import normalize_channel_identifier, split_channel_identifiers
+
+
+class FakeMessage:
+    """Mensaje entrante que guarda las respuestas del bot"""
+    def __init__(self, document=None):
+        self.document = document
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def fake_document(content, file_name='canales.txt'):
+    async def download_as_bytearray():
+        return bytearray(content.encode('utf-8'))
+
+    async def get_file():
+        return SimpleNamespace(download_as_bytearray=download_as_bytearray)
+    return SimpleNamespace(file_name=file_name, file_size=len(content), get_file=get_file)
+
+
+def importing_bot(stub_bot, user_id=1):
+    """Prepara la sesión y simula `verify_channel` devolviendo un canal por identificador"""
+    stub_bot.sessions.resident[user_id] = stub_bot.new_session()
+    verified = []
+
+    async def verify_channel(identifier, api=None):
+        verified.append(identifier)
+        chat = SimpleNamespace(id=-1000 - len(verified), title=identifier, username=None, type='channel')
+        return chat, SimpleNamespace(status='administrator')
+    stub_bot.verify_channel = verify_channel
+    return verified
+
+
+def test_split_on_newlines_and_commas():
+    text = "@uno\r\n@dos, @tres\n\n,https://t.me/cuatro,"
+    assert split_channel_identifiers(text) == ['@uno', '@dos', '@tres', 'https://t.me/cuatro']
+
+
+def test_split_keeps_spaces_and_semicolons_inside_an_item():
+    assert split_channel_identifiers("Mi Canal;Otro\n-1001") == ['Mi Canal;Otro', '-1001']
+
+
+def test_normalize_formats():
+    assert normalize_channel_identifier(' https://t.me/canal ') == '@canal'
+    assert normalize_channel_identifier('t.me/canal') == '@canal'
+    assert normalize_channel_identifier('canal') == '@canal'
+    assert normalize_channel_identifier('@canal') == '@canal'
+    assert normalize_channel_identifier('-1001234') == '-1001234'
+
+
+def test_bulk_add_drops_duplicates(stub_bot):
+    verified = importing_bot(stub_bot)
+    message = FakeMessage()
+    asyncio.run(stub_bot.bulk_add_channels(SimpleNamespace(message=message), 1, ['@a', 'b', '@a', 'b', '@c']))
+    assert verified == ['@a', '@b', '@c']
+    assert len(stub_bot.sessions.resident[1]['channels']) == 3
+
+
+def test_bulk_add_caps_identifiers(stub_bot, monkeypatch):
+    monkeypatch.setattr(bot_module, 'BULK_CHANNELS_MAX', 3)
+    verified = importing_bot(stub_bot)
+    message = FakeMessage()
+    asyncio.run(stub_bot.bulk_add_channels(SimpleNamespace(message=message), 1, [f'@c{i}' for i in range(5)]))
+    assert verified == ['@c0', '@c1', '@c2']
+    assert 'Se omitieron 2 identificadores' in message.replies[-1]
+
+
+def test_default_cap_is_500(stub_bot):
+    verified = importing_bot(stub_bot)
+    message = FakeMessage()
+    asyncio.run(stub_bot.bulk_add_channels(SimpleNamespace(message=message), 1, [f'@c{i}' for i in range(502)]))
+    assert len(verified) == 500
+    assert 'Se omitieron 2 identificadores' in message.replies[-1]
+
+
+def test_file_import_reads_csv(stub_bot):
+    verified = importing_bot(stub_bot)
+    message = FakeMessage(fake_document("﻿@uno,@dos\r\nt.me/tres\n@uno\n", 'lista.csv'))
+    asyncio.run(stub_bot.add_channels_from_file(SimpleNamespace(message=message), 1))
+    assert verified == ['@uno', '@dos', '@tres']
+
+
+def test_file_import_rejects_other_extensions(stub_bot):
+    verified = importing_bot(stub_bot)
+    message = FakeMessage(fake_document("@uno", 'canales.pdf'))
+    asyncio.run(stub_bot.add_channels_from_file(SimpleNamespace(message=message), 1))
+    assert verified == []
+    assert 'Archivo no válido' in message.replies[0]
@@ -0,0 +1,46 @@
+"""Pruebas de la elección de líder con LocalCoordinator"""
+import asyncio
+
+from cluster import LeaderElector, LocalCoordinator
+
+
+def make_elector(coordinator, instance_id, events, ttl=30):
+    async def elected():
+        events.append((instance_id, 'elected'))
+
+    async def demoted():
+        events.append((instance_id, 'demoted'))
+    return LeaderElector(coordinator, 'leader', instance_id, elected, demoted, ttl=ttl)
+
+
+def test_only_one_instance_leads_and_other_takes_over_on_stop():
+    async def scenario():
+        coordinator = LocalCoordinator()
+        events = []
+        first = make_elector(coordinator, 'a', events)
+        second = make_elector(coordinator, 'b', events)
+        await first.step()
+        await second.step()
+        assert first.is_leader and not second.is_leader
+        await first.stop()
+        await second.step()
+        assert second.is_leader
+        assert events == [('a', 'elected'), ('a', 'demoted'), ('b', 'elected')]
+    asyncio.run(scenario())
+
+
+def test_leader_that_misses_renewal_steps_down():
+    async def scenario():
+        coordinator = LocalCoordinator()
+        events = []
+        first = make_elector(coordinator, 'a', events, ttl=0.05)
+        second = make_elector(coordinator, 'b', events, ttl=0.05)
+        await first.step()
+        # La concesión caduca (instancia colgada) y otra la gana
+        await asyncio.sleep(0.06)
+        await second.step()
+        await first.step()
+        assert second.is_leader and not first.is_leader
+        assert events == [('a', 'elected'), ('b', 'elected'), ('a', 'demoted')]
+        assert await coordinator.owner('leader') == 'b'
+    asyncio.run(scenario())
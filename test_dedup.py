@@ -0,0 +1,33 @@
+"""Pruebas de la caché de duplicados (TTLCache)"""
+import dedup
+from dedup import TTLCache
+
+
+def test_key_expires_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(dedup.time, 'monotonic', lambda: now[0])
+    cache = TTLCache(ttl=10, maxsize=100)
+    assert cache.add('update:1')
+    assert not cache.add('update:1')
+    now[0] += 9
+    assert 'update:1' in cache
+    now[0] += 2
+    assert 'update:1' not in cache
+    assert len(cache) == 0
+    assert cache.add('update:1')
+
+
+def test_oldest_key_evicted_at_maxsize():
+    cache = TTLCache(ttl=60, maxsize=3)
+    for key in range(4):
+        assert cache.add(key)
+    assert len(cache) == 3
+    assert 0 not in cache
+    assert all(key in cache for key in (1, 2, 3))
+
+
+def test_discard_allows_retry():
+    cache = TTLCache(ttl=60, maxsize=10)
+    cache.add('post:abc')
+    cache.discard('post:abc')
+    assert cache.add('post:abc')
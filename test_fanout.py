@@ -0,0 +1,149 @@
+"""Pruebas del fan-out: limitación de tasa (reloj simulado), ventana de concurrencia y carriles"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import fanout
+from fanout import BULK, INTERACTIVE, FanoutDispatcher, PriorityLanes, TokenBucket
+
+real_sleep = asyncio.sleep
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def scenario():
+        lanes = PriorityLanes(interactive=1, bulk=1, bulk_yield=1)
+        await lanes.acquire(BULK)
+        waiter = asyncio.create_task(lanes.acquire(BULK))
+        await asyncio.sleep(0)
+        # Cancelado mientras sigue en la cola, y el hueco se libera antes de que lo procese
+        waiter.cancel()
+        lanes.release(BULK)
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert lanes.in_flight == {INTERACTIVE: 0, BULK: 0}
+        await asyncio.wait_for(lanes.acquire(BULK), 0.1)
+    asyncio.run(scenario())
+
+
+def test_cancelled_after_grant_returns_slot():
+    async def scenario():
+        lanes = PriorityLanes(interactive=1, bulk=1, bulk_yield=1)
+        await lanes.acquire(BULK)
+        waiter = asyncio.create_task(lanes.acquire(BULK))
+        await asyncio.sleep(0)
+        lanes.release(BULK)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert lanes.in_flight[BULK] == 0
+        assert lanes.status()[BULK]['waiting'] == 0
+    asyncio.run(scenario())
+
+
+def test_bulk_yields_while_interactive_busy():
+    async def scenario():
+        lanes = PriorityLanes(interactive=2, bulk=8, bulk_yield=2)
+        await lanes.acquire(INTERACTIVE)
+        for _ in range(2):
+            await lanes.acquire(BULK)
+        blocked = asyncio.create_task(lanes.acquire(BULK))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+        lanes.release(INTERACTIVE)
+        await asyncio.wait_for(blocked, 0.1)
+        assert lanes.in_flight[BULK] == 3
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj simulado: `asyncio.sleep` avanza el tiempo en vez de esperarlo"""
+    state = SimpleNamespace(now=1000.0, sleeps=[])
+
+    async def fake_sleep(seconds, *args):
+        if seconds > 0:
+            state.sleeps.append(round(seconds, 6))
+            state.now += seconds
+        await real_sleep(0)
+
+    monkeypatch.setattr(fanout, 'time', SimpleNamespace(monotonic=lambda: state.now))
+    monkeypatch.setattr(fanout.asyncio, 'sleep', fake_sleep)
+    return state
+
+
+def test_bucket_allows_burst_then_waits_for_refill(clock):
+    async def scenario():
+        bucket = TokenBucket(rate=1, capacity=3)
+        for _ in range(3):
+            await bucket.acquire()
+        assert clock.sleeps == []
+        await bucket.acquire()
+        assert clock.sleeps == [1.0]
+        # Una pausa larga no acumula más que la capacidad
+        clock.now += 60
+        for _ in range(3):
+            await bucket.acquire()
+        await bucket.acquire()
+        assert clock.sleeps == [1.0, 1.0]
+    asyncio.run(scenario())
+
+
+def test_per_chat_limit_does_not_delay_other_chats(clock):
+    async def scenario():
+        dispatcher = FanoutDispatcher(global_rate=1000, per_chat_rate=20 / 60, per_chat_burst=3)
+        for _ in range(3):
+            await dispatcher.throttle('-1')
+        await dispatcher.throttle('-2')
+        assert clock.sleeps == []
+        await dispatcher.throttle('-1')
+        assert clock.sleeps == [3.0]
+    asyncio.run(scenario())
+
+
+def test_global_limit_applies_across_chats(clock):
+    async def scenario():
+        dispatcher = FanoutDispatcher(global_rate=2, per_chat_rate=100, per_chat_burst=100)
+        for chat_id in ('-1', '-2', '-3'):
+            await dispatcher.throttle(chat_id)
+        assert clock.sleeps == [0.5]
+    asyncio.run(scenario())
+
+
+def test_flood_wait_pauses_only_that_chat(clock):
+    async def scenario():
+        dispatcher = FanoutDispatcher(global_rate=1000, per_chat_rate=100, per_chat_burst=100)
+        dispatcher.pause('-1', 7)
+        await dispatcher.throttle('-2')
+        assert clock.sleeps == []
+        await dispatcher.throttle('-1')
+        assert clock.sleeps == [7.0]
+        # Vencida la pausa, se olvida
+        await dispatcher.throttle('-1')
+        assert '-1' not in dispatcher.paused_until
+    asyncio.run(scenario())
+
+
+def test_run_bounds_concurrency_and_collects_outcomes_in_order():
+    async def scenario():
+        dispatcher = FanoutDispatcher(concurrency=3)
+        active = peak = 0
+
+        async def send(chat_id):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            for _ in range(3):
+                await asyncio.sleep(0)
+            active -= 1
+            if chat_id == '-4':
+                raise RuntimeError('sin permisos')
+            return f'enviado a {chat_id}'
+
+        targets = [f'-{i}' for i in range(1, 11)]
+        outcomes = await dispatcher.run(targets, send)
+        assert peak == 3
+        assert [chat_id for chat_id, _, _ in outcomes] == targets
+        assert all(ok for chat_id, ok, _ in outcomes if chat_id != '-4')
+        failed = [(chat_id, str(error)) for chat_id, ok, error in outcomes if not ok]
+        assert failed == [('-4', 'sin permisos')]
+        assert outcomes[0][2] == 'enviado a -1'
+    asyncio.run(scenario())
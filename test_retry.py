@@ -0,0 +1,81 @@
+"""Pruebas de la cola de reintentos"""
+import asyncio
+
+from telegram.error import NetworkError
+
+from cluster import LocalCoordinator, SharedJobStore
+from retry import RetryQueue
+
+
+def album_post():
+    from bot import ForwardedPost
+    return ForwardedPost.from_dict({
+        'text': 'Oferta',
+        'media': [{'file_id': 'a', 'type': 'photo'}, {'file_id': 'b', 'type': 'photo'}],
+        'buttons': [{'text': 'Comprar', 'url': 'https://ejemplo.com', 'callback_data': None, 'button_type': 'url'}],
+        'target_channels': ['-1'],
+    })
+
+
+def test_album_is_not_resent_when_only_buttons_message_fails(stub_bot, tmp_path):
+    async def scenario():
+        api = stub_bot.bulk_bot
+        api.failures['send_message'] = [NetworkError('timeout')]
+        post = album_post()
+        progress = {}
+        try:
+            await stub_bot.send_post_to_channel('-1', post, post.get_inline_keyboard(), progress)
+        except NetworkError as e:
+            error = e
+        else:
+            raise AssertionError('el mensaje de botones debía fallar')
+        assert progress == {'content': True}
+        # Como deliver_to_channel: el progreso viaja con la entrada de la cola
+        queue = RetryQueue(stub_bot.resend_payload, path=str(tmp_path / 'queue.json'))
+        entry = await queue.enqueue('-1', post.to_dict(), error, progress=progress)
+        await queue._attempt(entry)
+        assert len(queue) == 0
+        assert api.methods() == ['send_media_group', 'send_message', 'send_message']
+    asyncio.run(scenario())
+
+
+def test_sticker_is_not_resent_when_caption_message_fails(stub_bot):
+    async def scenario():
+        from bot import ForwardedPost
+        api = stub_bot.bulk_bot
+        api.failures['send_message'] = [NetworkError('timeout')]
+        post = ForwardedPost.from_dict({'text': 'Hola', 'media': [{'file_id': 's', 'type': 'sticker'}], 'buttons': []})
+        progress = {}
+        for _ in range(2):
+            try:
+                await stub_bot.send_post_to_channel('-1', post, None, progress)
+            except NetworkError:
+                pass
+        assert api.methods() == ['send_sticker', 'send_message', 'send_message']
+    asyncio.run(scenario())
+
+
+def test_entry_queued_on_follower_is_retried_by_leader(tmp_path):
+    async def scenario():
+        shared = SharedJobStore(LocalCoordinator(), 'retry_queue')
+        sent = []
+
+        async def sender(chat_id, payload, progress):
+            sent.append(chat_id)
+            if len(sent) == 1:
+                raise NetworkError('timeout')
+
+        follower = RetryQueue(sender, path=str(tmp_path / 'follower.json'), shared=shared)
+        leader = RetryQueue(sender, path=str(tmp_path / 'leader.json'), shared=shared)
+        entry = await follower.enqueue('-1', {'text': 'Oferta'}, NetworkError('timeout'))
+        await follower.stop()
+        # Nada en el disco local de la instancia que lo encoló
+        assert not (tmp_path / 'follower.json').exists()
+        await leader.refresh()
+        await leader._attempt(leader.entries[entry['id']])
+        assert [stored['attempts'] for stored in await shared.load_all()] == [2]
+        await leader.refresh()
+        await leader._attempt(leader.entries[entry['id']])
+        assert await shared.load_all() == []
+        assert sent == ['-1', '-1']
+    asyncio.run(scenario())
@@ -0,0 +1,85 @@
+"""Pruebas del enrutado de callback_data (CallbackRouter)"""
+import pytest
+
+from router import CALLBACK_DATA_MAX_BYTES, EXPIRED_ROUTE, NO_ROUTE, CallbackRouter, decode_int, encode_int
+
+
+async def handler(*args):
+    pass
+
+
+async def other(*args):
+    pass
+
+
+def test_base36_round_trip():
+    for value in (0, 35, 36, 1234567890123, -1001234567890, -1):
+        assert decode_int(encode_int(value)) == value
+    # Un id de canal de 13 cifras cabe en 8 caracteres más el signo
+    assert len(encode_int(-1001234567890)) <= 9
+
+
+def test_compact_encode_decode_round_trip():
+    router = CallbackRouter()
+    router.add_compact('t', handler, 'toggle_', (int,))
+    router.add_compact('s', other, 'channel_set', (str, str))
+    payload = router.encode('t', '-1001234567890')
+    assert payload.startswith('~1t|')
+    route, args = router.resolve(payload)
+    assert (route.handler, route.action, args) == (handler, 'toggle_', (-1001234567890,))
+    route, args = router.resolve(router.encode('s', 'tag', 'ventas'))
+    assert (route.handler, args) == (other, ('tag', 'ventas'))
+
+
+def test_encode_rejects_payload_over_telegram_limit():
+    router = CallbackRouter()
+    router.add_compact('s', other, 'channel_set', (str, str))
+    with pytest.raises(ValueError):
+        router.encode('s', 'tag', 'x' * CALLBACK_DATA_MAX_BYTES)
+
+
+def test_longest_prefix_wins_regardless_of_registration_order():
+    for order in ((('schedule_', handler), ('schedule_menu_', other)),
+                  (('schedule_menu_', other), ('schedule_', handler))):
+        router = CallbackRouter()
+        for prefix, target in order:
+            router.add_prefix(prefix, target)
+        assert router.resolve('schedule_menu_open') == ((other, 'schedule_menu_'), ('open',))
+        assert router.resolve('schedule_1h') == ((handler, 'schedule_'), ('1h',))
+
+
+def test_exact_action_takes_precedence_over_prefix():
+    router = CallbackRouter()
+    router.add('schedule_menu', other)
+    router.add_prefix('schedule_', handler)
+    assert router.resolve('schedule_menu') == ((other, 'schedule_menu'), ())
+    assert router.resolve('schedule_2h')[1] == ('2h',)
+
+
+def test_legacy_prefix_and_compact_payload_reach_same_handler():
+    router = CallbackRouter()
+    router.add_prefix('toggle_', handler)
+    router.add_compact('t', handler, 'toggle_', (int,))
+    # Teclados antiguos siguen funcionando con el id en texto
+    legacy_route, legacy_args = router.resolve('toggle_-100123')
+    compact_route, compact_args = router.resolve(router.encode('t', -100123))
+    assert legacy_route == compact_route
+    assert legacy_args == ('-100123',) and compact_args == (-100123,)
+
+
+def test_unknown_version_is_expired_and_unknown_data_has_no_route():
+    router = CallbackRouter()
+    router.add_compact('t', handler, 'toggle_', (int,))
+    assert router.resolve('~0t|abc') == EXPIRED_ROUTE
+    assert router.resolve('~9t|abc') == EXPIRED_ROUTE
+    assert router.resolve('~1z|abc') == NO_ROUTE
+    assert router.resolve('desconocido') == NO_ROUTE
+    assert router.resolve('') == NO_ROUTE
+
+
+def test_malformed_compact_args_have_no_route():
+    router = CallbackRouter()
+    router.add_compact('t', handler, 'toggle_', (int,))
+    router.add_compact('s', other, 'channel_set', (str, str))
+    assert router.resolve('~1t|no-base36!') == NO_ROUTE
+    assert router.resolve('~1s|solo_uno') == NO_ROUTE
@@ -0,0 +1,86 @@
+"""Pruebas del planificador con almacén compartido (modo multi-instancia)"""
+import asyncio
+import time
+
+from cluster import LocalCoordinator, SharedJobStore
+from scheduler import PublishScheduler
+
+PAYLOAD = {'text': 'Oferta', 'buttons': []}
+
+
+async def noop(job):
+    pass
+
+
+def test_coalesce_does_not_resurrect_job_taken_by_leader():
+    async def scenario():
+        shared = SharedJobStore(LocalCoordinator(), 'jobs')
+        follower = PublishScheduler(noop, shared=shared)
+        due = time.time() + 60
+        job = await follower.schedule(1, PAYLOAD, ['-1'], due)
+        # El líder lo retira para ejecutarlo justo después de que el seguidor lo leyera
+        assert await shared.take(job['id']) is not None
+        follower.refresh = noop_refresh
+        second = await follower.schedule(1, PAYLOAD, ['-2'], due)
+        stored = await shared.load_all()
+        assert second['id'] != job['id']
+        assert [j['id'] for j in stored] == [second['id']]
+        assert stored[0]['channels'] == ['-2']
+    asyncio.run(scenario())
+
+
+def test_leader_runs_latest_merged_channels():
+    async def scenario():
+        shared = SharedJobStore(LocalCoordinator(), 'jobs')
+        follower = PublishScheduler(noop, shared=shared)
+        leader = PublishScheduler(noop, shared=shared)
+        due = time.time() + 60
+        job = await follower.schedule(1, PAYLOAD, ['-1'], due)
+        await leader.refresh()
+        await follower.schedule(1, PAYLOAD, ['-2'], due)
+        taken = await shared.take(job['id'])
+        assert taken['channels'] == ['-1', '-2']
+    asyncio.run(scenario())
+
+
+async def noop_refresh():
+    pass
+
+
+def test_stop_waits_for_running_publish(tmp_path):
+    async def scenario():
+        finished = []
+
+        async def slow_runner(job):
+            await asyncio.sleep(0.05)
+            finished.append(job['id'])
+
+        scheduler = PublishScheduler(slow_runner, path=str(tmp_path / 'jobs.json'))
+        job = await scheduler.schedule(1, PAYLOAD, ['-1'], time.time())
+        scheduler.start()
+        await asyncio.sleep(0.01)
+        assert len(scheduler._tasks) == 1
+        await scheduler.stop()
+        assert finished == [job['id']]
+        assert not scheduler._tasks
+    asyncio.run(scenario())
+
+
+def test_local_job_is_persisted_as_taken_before_publishing(tmp_path):
+    async def scenario():
+        path = tmp_path / 'jobs.json'
+        on_disk = []
+
+        async def runner(job):
+            # Un reinicio en este punto no debe volver a ejecutarlo
+            restored = PublishScheduler(noop, path=str(path))
+            restored.load()
+            on_disk.append(len(restored))
+
+        scheduler = PublishScheduler(runner, path=str(path))
+        await scheduler.schedule(1, PAYLOAD, ['-1'], time.time())
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        assert on_disk == [0]
+    asyncio.run(scenario())
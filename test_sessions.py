@@ -0,0 +1,126 @@
+"""Pruebas de SessionManager: expulsión al almacén y recarga"""
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta
+
+from sessions import SessionManager
+from storage import MemoryStore
+
+
+def make_manager(store, max_resident=1, **kwargs):
+    def serialize(session):
+        return json.dumps({key: value for key, value in session.items() if key != 'last_activity'})
+
+    manager = SessionManager(
+        store, lambda user_id, stored: json.loads(stored), lambda: {'channels': {}}, serialize,
+        max_resident=max_resident, **kwargs
+    )
+
+    async def touch(user_id):
+        # Como process_update + get_user_data: carga, acceso y guardado diferido
+        session = await manager.aget(user_id)
+        store.mark_dirty(user_id, lambda: serialize(session))
+        return session
+    return manager, touch
+
+
+def test_reaccess_after_spill_before_flush_keeps_data():
+    store = MemoryStore()
+    manager, touch = make_manager(store)
+
+    async def scenario():
+        (await touch(1))['channels'] = {'-100': {'title': 'Canal'}}
+        await touch(2)
+        assert 1 not in manager
+        assert (await touch(1))['channels'] == {'-100': {'title': 'Canal'}}
+        await store.flush()
+    asyncio.run(scenario())
+    assert json.loads(store.rows[1])['channels'] == {'-100': {'title': 'Canal'}}
+
+
+def test_reaccess_while_flush_in_progress_keeps_data():
+    store = MemoryStore()
+    release = threading.Event()
+    write_batch = store.write_batch
+
+    def slow_write(items):
+        release.wait(1)
+        write_batch(items)
+    store.write_batch = slow_write
+
+    async def scenario():
+        manager, touch = make_manager(store)
+        (await touch(1))['channels'] = {'-100': {'title': 'Canal'}}
+        await touch(2)
+        flush = asyncio.create_task(store.flush())
+        await asyncio.sleep(0.01)
+        assert (await touch(1))['channels'] == {'-100': {'title': 'Canal'}}
+        release.set()
+        await flush
+    asyncio.run(scenario())
+
+
+def test_load_runs_off_the_event_loop_and_get_only_reads_memory():
+    store = MemoryStore()
+    store.rows[1] = json.dumps({'channels': {'-100': {}}})
+    loop_thread = threading.get_ident()
+    load = store.load
+    threads = []
+
+    def recording_load(user_id):
+        threads.append(threading.get_ident())
+        return load(user_id)
+    store.load = recording_load
+    manager, _ = make_manager(store)
+
+    async def scenario():
+        session = await manager.aget(1)
+        assert manager.get(1) is session
+    asyncio.run(scenario())
+    assert threads and loop_thread not in threads
+    try:
+        manager.get(2)
+    except KeyError:
+        pass
+    else:
+        raise AssertionError('get no debe cargar del almacén')
+    assert threads == threads[:1]
+
+
+def test_pinned_session_is_not_evicted():
+    store = MemoryStore()
+    manager, touch = make_manager(store)
+
+    async def scenario():
+        with manager.pinned(1):
+            await touch(1)
+            # Otro usuario llega mientras se procesa el update del primero
+            await touch(2)
+            assert 1 in manager
+        await touch(3)
+        assert 1 not in manager
+    asyncio.run(scenario())
+
+
+def test_cluster_eviction_does_not_overwrite_other_instance():
+    store = MemoryStore()
+    first, touch_first = make_manager(store, max_resident=10, write_on_evict=False)
+    second, touch_second = make_manager(store, max_resident=10, write_on_evict=False)
+
+    async def handle(manager, touch, channel):
+        # Como process_update en modo multi-instancia: releer, modificar y escribir ya
+        await manager.reload(1)
+        (await touch(1))['channels'][channel] = {'title': channel}
+        await store.flush_users([1])
+
+    async def scenario():
+        await handle(first, touch_first, '-1')
+        await handle(second, touch_second, '-2')
+        # La copia de la primera instancia ya está obsoleta cuando caduca
+        assert first.evict_idle(now=datetime.now() + timedelta(days=1)) == 1
+        await store.flush()
+        assert set(json.loads(store.rows[1])['channels']) == {'-1', '-2'}
+        await first.reload(1)
+        assert set(first.get(1)['channels']) == {'-1', '-2'}
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+"""Pruebas de la escritura diferida de StateStore"""
+import asyncio
+
+from storage import MemoryStore
+
+
+def test_flush_writes_latest_value_in_one_batch():
+    store = MemoryStore()
+    batches = []
+    write_batch = store.write_batch
+
+    def recording_write(items):
+        batches.append(list(items))
+        write_batch(items)
+    store.write_batch = recording_write
+
+    store.mark_dirty(1, lambda: '{"v": 1}')
+    store.mark_dirty(1, lambda: '{"v": 2}')
+    store.mark_dirty(2, lambda: '{"v": 3}')
+    assert store.pending_writes == 2
+    assert asyncio.run(store.flush()) == 2
+    assert batches == [[(1, '{"v": 2}'), (2, '{"v": 3}')]]
+    assert store.pending_writes == 0
+    assert asyncio.run(store.read(1)) == '{"v": 2}'
+
+
+def test_failed_flush_is_retried_without_overwriting_newer_changes():
+    store = MemoryStore()
+    write_batch = store.write_batch
+    fail = [True]
+
+    def flaky_write(items):
+        if fail[0]:
+            raise OSError('disco lleno')
+        write_batch(items)
+    store.write_batch = flaky_write
+
+    async def scenario():
+        store.mark_dirty(1, lambda: 'antiguo')
+        store.mark_dirty(2, lambda: 'otro')
+        assert await store.flush() == 0
+        # Cambio más nuevo mientras el lote fallido esperaba reintento
+        store.mark_dirty(1, lambda: 'nuevo')
+        fail[0] = False
+        assert await store.flush() == 2
+    asyncio.run(scenario())
+    assert store.rows == {1: 'nuevo', 2: 'otro'}
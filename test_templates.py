@@ -0,0 +1,35 @@
+"""Pruebas del registro de plantillas compartidas"""
+import asyncio
+
+from cluster import LocalCoordinator, SharedJobStore
+from templates import TemplateRegistry
+
+
+def test_shared_template_survives_reload(tmp_path):
+    async def scenario():
+        path = str(tmp_path / 'shared.json')
+        registry = TemplateRegistry(path)
+        code = await registry.share({}, 'ecommerce', owner=1)
+        # Compartir dos veces el mismo contenido devuelve el mismo código
+        assert await registry.share({}, 'ecommerce', owner=1) == code
+        restored = TemplateRegistry(path)
+        restored.load()
+        assert await restored.import_shared({}, code) == 'ecommerce'
+    asyncio.run(scenario())
+
+
+def test_code_shared_on_one_instance_imports_on_another(tmp_path):
+    async def scenario():
+        store = SharedJobStore(LocalCoordinator(), 'shared_templates')
+        first = TemplateRegistry(str(tmp_path / 'a.json'), store=store)
+        second = TemplateRegistry(str(tmp_path / 'b.json'), store=store)
+        code = await first.share({}, 'news', owner=1)
+        data = {}
+        assert await second.import_shared(data, code.upper()) == 'news'
+        # Una tercera instancia con la sesión ya importada la resuelve tras `prefetch`
+        third = TemplateRegistry(str(tmp_path / 'c.json'), store=store)
+        await third.prefetch(data)
+        assert third.is_own(data, 'news')
+        assert [dict(button) for button in third.get(data, 'news')] == [dict(button) for button in first.get({}, 'news')]
+        assert not (tmp_path / 'a.json').exists()
+    asyncio.run(scenario())
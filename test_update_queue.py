@@ -0,0 +1,118 @@
+"""Pruebas de la cola de updates (UpdateQueue)"""
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+from update_queue import UpdateQueue
+
+
+def test_updates_of_one_user_are_processed_in_order():
+    async def scenario():
+        seen = {}
+
+        async def process(update):
+            user_id, seq = update
+            # Los primeros tardan más: sin orden por usuario se adelantarían los siguientes
+            await asyncio.sleep(0.01 * (3 - seq))
+            seen.setdefault(user_id, []).append(seq)
+
+        queue = UpdateQueue(process, workers=4, maxsize=40)
+        queue.start()
+        for seq in range(3):
+            for user_id in (1, 2, 3):
+                assert queue.submit((user_id, seq), user_id)
+        await queue.stop()
+        assert seen == {1: [0, 1, 2], 2: [0, 1, 2], 3: [0, 1, 2]}
+    asyncio.run(scenario())
+
+
+def test_other_users_progress_while_one_is_blocked():
+    async def scenario():
+        release = asyncio.Event()
+        done = []
+
+        async def process(user_id):
+            if user_id == 0:
+                await release.wait()
+            done.append(user_id)
+
+        queue = UpdateQueue(process, workers=2, maxsize=10)
+        queue.start()
+        queue.submit(0, 0)
+        queue.submit(1, 1)
+        await asyncio.sleep(0.01)
+        assert done == [1]
+        release.set()
+        await queue.stop()
+        assert done == [1, 0]
+    asyncio.run(scenario())
+
+
+def test_full_shard_rejects_without_waiting():
+    async def scenario():
+        queue = UpdateQueue(lambda update: asyncio.sleep(0), workers=2, maxsize=2)
+        assert queue.submit('a', 0)
+        assert not queue.submit('b', 0)
+        # La otra cola sigue admitiendo updates
+        assert queue.submit('c', 1)
+        assert queue.dropped == 1 and queue.enqueued == 2
+    asyncio.run(scenario())
+
+
+def test_webhook_answers_503_when_queue_is_full():
+    os.environ.setdefault('BOT_TOKEN', '123:test')
+    os.environ.setdefault('STATE_BACKEND', 'memory')
+    import bot as bot_module
+
+    async def scenario():
+        bot = bot_module.get_bot()
+        bot.update_queue = UpdateQueue(lambda update: asyncio.sleep(0), workers=1, maxsize=1)
+        bot.update_queue.submit('ocupado', 0)
+        payload = {
+            'update_id': 900001,
+            'message': {
+                'message_id': 1, 'date': 1700000000, 'text': 'hola',
+                'chat': {'id': 7, 'type': 'private'},
+                'from': {'id': 7, 'is_bot': False, 'first_name': 'Ana'},
+            },
+        }
+
+        async def read():
+            return json.dumps(payload).encode()
+
+        outcome, response = await bot_module.ingest_update(SimpleNamespace(read=read), 0.0)
+        assert (outcome, response.status) == ('busy', 503)
+        # Telegram lo reintentará: no debe quedar marcado como visto
+        assert 900001 not in bot.seen_updates
+    asyncio.run(scenario())
+
+
+def test_stop_drains_pending_updates():
+    async def scenario():
+        processed = []
+
+        async def process(update):
+            await asyncio.sleep(0.005)
+            processed.append(update)
+
+        queue = UpdateQueue(process, workers=2, maxsize=20)
+        queue.start()
+        for update in range(6):
+            queue.submit(update, update)
+        await queue.stop(timeout=1)
+        assert sorted(processed) == list(range(6))
+        assert queue.depth == 0 and not queue._tasks
+    asyncio.run(scenario())
+
+
+def test_stop_gives_up_after_timeout():
+    async def scenario():
+        queue = UpdateQueue(lambda update: asyncio.Event().wait(), workers=1, maxsize=5)
+        queue.start()
+        queue.submit('bloqueado', 0)
+        queue.submit('pendiente', 0)
+        await asyncio.sleep(0)
+        await asyncio.wait_for(queue.stop(timeout=0.02), 1)
+        assert not queue._tasks
+    asyncio.run(scenario())
@@ -0,0 +1,97 @@
+"""Cola acotada de updates procesados fuera del request del webhook"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', 8))
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', 1000))
+
+
+class UpdateQueue:
+    """Reparte updates entre workers conservando el orden por usuario.
+
+    Cada worker tiene su propia cola y un usuario siempre cae en la misma
+    (por su id), así sus updates se procesan en orden mientras los de otros
+    usuarios avanzan en paralelo.
+    """
+    def __init__(self, process: Callable[[object], Awaitable[None]],
+                 workers=UPDATE_WORKERS, maxsize=UPDATE_QUEUE_SIZE):
+        self.process = process
+        self.shards: List[asyncio.Queue] = [
+            asyncio.Queue(maxsize=max(1, maxsize // workers)) for _ in range(workers)
+        ]
+        self._tasks = []
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.enqueue_latency_total = 0.0
+        self.enqueue_latency_max = 0.0
+        self.wait_total = 0.0
+
+    @property
+    def depth(self):
+        return sum(q.qsize() for q in self.shards)
+
+    def submit(self, update, key, received_at=None) -> bool:
+        """Encola sin esperar; devuelve False si la cola del usuario está llena"""
+        try:
+            self.shards[hash(key) % len(self.shards)].put_nowait((update, time.monotonic()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        if received_at is not None:
+            latency = time.monotonic() - received_at
+            self.enqueue_latency_total += latency
+            self.enqueue_latency_max = max(self.enqueue_latency_max, latency)
+        return True
+
+    def start(self):
+        """Arranca los workers"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(q)) for q in self.shards]
+
+    async def stop(self, timeout=10):
+        """Espera a vaciar las colas (hasta `timeout`) y detiene los workers"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self.shards)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Apagado con {self.depth} updates sin procesar")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            update, enqueued_at = await queue.get()
+            self.wait_total += time.monotonic() - enqueued_at
+            try:
+                await self.process(update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error procesando update: {e}")
+            finally:
+                queue.task_done()
+
+    def stats(self):
+        """Métricas de la cola para el health check"""
+        handled = self.processed + self.failed
+        return {
+            'depth': self.depth,
+            'capacity': sum(q.maxsize for q in self.shards),
+            'workers': len(self.shards),
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'enqueue_latency_avg_ms': round(1000 * self.enqueue_latency_total / self.enqueued, 3) if self.enqueued else 0,
+            'enqueue_latency_max_ms': round(1000 * self.enqueue_latency_max, 3),
+            'queue_wait_avg_ms': round(1000 * self.wait_total / handled, 3) if handled else 0,
+        }